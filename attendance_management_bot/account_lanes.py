@@ -0,0 +1,87 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Per-account execution lanes.
+The callbacks of one account run one after another, in the order they
+arrived, while callbacks of different accounts run concurrently.
+A double tap on "Yes" then can't run confirm_in twice at the same time.
+A lane exists only while the account has callbacks running or waiting.
+Check also: attendance_management_bot/check_and_handle_actions.py
+"""
+
+__all__ = ['AccountLanes', 'account_lanes', 'get_account_lanes_stats']
+
+import logging
+import tornado.gen
+import tornado.locks
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+
+class Lane:
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        # tornado.locks.Lock wakes up its waiters in FIFO order.
+        self.lock = tornado.locks.Lock()
+        self.users = 0
+
+
+class AccountLanes:
+    """
+    Lanes of the accounts, in a dict keyed by account id.
+    """
+
+    def __init__(self):
+        self.__lanes = {}
+
+    @tornado.gen.coroutine
+    def run(self, account_id, func, *args):
+        """
+        Run func(*args) in the lane of account_id.
+
+        :return: result of func
+        """
+        lane = self.__lanes.get(account_id, None)
+        if lane is None:
+            lane = Lane()
+            self.__lanes[account_id] = lane
+        lane.users += 1
+        try:
+            with (yield lane.lock.acquire()):
+                result = yield func(*args)
+        finally:
+            lane.users -= 1
+            if lane.users == 0:
+                del self.__lanes[account_id]
+        return result
+
+    def stats(self):
+        """
+        :return: lanes, callbacks waiting behind another of the same account.
+        """
+        waiting = sum(lane.users - 1 for lane in self.__lanes.values())
+        return {"lanes": len(self.__lanes), "waiting": waiting}
+
+
+account_lanes = AccountLanes()
+
+
+def get_account_lanes_stats():
+    return account_lanes.stats()
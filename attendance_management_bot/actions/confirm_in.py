@@ -20,7 +20,7 @@ limitations under the License.
 Deal confirm check-in
 """
 
-__all__ = ['deal_confirm_in' ,'confirm_in']
+__all__ = ['schedule_title', 'deal_confirm_in' ,'confirm_in']
 
 import tornado.gen
 import asyncio
@@ -33,14 +33,10 @@ from attendance_management_bot.common import global_data
 from attendance_management_bot.common.local_timezone import local_date_time
 from attendance_management_bot.model.i18n_data import \
     make_i18n_text, get_i18n_content_by_lang
-from attendance_management_bot.externals.calendar_req import create_schedule
 from attendance_management_bot.externals.send_message import push_message
 from attendance_management_bot.actions.message import invalid_message, prompt_input
-from attendance_management_bot.model.processStatusDBHandle import get_status_by_user, \
-    insert_replace_status_by_user_date
-from attendance_management_bot.model.calendarDBHandle import set_schedule_by_user, \
-    get_schedule_by_user
-from attendance_management_bot.common.contacts import get_user_info_by_account
+from attendance_management_bot.model.asyncDBHandle import confirm_in_by_user
+from attendance_management_bot.calendar_sync import notify_calendar_sync
 from attendance_management_bot.constant import DEFAULT_LANG
 import gettext
 _ = gettext.gettext
@@ -48,14 +44,32 @@ _ = gettext.gettext
 LOGGER = logging.getLogger("attendance_management_bot")
 
 
+def schedule_title(account, begin_time):
+    """
+    Title of the calendar event, before check-out.
+
+    :param account: user name.
+    :param begin_time: check-in time, local datetime.
+    :return: title in DEFAULT_LANG
+    """
+    fmt = _("{account}'s clock-in time on {date}")
+    fmt1= _("%A, %B %d")
+    return get_i18n_content_by_lang(fmt, "confirm_in", DEFAULT_LANG,
+                                    fmt1=fmt1, account=account,
+                                    date=begin_time)
+
+
 @tornado.gen.coroutine
-def deal_confirm_in(account_id, create_time, callback):
+def deal_confirm_in(account_id, current_date, create_time, callback):
     """
-    will be linked with the calendar internally, Check in time of registered user.
-    Check also: attendance_management_bot/externals/calendar_req.py
+    Check in time of registered user.
+    The schedule and the user's status are saved in one statement,
+    the calendar event is created later by the calendar sync worker.
+    Check also: attendance_management_bot/calendar_sync.py
 
     :param account_id: user account id.
-    :param create_time: current date by local time.
+    :param current_date: current date by local time.
+    :param create_time: Time the request arrived at the server.
     :param callback: The message content of the callback,
         include the user's check-in time
     :return: Prompt message of successful check in.
@@ -65,27 +79,14 @@ def deal_confirm_in(account_id, create_time, callback):
     user_time = int(str_time)
     my_end_time = user_time + 60
     begin_time = local_date_time(user_time)
-    current_date = datetime.strftime(begin_time, '%Y-%m-%d')
+    schedule_date = datetime.strftime(begin_time, '%Y-%m-%d')
 
-    info = get_schedule_by_user(account_id, current_date)
-    if info is not None:
+    schedule_uid = str(uuid.uuid4()) + account_id
+    info = yield confirm_in_by_user(schedule_uid, account_id, schedule_date,
+                                    user_time, my_end_time, current_date)
+    if info is None:
         raise HTTPError(500, "Internal data error")
-
-
-    end_time = begin_time + timedelta(minutes=1)
-    cur_time = local_date_time(create_time)
-    fmt = _("{account}'s clock-in time on {date}")
-    fmt1= _("%A, %B %d")
-
-    title = get_i18n_content_by_lang(fmt, "confirm_in", DEFAULT_LANG, fmt1=fmt1,
-                                     account=get_user_info_by_account(
-                                         account_id), date=begin_time)
-
-    schedule_uid = create_schedule(cur_time, end_time, begin_time,
-                                   account_id, title)
-
-    set_schedule_by_user(schedule_uid, account_id, current_date,
-                         user_time, my_end_time)
+    notify_calendar_sync()
 
     fmt = _("Clock-in time has been registered.")
     return make_i18n_text("Clock-in time has been registered.", "confirm_in",
@@ -105,9 +106,7 @@ def confirm_in(account_id, current_date, create_time, callback):
     :return: None
     """
 
-    content = yield deal_confirm_in(account_id, create_time, callback)
+    content = yield deal_confirm_in(account_id, current_date,
+                                    create_time, callback)
 
-    insert_replace_status_by_user_date(account_id, current_date,
-                                       status="in_done",
-                                       process="sign_in_done")
     yield push_message(account_id, content)
@@ -20,12 +20,11 @@ limitations under the License.
 Deal confirm check-out
 """
 
-__all__ = ['confirm_out']
+__all__ = ['schedule_title', 'confirm_out']
 
 import tornado.gen
 import asyncio
 import time
-import locale
 import logging
 from datetime import datetime
 from tornado.web import HTTPError
@@ -34,15 +33,12 @@ from attendance_management_bot.common.local_timezone import local_date_time
 from attendance_management_bot.model.data import i18n_text, make_text
 from attendance_management_bot.model.i18n_data import \
     make_i18n_text, get_i18n_content_by_lang, get_i18n_content
-from attendance_management_bot.externals.calendar_req import modify_schedule
+from attendance_management_bot.model.i18n_catalog import format_date
 from attendance_management_bot.externals.send_message import push_messages
 from attendance_management_bot.actions.message import invalid_message, prompt_input, \
     TimeStruct, number_message
-from attendance_management_bot.model.processStatusDBHandle import get_status_by_user, \
-    set_status_by_user_date
-from attendance_management_bot.model.calendarDBHandle import get_schedule_by_user, \
-    modify_schedule_by_user
-from attendance_management_bot.common.contacts import get_user_info_by_account
+from attendance_management_bot.model.asyncDBHandle import confirm_out_by_user
+from attendance_management_bot.calendar_sync import notify_calendar_sync
 from conf.config import DEFAULT_LANG
 import gettext
 _ = gettext.gettext
@@ -58,7 +54,7 @@ def confirm_out_message(user_time, total_hours, total_minutes):
     hours_content = get_i18n_content(fmt, "confirm_out")
 
     if total_hours != 0:
-        str_hours = "{total_hours} hours and "
+        str_hours = "{total_hours} hours and ".format(total_hours=total_hours)
         fmt = _("{total_hours} hours and ")
         hours_content = get_i18n_content(fmt, "confirm_out")
         for key in hours_content:
@@ -75,32 +71,46 @@ def confirm_out_message(user_time, total_hours, total_minutes):
 
     i18n_texts = []
     for key in texts:
-        locale.setlocale(locale.LC_TIME,
-                         "{lang}{code}".format(lang=key, code=".utf8"))
-        value = texts[key].format(date=date_time.strftime(dates[key]),
+        value = texts[key].format(date=format_date(date_time, dates[key], key),
                                   total_hours=hours_content[key],
                                   total_minutes=total_minutes)
         i18n_texts.append(i18n_text(key, value))
 
-    locale.setlocale(locale.LC_TIME,
-                     "{lang}{code}".format(lang="en_US", code=".utf8"))
     return make_text("Clock-out time has been registered. "
                      "The total working hours for {date} "
-                     "is{total_hours}{total_minutes} minutes."
-                     .format(date=date_time.strftime('%A, %B %d'),
+                     "is {total_hours}{total_minutes} minutes."
+                     .format(date=format_date(date_time, '%A, %B %d', 'en'),
                              total_hours=str_hours,
                              total_minutes=total_minutes),
                      i18n_texts=i18n_texts)
 
 
+def schedule_title(account, end_time):
+    """
+    Title of the calendar event, after check-out.
+
+    :param account: user name.
+    :param end_time: check-out time, local datetime.
+    :return: title in DEFAULT_LANG
+    """
+    fmt = _("{account}'s working hours on {date}")
+    fmt1 = _("%A, %B %d")
+    return get_i18n_content_by_lang(fmt, "confirm_out", DEFAULT_LANG,
+                                    fmt1=fmt1, account=account,
+                                    date=end_time)
+
+
 @tornado.gen.coroutine
-def deal_confirm_out(account_id, create_time, callback):
+def deal_confirm_out(account_id, current_date, create_time, callback):
     """
-    will be linked with the calendar internally, Check out time of registered user.
-    Check also: attendance_management_bot/externals/calendar_req.py
+    Check out time of registered user.
+    The schedule and the user's status are saved in one statement,
+    the calendar event is updated later by the calendar sync worker.
+    Check also: attendance_management_bot/calendar_sync.py
 
     :param account_id: user account id.
-    :param create_time: current date by local time.
+    :param current_date: current date by local time.
+    :param create_time: Time the request arrived at the server.
     :param callback: The message content of the callback,
         include the user's check-out time
     :return: Prompt message of successful check out.
@@ -110,27 +120,15 @@ def deal_confirm_out(account_id, create_time, callback):
     user_time = int(str_time)
 
     end_time = local_date_time(user_time)
-    current_date = datetime.strftime(end_time, '%Y-%m-%d')
+    schedule_date = datetime.strftime(end_time, '%Y-%m-%d')
 
-    info = get_schedule_by_user(account_id, current_date)
+    info = yield confirm_out_by_user(account_id, schedule_date, user_time,
+                                     current_date)
     if info is None:
         raise HTTPError(500, "Internal data error")
-    schedule_id = info[0]
+    notify_calendar_sync()
     begin_time_st = info[1]
 
-    cur_time = local_date_time(create_time)
-    begin_time = local_date_time(begin_time_st)
-
-    fmt = _("{account}'s working hours on {date}")
-    fmt1 = _("%A, %B %d")
-    title = get_i18n_content_by_lang(fmt, "confirm_out", DEFAULT_LANG, fmt1=fmt1,
-                                     account=get_user_info_by_account(
-                                         account_id), date=end_time)
-    modify_schedule(schedule_id, cur_time, end_time, begin_time,
-                    account_id, title)
-
-    modify_schedule_by_user(schedule_id, user_time)
-
     hours = int((user_time - begin_time_st)/3600)
     min = int(((user_time - begin_time_st) % 3600)/60)
 
@@ -149,8 +147,7 @@ def confirm_out(account_id, current_date, create_time, callback):
     :param callback: User triggered callback.
     :return: None
     """
-    contents = yield deal_confirm_out(account_id, create_time, callback)
+    contents = yield deal_confirm_out(account_id, current_date,
+                                      create_time, callback)
 
-    set_status_by_user_date(account_id, current_date,
-                            status="out_done", process="sign_out_done")
     yield push_messages(account_id, contents)
@@ -28,21 +28,72 @@ import logging
 from tornado.web import HTTPError
 from attendance_management_bot.common.local_timezone import local_date_time
 from attendance_management_bot.externals.send_message import push_messages
-from attendance_management_bot.actions.message import invalid_message, error_message
-from attendance_management_bot.actions.direct_sign_in import deal_sign_in
-from attendance_management_bot.actions.direct_sign_out import deal_sign_out
-from attendance_management_bot.model.processStatusDBHandle import get_status_by_user, \
-    set_status_by_user_date
+from attendance_management_bot.actions.message import invalid_message, \
+    error_message, number_message
+from attendance_management_bot.actions.direct_sign_in import \
+    deal_sign_in_message
+from attendance_management_bot.actions.direct_sign_out import \
+    deal_sign_out_message
+from attendance_management_bot.model.asyncDBHandle import get_status_by_user, \
+    enter_time_by_user
 
 LOGGER = logging.getLogger("attendance_management_bot")
 
 
+def parse_user_time(date_time, message):
+    """
+    :return: timestamp of the "hhmm" message on the day of date_time,
+        None if the message is not a valid time.
+    """
+    if len(message) != 4 or not message.isdigit():
+        return None
+
+    hour = int(message[:2])
+    minute = int(message[2:])
+    if hour > 23 or minute > 59:
+        return None
+
+    tm = date_time.replace(hour=hour, minute=minute)
+    return int(tm.timestamp())
+
+
+@tornado.gen.coroutine
+def deal_invalid_time(account_id, current_date, message):
+    content = yield get_status_by_user(account_id, current_date)
+
+    if content is None or content[0] is None:
+        LOGGER.info("status is None account_id:%s message:%s content:%s",
+                    account_id, message, str(content))
+        raise HTTPError(403, "Messages not need to be processed")
+
+    status = content[0]
+    process = content[1]
+    if status == "wait_in" or status == "wait_out":
+        return error_message()
+
+    try:
+        int(message)
+    except Exception:
+        raise HTTPError(403, "Messages not need to be processed")
+
+    if len(message) != 4:
+        return error_message()
+
+    if process == "sign_in_done" or process == "sign_out_done":
+        return [invalid_message()]
+
+    LOGGER.info("can't deal this message account_id:%s message:%s status:%s",
+                account_id, message, status)
+    raise HTTPError(403, "Messages not need to be processed")
+
+
 @tornado.gen.coroutine
 def deal_user_message(account_id, current_date, create_time, message):
     """
     Process messages entered by users,
     Different scenarios need different processing functions.
     Please see the internal implementation of the handler.
+    A valid time is taken in one statement, see enter_time_by_user.
 
     :param account_id: user account id.
     :param current_date: current date by local time.
@@ -53,47 +104,32 @@ def deal_user_message(account_id, current_date, create_time, message):
 
     date_time = local_date_time(create_time)
 
-    content = get_status_by_user(account_id, current_date)
+    user_time_ticket = parse_user_time(date_time, message)
+    if user_time_ticket is None:
+        contents = yield deal_invalid_time(account_id, current_date, message)
+        return contents
+
+    content = yield enter_time_by_user(account_id, current_date,
+                                       user_time_ticket)
 
     if content is None or content[0] is None:
         LOGGER.info("status is None account_id:%s message:%s content:%s",
                     account_id, message, str(content))
         raise HTTPError(403, "Messages not need to be processed")
 
-    status = content[0]
-    process = content[1]
-    try:
-        user_time = int(message)
-    except Exception:
-        if status == "wait_in" or status == "wait_out":
-            return error_message()
-        else:
-            raise HTTPError(403, "Messages not need to be processed")
-
-    if len(message) != 4:
-        return error_message()
-
-    hour = int(user_time / 100)
-    minute = int(user_time % 100)
-    if (status == "wait_in" or status == "wait_out") \
-            and ((hour < 0 or hour > 23) or (minute < 0 or minute > 59)):
-        return error_message()
-
-    tm = date_time.replace(hour=hour, minute=minute)
-    user_time_ticket = int(tm.timestamp())
-
+    status, process, begin_time, new_status = content
     if status == "wait_in":
-        content = yield deal_sign_in(account_id,
-                                     current_date, user_time_ticket, True)
-        set_status_by_user_date(account_id, current_date, status="in_done")
-        return [content]
+        if process is not None:
+            return [invalid_message()]
+        return [deal_sign_in_message(user_time_ticket, True)]
     if status == "wait_out":
-        content, status = yield deal_sign_out(account_id,
-                                      current_date, user_time_ticket, True)
-        if status:
-            set_status_by_user_date(account_id, current_date, status="out_done")
-
-        return content
+        if process != "sign_in_done":
+            return [invalid_message()]
+        if begin_time is None:
+            raise HTTPError(500, "Internal data error")
+        if new_status is None:
+            return number_message()
+        return [deal_sign_out_message(user_time_ticket, True)]
     if process == "sign_in_done" or process == "sign_out_done":
         return [invalid_message()]
 
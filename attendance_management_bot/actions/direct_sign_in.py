@@ -30,7 +30,7 @@ from attendance_management_bot.model.i18n_data import make_i18n_text
 from attendance_management_bot.externals.send_message import push_message
 from attendance_management_bot.actions.message import invalid_message, TimeStruct, \
     create_quick_replay_items
-from attendance_management_bot.model.processStatusDBHandle \
+from attendance_management_bot.model.asyncDBHandle \
     import get_status_by_user, delete_status_by_user_date
 import gettext
 _ = gettext.gettext
@@ -75,7 +75,7 @@ def deal_sign_in_message(sign_time, manual_flag):
 
 @tornado.gen.coroutine
 def deal_sign_in(account_id, current_date, sign_time, manual_flag=False):
-    content = get_status_by_user(account_id, current_date)
+    content = yield get_status_by_user(account_id, current_date)
 
     if content is not None:
         status = content[0]
@@ -84,7 +84,7 @@ def deal_sign_in(account_id, current_date, sign_time, manual_flag=False):
             return invalid_message()
 
         if status == "wait_in" or status == "in_done":
-            delete_status_by_user_date(account_id, current_date)
+            yield delete_status_by_user_date(account_id, current_date)
 
     return deal_sign_in_message(sign_time, manual_flag)
 
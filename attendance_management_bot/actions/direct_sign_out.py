@@ -25,15 +25,14 @@ __all__ = ['deal_sign_out_message', 'deal_sign_out']
 import tornado.web
 import logging
 import asyncio
+from tornado.web import HTTPError
 from attendance_management_bot.model.data import make_quick_reply
 from attendance_management_bot.model.i18n_data import make_i18n_text
 from attendance_management_bot.externals.send_message import push_messages
 from attendance_management_bot.actions.message import invalid_message, \
     TimeStruct, create_quick_replay_items, number_message
-from attendance_management_bot.model.calendarDBHandle \
-    import get_schedule_by_user
-from attendance_management_bot.model.processStatusDBHandle \
-    import get_status_by_user, set_status_by_user_date
+from attendance_management_bot.model.asyncDBHandle \
+    import get_schedule_by_user, get_status_by_user, set_status_by_user_date
 import gettext
 _ = gettext.gettext
 
@@ -76,7 +75,7 @@ def deal_sign_out_message(sign_time, manual_flag=False):
 
 @tornado.gen.coroutine
 def deal_sign_out(account_id, current_date, sign_time, manual_flag=False):
-    content = get_status_by_user(account_id, current_date)
+    content = yield get_status_by_user(account_id, current_date)
     process = None
     if content is not None:
         status = content[0]
@@ -86,15 +85,17 @@ def deal_sign_out(account_id, current_date, sign_time, manual_flag=False):
         return [invalid_message()], True
 
     if status == "wait_out" or status == "out_done":
-        set_status_by_user_date(account_id, current_date, status="in_done")
+        yield set_status_by_user_date(account_id, current_date,
+                                      status="in_done")
 
-    info = get_schedule_by_user(account_id, current_date)
+    info = yield get_schedule_by_user(account_id, current_date)
     if info is None:
         raise HTTPError(500, "Internal data error")
     begin_time_st = info[1]
     user_time = TimeStruct(sign_time)
     if int(user_time.str_current_time_tick) < begin_time_st:
-        set_status_by_user_date(account_id, current_date, status="wait_out")
+        yield set_status_by_user_date(account_id, current_date,
+                                      status="wait_out")
         return number_message(), False
 
     return [deal_sign_out_message(sign_time, manual_flag)], True
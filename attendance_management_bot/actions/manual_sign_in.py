@@ -28,15 +28,17 @@ import logging
 from attendance_management_bot.model.i18n_data import make_i18n_text
 from attendance_management_bot.externals.send_message import push_messages
 from attendance_management_bot.actions.message import invalid_message, prompt_input
-from attendance_management_bot.model.processStatusDBHandle \
+from attendance_management_bot.model.asyncDBHandle \
     import get_status_by_user, insert_replace_status_by_user_date, \
     delete_status_by_user_date
+from attendance_management_bot.common.prerender import static_message
 import gettext
 _ = gettext.gettext
 
 LOGGER = logging.getLogger("attendance_management_bot")
 
 
+@static_message()
 def manual_sign_in_message():
     """
     generate manual check-in message
@@ -62,7 +64,7 @@ def manual_sign_in_content(account_id, current_date):
     :return: message content list
     """
 
-    content = get_status_by_user(account_id, current_date)
+    content = yield get_status_by_user(account_id, current_date)
 
     if content is not None:
         status = content[0]
@@ -71,11 +73,12 @@ def manual_sign_in_content(account_id, current_date):
             return [invalid_message()]
 
         if status == "wait_in" or status == "in_done":
-            delete_status_by_user_date(account_id, current_date)
+            yield delete_status_by_user_date(account_id, current_date)
 
     yield asyncio.sleep(1)
 
-    insert_replace_status_by_user_date(account_id, current_date, "wait_in")
+    yield insert_replace_status_by_user_date(account_id, current_date,
+                                             "wait_in")
 
     return manual_sign_in_message()
 
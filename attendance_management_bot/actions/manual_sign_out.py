@@ -29,14 +29,16 @@ from attendance_management_bot.model.i18n_data import make_i18n_text
 from attendance_management_bot.externals.send_message import push_messages
 from attendance_management_bot.actions.message import invalid_message, \
     prompt_input
-from attendance_management_bot.model.processStatusDBHandle \
+from attendance_management_bot.model.asyncDBHandle \
     import get_status_by_user, set_status_by_user_date
+from attendance_management_bot.common.prerender import static_message
 import gettext
 _ = gettext.gettext
 
 LOGGER = logging.getLogger("attendance_management_bot")
 
 
+@static_message()
 def manual_sign_out_message():
     """
     generate manual check-out message
@@ -62,7 +64,7 @@ def manual_sign_out_content(account_id, current_date):
     :return: message content list
     """
 
-    content = get_status_by_user(account_id, current_date)
+    content = yield get_status_by_user(account_id, current_date)
     process = None
     if content is not None:
         status = content[0]
@@ -72,10 +74,11 @@ def manual_sign_out_content(account_id, current_date):
         return [invalid_message()]
 
     if status == "wait_out" or status == "out_done":
-        set_status_by_user_date(account_id, current_date, status="in_done")
+        yield set_status_by_user_date(account_id, current_date,
+                                      status="in_done")
 
     yield asyncio.sleep(1)
-    set_status_by_user_date(account_id, current_date, "wait_out")
+    yield set_status_by_user_date(account_id, current_date, "wait_out")
 
     return manual_sign_out_message()
 
@@ -31,6 +31,7 @@ from attendance_management_bot.model.i18n_data import make_i18n_message_action,
     make_i18n_postback_action, make_i18n_text
 from attendance_management_bot.constant import API_BO, IMAGE_CAROUSEL, RICH_MENUS
 from attendance_management_bot.common.local_timezone import local_date_time
+from attendance_management_bot.common.prerender import static_message
 import gettext
 _ = gettext.gettext
 
@@ -103,6 +104,7 @@ def create_quick_replay_items(confirm_callback, previous_callback):
     return [reply_item1, reply_item2]
 
 
+@static_message()
 def prompt_input():
     """
     Format to remind users to enter time.
@@ -121,6 +123,7 @@ def prompt_input():
                           "message", fmt)
 
 
+@static_message()
 def number_message():
     """
     Non digital message entered.
@@ -139,6 +142,7 @@ def number_message():
     return [text1, text2]
 
 
+@static_message()
 def error_message():
     """
     Wrong data entered
@@ -155,6 +159,7 @@ def error_message():
     return [text1, text2]
 
 
+@static_message()
 def invalid_message():
     """
     Invalid input data reminder.
@@ -171,6 +176,7 @@ def invalid_message():
                           "message", fmt)
 
 
+@static_message(("sign_in_done",), ("sign_out_done",), (None,))
 def reminder_message(process):
     """
     Illegal request reminder.
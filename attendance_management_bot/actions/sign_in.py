@@ -28,14 +28,16 @@ from attendance_management_bot.model.i18n_data import make_i18n_button
 from attendance_management_bot.externals.send_message import push_message
 from attendance_management_bot.actions.message \
     import reminder_message, create_button_actions
-from attendance_management_bot.model.processStatusDBHandle \
+from attendance_management_bot.model.asyncDBHandle \
     import delete_status_by_user_date, get_status_by_user
+from attendance_management_bot.common.prerender import static_message
 import gettext
 _ = gettext.gettext
 
 LOGGER = logging.getLogger("attendance_management_bot")
 
 
+@static_message()
 def sign_in_message():
     """
     generate check-in message
@@ -61,13 +63,13 @@ def sign_in_content(account_id, current_date):
     :retrurn: button type message content
     """
 
-    content = get_status_by_user(account_id, current_date)
+    content = yield get_status_by_user(account_id, current_date)
     process = None
     if content is not None:
         status = content[0]
         process = content[1]
         if status == "wait_in":
-            delete_status_by_user_date(account_id, current_date)
+            yield delete_status_by_user_date(account_id, current_date)
 
     if process is not None:
         return reminder_message("sign_in_done")
@@ -28,14 +28,16 @@ from attendance_management_bot.model.i18n_data import make_i18n_button
 from attendance_management_bot.externals.send_message import push_message
 from attendance_management_bot.actions.message \
     import reminder_message, create_button_actions
-from attendance_management_bot.model.processStatusDBHandle \
+from attendance_management_bot.model.asyncDBHandle \
     import set_status_by_user_date, get_status_by_user
+from attendance_management_bot.common.prerender import static_message
 import gettext
 _ = gettext.gettext
 
 LOGGER = logging.getLogger("attendance_management_bot")
 
 
+@static_message()
 def sign_out_message():
     """
     generate check-out message
@@ -58,13 +60,14 @@ def sign_out_content(account_id, current_date):
     :return: button type message content
     """
 
-    content = get_status_by_user(account_id, current_date)
+    content = yield get_status_by_user(account_id, current_date)
     process = None
     if content is not None:
         status = content[0]
         process = content[1]
         if status == "wait_out":
-            set_status_by_user_date(account_id, current_date, status="in_done")
+            yield set_status_by_user_date(account_id, current_date,
+                                          status="in_done")
 
     if process is None or process != "sign_in_done":
         return reminder_message(process)
@@ -20,7 +20,7 @@ limitations under the License.
 Start using robots
 """
 
-__all__ = ['image_introduce', 'sign', 'start']
+__all__ = ['greeting', 'image_introduce', 'sign', 'start']
 
 import tornado.web
 import logging
@@ -35,12 +35,14 @@ from attendance_management_bot.externals.send_message import push_messages
 from attendance_management_bot.common.global_data import get_value
 from attendance_management_bot.externals.richmenu \
     import set_user_specific_rich_menu
+from attendance_management_bot.common.prerender import static_message
 import gettext
 _ = gettext.gettext
 
 LOGGER = logging.getLogger("attendance_management_bot")
 
 
+@static_message()
 def image_introduce():
     """
     This function constructs three image carousels for self introduction.
@@ -86,21 +88,28 @@ def sign(account_id):
         LOGGER.error("get rich_menu_id failed.")
         raise Exception("get rich_menu_id failed.")
 
-    return set_user_specific_rich_menu(rich_menu_id, account_id)
+    yield set_user_specific_rich_menu(rich_menu_id, account_id)
 
 
-@tornado.gen.coroutine
-def start_content(account_id):
-    yield sign(account_id)
+@static_message()
+def greeting():
+    """
+    The first message of the bot.
 
+    :return: text type message content.
+    """
     fmt = _("Hello, I'm an attendance management bot of WORKS "
             "that helps your timeclock management and entry.")
-    content1 = make_i18n_text("Hello, I'm an attendance management bot of "
-                         "WORKS that helps your timeclock "
-                         "management and entry.", "start", fmt)
-    content2 = image_introduce()
+    return make_i18n_text("Hello, I'm an attendance management bot of "
+                          "WORKS that helps your timeclock "
+                          "management and entry.", "start", fmt)
+
+
+@tornado.gen.coroutine
+def start_content(account_id):
+    yield sign(account_id)
 
-    return [content1, content2]
+    return [greeting(), image_introduce()]
 
 
 @tornado.gen.coroutine
@@ -0,0 +1,69 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Calendar event of a saved schedule, run by the calendar sync worker.
+Check also: attendance_management_bot/calendar_sync.py
+"""
+
+__all__ = ['sync_schedule']
+
+import tornado.gen
+import logging
+from attendance_management_bot.common.local_timezone import local_date_time
+from attendance_management_bot.common.contacts import get_user_info_by_account
+from attendance_management_bot.externals.calendar_req import create_schedule, \
+    modify_schedule
+from attendance_management_bot.model.asyncDBHandle import replace_schedule_id
+from attendance_management_bot.actions import confirm_in, confirm_out
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+
+@tornado.gen.coroutine
+def sync_schedule(account_id, process, created, schedule_id,
+                  begin_time, end_time):
+    """
+    Create or update the calendar event of a schedule.
+
+    :param account_id: user account id.
+    :param process: sign_in_done before the check-out, else sign_out_done.
+    :param created: the calendar event exists.
+    :param schedule_id: schedule id, also the uid of the calendar event.
+    :param begin_time: check-in time, a timestamp.
+    :param end_time: check-out time, a timestamp.
+    """
+    begin = local_date_time(begin_time)
+    end = local_date_time(end_time)
+    current = local_date_time()
+
+    account = yield get_user_info_by_account(account_id)
+    if process == "sign_out_done":
+        title = confirm_out.schedule_title(account, end)
+    else:
+        title = confirm_in.schedule_title(account, begin)
+
+    if created:
+        yield modify_schedule(schedule_id, current, end, begin,
+                              account_id, title)
+        return
+
+    calendar_uid = yield create_schedule(current, end, begin, account_id,
+                                         title, uid=schedule_id)
+    if calendar_uid != schedule_id:
+        yield replace_schedule_id(schedule_id, calendar_uid)
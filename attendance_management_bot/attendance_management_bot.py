@@ -21,10 +21,11 @@ launch attendance_management_bot
 """
 
 __all__ = ['sig_handler', 'kill_server', 'init_logger', 'check_init_bot',
-           'init_rich_menu_first', 'init_calendar_first',
-           'start_attendance_management_bot']
+           'init_rich_menu_first', 'init_calendar_first', 'init_bot',
+           'init_worker', 'start_attendance_management_bot']
 
 import os
+import socket
 import logging
 from logging import StreamHandler
 import asyncio
@@ -33,52 +34,92 @@ import json
 import tornado.ioloop
 import tornado.web
 import tornado.httpserver
+import tornado.netutil
+import tornado.process
+import tornado.gen
 from tornado.httpclient import AsyncHTTPClient
 from tornado.options import define, options
 from attendance_management_bot.externals.richmenu import init_rich_menu
 from conf.config import DEFAULT_LANG
 from attendance_management_bot.common import global_data
+from attendance_management_bot.common.utils import configure_http_client
+from attendance_management_bot.common.token import token_manager
 from attendance_management_bot.externals.calendar_req import init_calendar
 from attendance_management_bot.constant import API_BO, RICH_MENUS
 from attendance_management_bot.model.initStatusDBHandle import insert_init_status, \
     get_init_status
+from attendance_management_bot.model.postgreSqlPool import close_pool
+from attendance_management_bot.model.i18n_catalog import load_catalogs
+from attendance_management_bot.common.prerender import prerender_messages
+from attendance_management_bot.model.asyncPostGreSqlPool import init_pool
 
 import psutil
 
 import attendance_management_bot.router
 import attendance_management_bot.contextlog
+from attendance_management_bot.callback_queue import drain_callback_queue
+from attendance_management_bot.calendar_sync import start_calendar_sync, \
+    stop_calendar_sync
+from attendance_management_bot.actions.sync_schedule import sync_schedule
+from attendance_management_bot.outbox import start_outbox, stop_outbox
+from attendance_management_bot.reminders import start_reminders, \
+    stop_reminders
+from attendance_management_bot.metrics import start_loop_lag_monitor
+from attendance_management_bot.externals.send_message import deliver_message
 from attendance_management_bot.settings import CALENDAR_PORT, CALENDAR_LOG_FMT, \
-    CALENDAR_LOG_LEVEL, CALENDAR_LOG_FILE, CALENDAR_LOG_ROTATE
+    CALENDAR_LOG_LEVEL, CALENDAR_LOG_FILE, CALENDAR_LOG_ROTATE, \
+    CALLBACK_DRAIN_TIMEOUT
 
 define("port", default=CALENDAR_PORT, help="server listen port. "
                                            "default 8080")
-define("workers", default=0, help="the count of workers. "
-                                  "default the same as cpu cores")
+define("workers", default=1, help="the count of worker processes, 0 for "
+                                  "the cpu cores. default 1. Each one has "
+                                  "its own database pools and sends "
+                                  "OUTBOX_RATE messages per second")
 define("logfile", default=None, help="the path for log")
 
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
+_forked = False
+# HTTPServer of this process, stopped first on shutdown.
+_server = None
+
 
 def sig_handler(sig, _):
     """
     signal handler
+    The parent of the workers forwards the signal to them, and exits
+    once they have all stopped. A worker, or the single process when
+    there are no workers, stops its ioloop.
     """
     print("sig %s received" % str(sig))
-    try:
-        parent = psutil.Process(os.getpid())
-        children = parent.children()
-        for process in children:
-            process.send_signal(sig)
-    except (psutil.NoSuchProcess, psutil.ZombieProcess,
-            psutil.AccessDenied) as ex:
-        print(str(ex))
-    tornado.ioloop.IOLoop.instance().add_callback(kill_server)
-
-
+    if tornado.process.task_id() is None:
+        try:
+            parent = psutil.Process(os.getpid())
+            children = parent.children()
+            for process in children:
+                process.send_signal(sig)
+        except (psutil.NoSuchProcess, psutil.ZombieProcess,
+                psutil.AccessDenied) as ex:
+            print(str(ex))
+        if _forked:
+            return
+    tornado.ioloop.IOLoop.current().add_callback_from_signal(kill_server)
+
+
+@tornado.gen.coroutine
 def kill_server():
     """
-    stop the ioloop
+    stop the ioloop, once the queued callbacks, the reminders being
+    queued, the messages being sent and the calendar requests in progress
+    are handled. New connections are refused first, so that no callback
+    is acknowledged while the queue is drained.
     """
+    if _server is not None:
+        _server.stop()
+    yield drain_callback_queue(CALLBACK_DRAIN_TIMEOUT)
+    yield stop_reminders()
+    yield [stop_outbox(), stop_calendar_sync()]
     asyncio.get_event_loop().stop()
 
 
@@ -114,6 +155,7 @@ def check_init_bot():
     global_data.set_value("bot_no", extra)
 
 
+@tornado.gen.coroutine
 def init_rich_menu_first():
     """
     Initialize rich menu API. Check also: attendance_management_bot/externals/richmenu.py
@@ -124,7 +166,7 @@ def init_rich_menu_first():
     extra = get_init_status("rich_menu")
 
     if extra is None:
-        rich_menus = init_rich_menu(DEFAULT_LANG)
+        rich_menus = yield init_rich_menu(DEFAULT_LANG)
         insert_init_status("rich_menu", json.dumps(rich_menus))
     else:
         rich_menus = json.loads(extra)
@@ -139,18 +181,54 @@ def init_rich_menu_first():
     global_data.set_value(DEFAULT_LANG, rich_menu_id)
 
 
+@tornado.gen.coroutine
 def init_calendar_first():
     """
     Initialize calendar API.
     """
     calendar_id = get_init_status("calendar")
     if calendar_id is None:
-        calendar_id = init_calendar()
+        calendar_id = yield init_calendar()
         insert_init_status("calendar", calendar_id)
 
     global_data.set_value(API_BO["calendar"]["name"], calendar_id)
 
 
+def init_bot():
+    """
+    Initialize bot no, rich menu and calendar once, before fork.
+    The workers inherit them from global_data.
+    The IOLoop used here is closed, the workers must not share it.
+    """
+    load_catalogs()
+    prerender_messages()
+    configure_http_client()
+    check_init_bot()
+    io_loop = tornado.ioloop.IOLoop.current()
+    io_loop.run_sync(init_rich_menu_first)
+    io_loop.run_sync(init_calendar_first)
+    AsyncHTTPClient().close()
+    io_loop.close(all_fds=False)
+    close_pool()
+
+
+def init_worker():
+    """
+    Per process initialization, after fork:
+    a new IOLoop, its HTTP client, the database pool,
+    the calendar sync, the outbox and the reminder workers,
+    the loop lag monitor.
+    """
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    configure_http_client()
+    token_manager.reschedule()
+    tornado.ioloop.IOLoop.current().run_sync(init_pool)
+    start_calendar_sync(sync_schedule)
+    start_outbox(deliver_message)
+    start_reminders()
+    start_loop_lag_monitor()
+
+
 def start_attendance_management_bot():
     """
     the attendance_management_bot launch code
@@ -174,18 +252,25 @@ def start_attendance_management_bot():
         - https://developers.worksmobile.com/jp/document/3005001?lang=en
     """
 
-    server = tornado.httpserver.HTTPServer(attendance_management_bot.router.getRouter())
-
-    server.bind(options.port)
-    server.start(1)
+    global _forked, _server
 
     init_logger()
-    check_init_bot()
-    init_rich_menu_first()
-    init_calendar_first()
+    sockets = tornado.netutil.bind_sockets(
+        options.port, reuse_port=hasattr(socket, "SO_REUSEPORT"))
+
+    init_bot()
+
+    if options.workers != 1:
+        _forked = True
+        tornado.process.fork_processes(options.workers)
+
+    init_worker()
+
+    _server = tornado.httpserver.HTTPServer(
+        attendance_management_bot.router.getRouter())
+    _server.add_sockets(sockets)
 
     asyncio.get_event_loop().run_forever()
-    server.stop()
     asyncio.get_event_loop().close()
 
     print("exit...")
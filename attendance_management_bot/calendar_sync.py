@@ -0,0 +1,218 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Write-behind of the calendar events.
+confirm_in and confirm_out save the times and queue the schedule in
+bot_calendar_sync in the same statement, then answer the user.
+The worker of each process takes the due schedules, creates or updates
+their calendar events and retries the failed ones with an exponential
+backoff. The queue is in the database, so it survives a restart and is
+shared by the worker processes.
+Check also: attendance_management_bot/actions/sync_schedule.py
+Check also: attendance_management_bot/model/sqlStatements.py
+"""
+
+__all__ = ['CalendarSync', 'retry_delay', 'start_calendar_sync',
+           'notify_calendar_sync', 'stop_calendar_sync',
+           'get_calendar_sync_stats']
+
+import os
+import logging
+import datetime
+import tornado.gen
+import tornado.ioloop
+import tornado.locks
+from attendance_management_bot.common.ratelimit import backoff_delay
+from attendance_management_bot.model.asyncDBHandle import \
+    claim_calendar_sync, done_calendar_sync, fail_calendar_sync
+from attendance_management_bot.settings import CALENDAR_SYNC_BATCH, \
+    CALENDAR_SYNC_INTERVAL, CALENDAR_SYNC_LEASE, \
+    CALENDAR_SYNC_MAX_ATTEMPTS, CALENDAR_SYNC_BACKOFF, \
+    CALENDAR_SYNC_MAX_BACKOFF
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+
+def retry_delay(attempts):
+    """
+    :param attempts: failed attempts, from 1.
+    :return: seconds before the next attempt, None after the last one.
+    """
+    if attempts >= CALENDAR_SYNC_MAX_ATTEMPTS:
+        return None
+    return backoff_delay(attempts, CALENDAR_SYNC_BACKOFF,
+                         CALENDAR_SYNC_MAX_BACKOFF)
+
+
+class CalendarSync:
+    """
+    Takes the due schedules of bot_calendar_sync, at most `batch` at a time,
+    and calls `sync` for each of them.
+    sync(account_id, process, created, schedule_id, begin_time, end_time)
+    is a coroutine creating the calendar event if created is False,
+    else updating it.
+    """
+
+    def __init__(self, sync, batch=CALENDAR_SYNC_BATCH,
+                 interval=CALENDAR_SYNC_INTERVAL):
+        self.__sync = sync
+        self.__batch = batch
+        self.__interval = interval
+        self.__wakeup = tornado.locks.Event()
+        self.__stopped = tornado.locks.Event()
+        self.__stopped.set()
+        self.__running = False
+        self.__synced = 0
+        self.__retried = 0
+        self.__failed = 0
+
+    def start(self):
+        if self.__running:
+            return
+        self.__running = True
+        self.__stopped.clear()
+        tornado.ioloop.IOLoop.current().spawn_callback(self.__loop)
+
+    def notify(self):
+        """
+        A schedule was queued, take it without waiting for the next scan.
+        """
+        self.__wakeup.set()
+
+    def stop(self):
+        """
+        :return: Future, done when the current schedules are handled.
+        """
+        self.__running = False
+        self.__wakeup.set()
+        return self.__stopped.wait()
+
+    @tornado.gen.coroutine
+    def __loop(self):
+        try:
+            while self.__running:
+                self.__wakeup.clear()
+                try:
+                    count = yield self.run_once()
+                except Exception:
+                    LOGGER.exception("calendar sync failed.")
+                    count = 0
+                if count >= self.__batch:
+                    continue
+                try:
+                    yield self.__wakeup.wait(
+                        timeout=datetime.timedelta(seconds=self.__interval))
+                except tornado.gen.TimeoutError:
+                    pass
+        finally:
+            self.__stopped.set()
+
+    @tornado.gen.coroutine
+    def run_once(self):
+        """
+        Handle the schedules due now.
+
+        :return: the number of schedules taken.
+        """
+        rows = yield claim_calendar_sync(self.__batch, CALENDAR_SYNC_LEASE)
+        yield [self.__sync_row(row) for row in rows]
+        return len(rows)
+
+    @tornado.gen.coroutine
+    def __sync_row(self, row):
+        account_id, date, process, created, version, attempts, \
+            schedule_id, begin_time, end_time = row
+        try:
+            yield self.__sync(account_id, process, created,
+                              schedule_id, begin_time, end_time)
+        except Exception as ex:
+            delay = retry_delay(attempts)
+            if delay is None:
+                self.__failed += 1
+                LOGGER.error("calendar sync gave up. account_id:%s date:%s "
+                             "attempts:%d %s", account_id, date, attempts,
+                             str(ex))
+            else:
+                self.__retried += 1
+                LOGGER.info("calendar sync retried in %.0fs. account_id:%s "
+                            "date:%s attempts:%d %s", delay, account_id,
+                            date, attempts, str(ex))
+            yield fail_calendar_sync(account_id, date, version, delay,
+                                     str(ex))
+            return
+
+        self.__synced += 1
+        yield done_calendar_sync(account_id, date, version)
+
+    def stats(self):
+        return {
+            "running": self.__running,
+            "synced": self.__synced,
+            "retried": self.__retried,
+            "failed": self.__failed,
+        }
+
+
+_workers = {}
+
+
+def start_calendar_sync(sync):
+    """
+    Start the worker of this process, on the current IOLoop.
+
+    :param sync: Check also: CalendarSync
+    """
+    pid = os.getpid()
+    if pid in _workers:
+        return
+    _workers.clear()
+    worker = CalendarSync(sync)
+    worker.start()
+    _workers[pid] = worker
+
+
+def notify_calendar_sync():
+    """
+    Wake the worker of this process up, if it is started.
+    """
+    worker = _workers.get(os.getpid(), None)
+    if worker is not None:
+        worker.notify()
+
+
+@tornado.gen.coroutine
+def stop_calendar_sync():
+    """
+    Stop the worker of this process. The schedules still pending stay
+    in bot_calendar_sync for the next start.
+    """
+    worker = _workers.get(os.getpid(), None)
+    if worker is None:
+        return
+    yield worker.stop()
+
+
+def get_calendar_sync_stats():
+    """
+    :return: CalendarSync.stats of this process, None if not started.
+    """
+    worker = _workers.get(os.getpid(), None)
+    if worker is None:
+        return None
+    return worker.stats()
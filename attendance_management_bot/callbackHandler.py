@@ -26,6 +26,10 @@ import json
 import logging
 import tornado.web
 from attendance_management_bot.check_and_handle_actions import CheckAndHandleActions
+from attendance_management_bot.callback_queue import get_callback_queue
+from attendance_management_bot.callback_dedup import callback_dedup
+from attendance_management_bot.metrics import CALLBACK_SECONDS
+from attendance_management_bot.settings import CALLBACK_ACK_FIRST
 
 LOGGER = logging.getLogger("attendance_management_bot")
 
@@ -44,7 +48,12 @@ class CallbackHandler(tornado.web.RequestHandler):
     def post(self):
         """
         Implement the handle to corresponding HTTP method.
+        With CALLBACK_ACK_FIRST, answer once the body is checked
+        and queue the work.
+        A retried callback is answered without handling it again.
         Check also: attendance_management_bot/router.py
+        Check also: attendance_management_bot/callback_queue.py
+        Check also: attendance_management_bot/callback_dedup.py
         """
 
         LOGGER.info("request para path:%s", self.request.uri)
@@ -55,6 +64,29 @@ class CallbackHandler(tornado.web.RequestHandler):
             LOGGER.exception('Failed parse json:%s' % self.request.body)
             raise tornado.web.HTTPError(403, "boy is not json.")
         checker = CheckAndHandleActions()
-        yield checker.execute(body)
+        checker.check(body)
+        code = yield callback_dedup.begin(checker.callback_key)
+        if code is not None:
+            LOGGER.info("duplicate callback. account_id:%s code:%d",
+                        checker.account_id, code)
+            self.set_status(code)
+            self.finish()
+            return
+
+        if CALLBACK_ACK_FIRST:
+            try:
+                get_callback_queue().put(checker)
+            except Exception:
+                yield callback_dedup.forget(checker.callback_key)
+                raise
+        else:
+            yield checker.run()
 
         self.finish()
+
+    def on_finish(self):
+        """
+        Record the time taken to answer, errors included.
+        """
+        CALLBACK_SECONDS.observe(self.request.request_time(),
+                                 str(self.get_status()))
@@ -0,0 +1,169 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Deduplication of the callbacks.
+The server sends a callback again when the bot answers too slowly. A
+callback is recorded with a hash of its account, type, postback, text
+and creation time, in memory for the retries to the same process and
+in bot_callback_dedup for the other processes. A retry is answered
+with the outcome of the first callback and is not handled again.
+A callback that failed is forgotten, so its retry is handled.
+Check also: attendance_management_bot/callbackHandler.py
+"""
+
+__all__ = ['callback_key', 'CallbackDedup', 'callback_dedup']
+
+import json
+import time
+import hashlib
+import logging
+import collections
+import tornado.gen
+import tornado.ioloop
+from attendance_management_bot.model.asyncDBHandle import claim_callback, \
+    finish_callback, forget_callback, clean_callbacks
+from attendance_management_bot.settings import CALLBACK_DEDUP_SIZE, \
+    CALLBACK_DEDUP_TTL, CALLBACK_DEDUP_LEASE, CALLBACK_DEDUP_CLEANUP
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+
+def callback_key(body):
+    """
+    :param body: callback body, checked by CheckAndHandleActions.
+    :return: hash of the callback, None if it has no creation time,
+        two such callbacks can't be told from a retry.
+    """
+    created_time = body.get("createdTime", None)
+    if created_time is None:
+        return None
+    content = body.get("content", None) or {}
+    fields = [body["source"]["accountId"], body.get("type", None),
+              body.get("data", None), content.get("postback", None),
+              content.get("text", None), created_time]
+    data = json.dumps(fields, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class CallbackDedup:
+    """
+    The outcome of the callbacks, by key. None while it is handled.
+    """
+
+    def __init__(self, store=True, size=CALLBACK_DEDUP_SIZE,
+                 ttl=CALLBACK_DEDUP_TTL, lease=CALLBACK_DEDUP_LEASE,
+                 cleanup=CALLBACK_DEDUP_CLEANUP):
+        self.__store = store
+        self.__size = size
+        self.__ttl = ttl
+        self.__lease = lease
+        self.__cleanup = cleanup
+        self.__cleaned = time.monotonic()
+        # key -> [expiry time, status code]
+        self.__entries = collections.OrderedDict()
+        self.__duplicates = 0
+
+    def __remember(self, key, code, expires):
+        self.__entries[key] = [expires, code]
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.__size:
+            self.__entries.popitem(last=False)
+
+    @tornado.gen.coroutine
+    def begin(self, key):
+        """
+        Record a callback before it is handled.
+
+        :param key: Check also: callback_key, None to handle it anyway.
+        :return: None if the callback is to be handled, else the status
+            code to answer the retry with.
+        """
+        if key is None:
+            return None
+
+        now = time.monotonic()
+        entry = self.__entries.get(key, None)
+        if entry is not None and entry[0] > now:
+            self.__duplicates += 1
+            return 200 if entry[1] is None else entry[1]
+
+        self.__remember(key, None, now + self.__ttl)
+        if not self.__store:
+            return None
+
+        try:
+            claimed, code = yield claim_callback(key, self.__lease)
+        except Exception:
+            self.__entries.pop(key, None)
+            raise
+        self.__clean(now)
+        if claimed:
+            return None
+
+        # received by another process
+        self.__duplicates += 1
+        if code is None:
+            self.__remember(key, None, now + self.__lease)
+            return 200
+        self.__remember(key, code, now + self.__ttl)
+        return code
+
+    @tornado.gen.coroutine
+    def finish(self, key, code=200):
+        """
+        The callback was handled, its retries are answered with `code`.
+        """
+        if key is None:
+            return
+        self.__remember(key, code, time.monotonic() + self.__ttl)
+        if self.__store:
+            yield finish_callback(key, code)
+
+    @tornado.gen.coroutine
+    def forget(self, key):
+        """
+        The callback failed, its retries are handled.
+        """
+        if key is None:
+            return
+        self.__entries.pop(key, None)
+        if self.__store:
+            yield forget_callback(key)
+
+    def __clean(self, now):
+        if now - self.__cleaned < self.__cleanup:
+            return
+        self.__cleaned = now
+        tornado.ioloop.IOLoop.current().spawn_callback(self.__clean_store)
+
+    @tornado.gen.coroutine
+    def __clean_store(self):
+        try:
+            yield clean_callbacks(self.__ttl)
+        except Exception:
+            LOGGER.exception("clean callbacks failed.")
+
+    def stats(self):
+        return {
+            "size": len(self.__entries),
+            "duplicates": self.__duplicates,
+        }
+
+
+callback_dedup = CallbackDedup()
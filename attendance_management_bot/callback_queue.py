@@ -0,0 +1,180 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+In-process queue of the callbacks, for CALLBACK_ACK_FIRST mode.
+CallbackHandler answers LINE WORKS once the body is checked and leaves
+the work to a fixed number of consumers, so the number of callbacks
+handled at the same time is bounded.
+Check also: attendance_management_bot/callbackHandler.py
+"""
+
+__all__ = ['CallbackQueue', 'get_callback_queue', 'get_callback_queue_stats',
+           'drain_callback_queue']
+
+import os
+import time
+import logging
+import collections
+import datetime
+import tornado.gen
+import tornado.ioloop
+import tornado.queues
+from tornado.web import HTTPError
+from attendance_management_bot.settings import CALLBACK_QUEUE_SIZE, \
+    CALLBACK_CONSUMERS
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+
+class CallbackQueue:
+    """
+    FIFO queue of CheckAndHandleActions, drained by `consumers` coroutines.
+    """
+
+    def __init__(self, maxsize=CALLBACK_QUEUE_SIZE,
+                 consumers=CALLBACK_CONSUMERS):
+        self.__queue = tornado.queues.Queue(maxsize)
+        self.__enqueued_at = collections.deque()
+        self.__consumers = consumers
+        self.__started = False
+        self.__in_progress = 0
+        self.__processed = 0
+        self.__failed = 0
+        self.__rejected = 0
+
+    def start(self):
+        if self.__started:
+            return
+        self.__started = True
+        io_loop = tornado.ioloop.IOLoop.current()
+        for _ in range(self.__consumers):
+            io_loop.spawn_callback(self.__consume)
+
+    def put(self, checker):
+        """
+        Queue a checked callback.
+        raise HTTPError 503 if the queue is full, LINE WORKS will
+        then send the callback again.
+
+        :param checker: CheckAndHandleActions, after check.
+        """
+        try:
+            self.__queue.put_nowait(checker)
+        except tornado.queues.QueueFull:
+            self.__rejected += 1
+            LOGGER.error("callback queue is full. depth:%d",
+                         self.__queue.qsize())
+            raise HTTPError(503, "callback queue is full.")
+        self.__enqueued_at.append(time.time())
+
+    @tornado.gen.coroutine
+    def __consume(self):
+        while True:
+            checker = yield self.__queue.get()
+            self.__enqueued_at.popleft()
+            self.__in_progress += 1
+            try:
+                yield checker.run()
+                self.__processed += 1
+            except HTTPError as ex:
+                self.__processed += 1
+                LOGGER.info("callback not handled. account_id:%s %s",
+                            checker.account_id, str(ex))
+            except Exception:
+                self.__failed += 1
+                LOGGER.exception("callback failed. account_id:%s",
+                                 checker.account_id)
+            finally:
+                self.__in_progress -= 1
+                self.__queue.task_done()
+
+    def depth(self):
+        """
+        :return: callbacks waiting for a consumer.
+        """
+        return self.__queue.qsize()
+
+    def age(self):
+        """
+        :return: seconds the oldest waiting callback has been queued, 0
+            if none is waiting.
+        """
+        if not self.__enqueued_at:
+            return 0
+        return time.time() - self.__enqueued_at[0]
+
+    def stats(self):
+        return {
+            "depth": self.depth(),
+            "age": self.age(),
+            "max_size": self.__queue.maxsize,
+            "consumers": self.__consumers,
+            "in_progress": self.__in_progress,
+            "processed": self.__processed,
+            "failed": self.__failed,
+            "rejected": self.__rejected,
+        }
+
+    def join(self, timeout=None):
+        """
+        :return: Future, done when every queued callback has been handled.
+        """
+        return self.__queue.join(timeout)
+
+
+_queues = {}
+
+
+def get_callback_queue():
+    """
+    The queue of this worker process, created and started on first use.
+    """
+    pid = os.getpid()
+    queue = _queues.get(pid, None)
+    if queue is None:
+        _queues.clear()
+        queue = CallbackQueue()
+        queue.start()
+        _queues[pid] = queue
+    return queue
+
+
+def get_callback_queue_stats():
+    """
+    :return: CallbackQueue.stats of this process,
+        None if no callback has been queued.
+    """
+    queue = _queues.get(os.getpid(), None)
+    if queue is None:
+        return None
+    return queue.stats()
+
+
+@tornado.gen.coroutine
+def drain_callback_queue(timeout):
+    """
+    Wait until the queued callbacks are handled, at most timeout seconds.
+    """
+    queue = _queues.get(os.getpid(), None)
+    if queue is None:
+        return
+    try:
+        yield queue.join(timeout=datetime.timedelta(seconds=timeout))
+    except tornado.gen.TimeoutError:
+        LOGGER.error("callback queue not drained. %s", str(queue.stats()))
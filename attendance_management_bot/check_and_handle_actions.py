@@ -18,9 +18,13 @@ limitations under the License.
 
 """
 Factory used to create handler and execute handler.
+The handlers are found in tables keyed by the postback of the button,
+the postback of the content or the text of the message.
+Check also: register_action
 """
 
-__all__ = ['CheckAndHandleActions', 'execute']
+__all__ = ['CheckAndHandleActions', 'execute', 'check', 'run',
+           'register_action', 'parse_postback', 'is_message_time']
 
 import time
 import logging
@@ -39,15 +43,24 @@ from attendance_management_bot.actions.manual_sign_out import manual_sign_out
 from attendance_management_bot.actions.deal_message import deal_message
 from attendance_management_bot.actions.confirm_in import confirm_in
 from attendance_management_bot.actions.confirm_out import confirm_out
-from attendance_management_bot.model.processStatusDBHandle \
-    import clean_status_by_user
-from attendance_management_bot.model.calendarDBHandle \
-    import clean_schedule_by_user
+from attendance_management_bot.model.asyncDBHandle \
+    import clean_status_by_user, clean_schedule_by_user
+from attendance_management_bot.account_lanes import account_lanes
+from attendance_management_bot.callback_dedup import callback_key, \
+    callback_dedup
+from attendance_management_bot.metrics import ACTION_SECONDS
+from attendance_management_bot.settings import CALLBACK_DEDUP
 
 LOGGER = logging.getLogger("attendance_management_bot")
 
 cmd_message = ["start", "clean"]
 
+# name -> handler, by where the name is found in the callback.
+_POSTBACK_ACTIONS = {}
+_CONTENT_POSTBACK_ACTIONS = {}
+_TEXT_ACTIONS = {}
+
+
 def is_message_time(message):
     """
     Checks if the message should include time information.
@@ -63,22 +76,87 @@ def is_message_time(message):
     return True
 
 
+def parse_postback(data):
+    """
+    Split a postback like "confirm_in&time=1573631535" in one pass.
+
+    :param data: postback of the callback.
+    :return: (name, dict of the parameters)
+    """
+    name, _, query = data.partition("&")
+    params = {}
+    if query:
+        for item in query.split("&"):
+            key, _, value = item.partition("=")
+            params[key] = value
+    return name, params
+
+
+def register_action(name, handle, postback=True, content_postback=False,
+                    text=False):
+    """
+    Route the callbacks named `name` to `handle`.
+
+    :param name: postback name, before the parameters, or message text.
+    :param handle: coroutine handle(account_id, current_date, create_time,
+        message), message is the postback or the text of the callback.
+    :param postback: match the postback of a button.
+    :param content_postback: match the postback of the message content.
+    :param text: match the text of a message.
+    """
+    if postback:
+        _POSTBACK_ACTIONS[name] = handle
+    if content_postback:
+        _CONTENT_POSTBACK_ACTIONS[name] = handle
+    if text:
+        _TEXT_ACTIONS[name] = handle
+
+
+@tornado.gen.coroutine
+def run_action(handle, *args):
+    """
+    Run a handler and record its latency.
+    """
+    with ACTION_SECONDS.time(handle.__name__):
+        yield handle(*args)
+
+
+@tornado.gen.coroutine
+def clean(account_id, current_date, _, __):
+    """
+    Delete the user's status and schedule of today.
+    """
+    yield clean_status_by_user(account_id, current_date)
+    yield clean_schedule_by_user(account_id, current_date)
+
+
+register_action("start", start, postback=False, content_postback=True)
+register_action("clean", clean, postback=False, text=True)
+register_action("to_first", to_first)
+register_action("sign_in", sign_in)
+register_action("sign_out", sign_out)
+register_action("direct_sign_in", direct_sign_in, content_postback=True)
+register_action("direct_sign_out", direct_sign_out, content_postback=True)
+register_action("manual_sign_in", manual_sign_in, content_postback=True)
+register_action("manual_sign_out", manual_sign_out, content_postback=True)
+register_action("confirm_in", confirm_in)
+register_action("confirm_out", confirm_out)
+
+
 class CheckAndHandleActions:
     """
     Factory used to create handler and execute handler.
+    One per callback.
     """
 
-    __text = ""
-    __post_back = ""
-    __account_id = None
-    __create_time = None
-    __current_date = None
-    __content_type = ""
-    __content_post_back = ""
-    __handle = None
-    __user_message = None
+    __slots__ = ('__account_id', '__create_time', '__current_date',
+                 '__handle', '__user_message', '__callback_key')
 
     def __init__(self):
+        self.__account_id = None
+        self.__callback_key = None
+        self.__handle = None
+        self.__user_message = None
         self.__create_time = time.time()
         date_time = local_date_time(self.__create_time)
         self.__current_date = datetime.strftime(date_time, '%Y-%m-%d')
@@ -93,6 +171,16 @@ class CheckAndHandleActions:
             - https://developers.worksmobile.com/jp/document/100500901?lang=en
         """
 
+        self.check(body)
+        yield self.run()
+
+    def check(self, body):
+        """
+        Verify the body parameter and select the handler,
+        without touching the database or the APIs.
+        raise HTTPError if the body can't be handled.
+        """
+
         if body is None or "source" not in body or "accountId" \
                 not in body["source"]:
             raise HTTPError(403, "can't find 'accountId' field.")
@@ -105,71 +193,67 @@ class CheckAndHandleActions:
             raise HTTPError(403, "'accountId' is None.")
 
         type = body.get("type", "")
-        
+
+        content_type = ""
+        content_post_back = ""
+        text = None
         content = body.get("content", None)
         if content is not None:
-            self.__content_type = content.get("type", "")
-            self.__content_post_back = content.get("postback", "")
-            self.__text = content.get("text", None)
+            content_type = content.get("type", "")
+            content_post_back = content.get("postback", "")
+            text = content.get("text", None)
 
+        post_back = ""
         if type == "postback":
-            self.__post_back = body.get("data", "")
-
-        if type == "message" and self.__content_type == "text" \
-                and self.__content_post_back == "" \
-                and is_message_time(self.__text):
-            self.__user_message = self.__text
-            self.__handle = deal_message
-
-        elif self.__content_post_back == "start":
-            self.__handle = start
-
-        elif self.__text is not None and self.__text == "clean":
-            clean_status_by_user(self.__account_id, self.__current_date)
-            clean_schedule_by_user(self.__account_id, self.__current_date)
-
-        elif self.__post_back == "to_first":
-            self.__handle = to_first
-
-        elif self.__post_back == "sign_in":
-            self.__handle = sign_in
-
-        elif self.__post_back == "sign_out":
-            self.__handle = sign_out
-
-        elif self.__post_back == "direct_sign_in" \
-                or self.__content_post_back == "direct_sign_in":
-            self.__handle = direct_sign_in
-
-        elif self.__post_back == "direct_sign_out" \
-                or self.__content_post_back == "direct_sign_out":
-            self.__handle = direct_sign_out
-
-        elif self.__post_back == "manual_sign_in" \
-                or self.__content_post_back == "manual_sign_in":
-            self.__handle = manual_sign_in
-
-        elif self.__post_back == "manual_sign_out" \
-                or self.__content_post_back == "manual_sign_out":
-            self.__handle = manual_sign_out
-
-        elif self.__post_back.find("confirm_in") != -1:
-            self.__user_message = self.__post_back
-            if self.__post_back is None:
-                self.__user_message = self.__text
-            self.__handle = confirm_in
-
-        elif self.__post_back.find("confirm_out") != -1:
-            self.__user_message = self.__post_back
-            if self.__post_back is None:
-                self.__user_message = self.__text
-            self.__handle = confirm_out
-
-        if self.__handle is not None:
-            yield self.__handle(self.__account_id,
-                                self.__current_date,
-                                self.__create_time,
-                                self.__user_message)
-        else:
+            post_back = body.get("data", "")
+
+        if content_post_back:
+            self.__handle = _CONTENT_POSTBACK_ACTIONS.get(content_post_back,
+                                                          None)
+            self.__user_message = content_post_back
+        elif post_back:
+            name, _ = parse_postback(post_back)
+            self.__handle = _POSTBACK_ACTIONS.get(name, None)
+            self.__user_message = post_back
+        elif text is not None:
+            self.__handle = _TEXT_ACTIONS.get(text, None)
+            self.__user_message = text
+            if self.__handle is None and type == "message" \
+                    and content_type == "text" and is_message_time(text):
+                self.__handle = deal_message
+
+        if self.__handle is None:
             raise HTTPError(400, "Error 'callback' type.")
-        return
+
+        if CALLBACK_DEDUP:
+            self.__callback_key = callback_key(body)
+
+    @property
+    def account_id(self):
+        return self.__account_id
+
+    @property
+    def callback_key(self):
+        """
+        Check also: attendance_management_bot/callback_dedup.py
+        """
+        return self.__callback_key
+
+    @tornado.gen.coroutine
+    def run(self):
+        """
+        execute the handler selected by check,
+        after the callbacks of the same account that arrived before.
+        The outcome is recorded for the retries of the callback.
+        Check also: attendance_management_bot/account_lanes.py
+        """
+        try:
+            yield account_lanes.run(self.__account_id, run_action,
+                                    self.__handle, self.__account_id,
+                                    self.__current_date,
+                                    self.__create_time,
+                                    self.__user_message)
+        except Exception:
+            yield callback_dedup.forget(self.__callback_key)
+            raise
+        yield callback_dedup.finish(self.__callback_key)
@@ -0,0 +1,76 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Close-out of the days the users clocked in and never clocked out,
+every night from cron, Check also: scripts/close_out.py
+
+The days are found and closed by one statement, CLOSE_OUT_BATCH at a
+time, following CLOSE_OUT_POLICY:
+
+- end_time: clock them out at CLOSE_OUT_END_TIME, local time of their
+  day. Their calendar events are queued in bot_calendar_sync, the
+  calendar sync workers of the bot update them CALENDAR_SYNC_BATCH at
+  a time.
+- review: only flag them in bot_calendar_record.close_out, for the
+  managers to check.
+
+A day closed or flagged is not taken again, a run with nothing to close
+changes nothing.
+"""
+
+__all__ = ['POLICIES', 'close_out']
+
+import logging
+from conf.config import TZone
+from attendance_management_bot.common.local_timezone import local_date_time
+from attendance_management_bot.model.calendarDBHandle import close_out_days
+from attendance_management_bot.settings import CLOSE_OUT_POLICY, \
+    CLOSE_OUT_END_TIME, CLOSE_OUT_BATCH
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+POLICIES = ("end_time", "review")
+
+
+def close_out(date=None, policy=None):
+    """
+    Close the days before date still clocked in.
+
+    :param date: default the current date by local time.
+    :param policy: default CLOSE_OUT_POLICY.
+    :return: the number of days closed.
+    """
+    if date is None:
+        date = local_date_time().date()
+    if policy is None:
+        policy = CLOSE_OUT_POLICY
+    if policy not in POLICIES:
+        raise ValueError("unknown close-out policy %s" % (policy,))
+
+    count = 0
+    while True:
+        closed = close_out_days(date, policy, CLOSE_OUT_END_TIME, TZone,
+                                CLOSE_OUT_BATCH)
+        count += closed
+        if closed < CLOSE_OUT_BATCH:
+            break
+
+    LOGGER.info("close-out before %s: %d days, policy %s.",
+                date, count, policy)
+    return count
@@ -18,20 +18,34 @@ limitations under the License.
 
 """
 get a user info by account id.
+The names are cached in memory, per process, and in bot_contact_name,
+shared by the processes and kept across restarts.
+A name older than CONTACT_CACHE_TTL is still returned while it is
+refreshed in the background, up to CONTACT_CACHE_STALE.
+Unknown accounts are remembered for CONTACT_CACHE_NEGATIVE_TTL.
 """
 
-__all__ = ['get_user_info_by_account']
+__all__ = ['fetch_user_name', 'ContactCache', 'contact_cache',
+           'get_user_info_by_account']
 
 from attendance_management_bot.common.utils import auth_get, auth_post
 from attendance_management_bot.constant import API_BO, OPEN_API
+from attendance_management_bot.model.asyncDBHandle import \
+    get_contact_name, set_contact_name
+from attendance_management_bot.settings import CONTACT_CACHE_SIZE, \
+    CONTACT_CACHE_TTL, CONTACT_CACHE_STALE, CONTACT_CACHE_NEGATIVE_TTL
 from tornado.web import HTTPError
+import collections
 import logging
+import time
+import tornado.gen
 import pytz
 import json
 
 LOGGER = logging.getLogger("attendance_management_bot")
 
-def get_user_info_by_account(account_id):
+@tornado.gen.coroutine
+def fetch_user_name(account_id):
     """
     Get user info of account.
 
@@ -47,7 +61,7 @@ def get_user_info_by_account(account_id):
     accessUrl=https%3A%2F%2Fdevelopers.worksmobile.com
     %3A443%2Fconsole%2Fopenapi%2Fmain)
 
-    :return: external key
+    :return: user name, None if the account is unknown.
     """
     contacts_url = API_BO["TZone"]["contacts_url"]
     contacts_url = contacts_url.replace("_USER_ACCOUNT_ID_", account_id)
@@ -58,13 +72,165 @@ def get_user_info_by_account(account_id):
         "consumerKey": OPEN_API["consumerKey"]
     }
 
-    response = auth_get(contacts_url, headers=headers)
-    if response.status_code != 200 or response.content is None:
-        LOGGER.error("get user info failed. url:%s text:%s body:%s",
-                    contacts_url, response.text, response.content)
+    response = yield auth_get(contacts_url, headers=headers)
+    if response.code == 404:
+        LOGGER.info("unknown account. url:%s body:%s",
+                    contacts_url, response.body)
+        return None
+    if response.code != 200 or not response.body:
+        LOGGER.error("get user info failed. url:%s body:%s",
+                    contacts_url, response.body)
         raise HTTPError(500, "get user info. http return code error.")
-    tmp_req = json.loads(response.content)
-    name = tmp_req.get("name", None)
-    if name is None:
-        raise HTTPError(500, "internal error. name filed is none")
+    tmp_req = json.loads(response.body)
+    return tmp_req.get("name", None)
+
+
+class ContactCache:
+    """
+    LRU of at most `size` names, in front of bot_contact_name
+    (if `store`) and of `fetch`.
+    A name is requested once at a time for an account.
+    """
+
+    def __init__(self, fetch=fetch_user_name, store=True,
+                 size=CONTACT_CACHE_SIZE, ttl=CONTACT_CACHE_TTL,
+                 stale=CONTACT_CACHE_STALE,
+                 negative_ttl=CONTACT_CACHE_NEGATIVE_TTL):
+        self.__fetch = fetch
+        self.__store = store
+        self.__size = size
+        self.__ttl = ttl
+        self.__stale = stale
+        self.__negative_ttl = negative_ttl
+        # account -> (name, fresh until, stale until), monotonic times
+        self.__entries = collections.OrderedDict()
+        # account -> Future of the name, loaded or refreshed
+        self.__loading = {}
+        self.__refreshing = {}
+        self.__hits = 0
+        self.__stale_hits = 0
+        self.__store_hits = 0
+        self.__fetches = 0
+
+    @tornado.gen.coroutine
+    def get(self, account_id):
+        """
+        :return: user name.
+        raise HTTPError 500 if the account is unknown.
+        """
+        entry = self.__entries.get(account_id, None)
+        now = time.monotonic()
+        if entry is not None:
+            self.__entries.move_to_end(account_id)
+            name, fresh_until, stale_until = entry
+            if now < fresh_until:
+                self.__hits += 1
+                return self.__name(name)
+            if now < stale_until:
+                self.__stale_hits += 1
+                self.__revalidate(account_id)
+                return self.__name(name)
+
+        name = yield self.__single(account_id, self.__load, self.__loading)
+        return self.__name(name)
+
+    def __name(self, name):
+        if name is None:
+            raise HTTPError(500, "internal error. name filed is none")
+        return name
+
+    def __put(self, account_id, name, age=0):
+        now = time.monotonic()
+        if name is None:
+            fresh_until = now + self.__negative_ttl - age
+            stale_until = fresh_until
+        else:
+            fresh_until = now + self.__ttl - age
+            stale_until = now + self.__stale - age
+        self.__entries[account_id] = (name, fresh_until, stale_until)
+        self.__entries.move_to_end(account_id)
+        while len(self.__entries) > self.__size:
+            self.__entries.popitem(last=False)
+
+    def __single(self, account_id, load, futures):
+        future = futures.get(account_id, None)
+        if future is None:
+            future = load(account_id)
+            futures[account_id] = future
+            future.add_done_callback(
+                lambda _: futures.pop(account_id, None))
+        return future
+
+    def __revalidate(self, account_id):
+        if account_id in self.__refreshing:
+            return
+
+        def done(future):
+            if future.exception() is not None:
+                LOGGER.error("refresh user name failed. account_id:%s %s",
+                             account_id, str(future.exception()))
+
+        self.__single(account_id, self.__refresh,
+                      self.__refreshing).add_done_callback(done)
+
+    @tornado.gen.coroutine
+    def __load(self, account_id):
+        if self.__store:
+            try:
+                row = yield get_contact_name(account_id)
+            except Exception:
+                LOGGER.exception("get user name from db failed. "
+                                 "account_id:%s", account_id)
+                row = None
+            if row is not None:
+                name, age = row
+                if age < (self.__ttl if name is not None
+                          else self.__negative_ttl):
+                    self.__store_hits += 1
+                    self.__put(account_id, name, age)
+                    return name
+                if name is not None and age < self.__stale:
+                    self.__store_hits += 1
+                    self.__put(account_id, name, age)
+                    self.__revalidate(account_id)
+                    return name
+
+        name = yield self.__refresh(account_id)
+        return name
+
+    @tornado.gen.coroutine
+    def __refresh(self, account_id):
+        self.__fetches += 1
+        name = yield self.__fetch(account_id)
+        self.__put(account_id, name)
+        if self.__store:
+            try:
+                yield set_contact_name(account_id, name)
+            except Exception:
+                LOGGER.exception("save user name failed. account_id:%s",
+                                 account_id)
+        return name
+
+    def stats(self):
+        return {
+            "size": len(self.__entries),
+            "hits": self.__hits,
+            "stale_hits": self.__stale_hits,
+            "store_hits": self.__store_hits,
+            "fetches": self.__fetches,
+        }
+
+
+contact_cache = ContactCache()
+
+
+@tornado.gen.coroutine
+def get_user_info_by_account(account_id):
+    """
+    Get the user name of account, from the cache if possible.
+    Check also: ContactCache
+
+    :return: user name
+    """
+    name = yield contact_cache.get(account_id)
     return name
@@ -0,0 +1,146 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+iCalendar (RFC 5545) text of one schedule.
+The text is written directly, it is the same as the output of the
+icalendar library for these properties, in the same order.
+Check also: test/test_ical.py
+
+    reference
+    - https://tools.ietf.org/html/rfc5545
+"""
+
+__all__ = ['escape_text', 'fold_line', 'format_datetime', 'make_vevent']
+
+import re
+from datetime import timezone
+
+_QUOTABLE = re.compile("[,;: ’']")
+
+_FOLD_LIMIT = 74
+_FOLD_SEP = "\r\n "
+
+
+def escape_text(text):
+    """
+    Escape a TEXT value.
+
+    :param text: property value
+    :return: escaped value
+    """
+    # the order matters, the backslash goes first
+    return text.replace("\\N", "\n").replace("\\", "\\\\") \
+        .replace(";", "\\;").replace(",", "\\,") \
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+
+
+def fold_line(line):
+    """
+    Fold a content line, no line is longer than 75 octets
+    including the leading space of the continuation lines.
+
+    :param line: content line without line break
+    :return: folded content line
+    """
+    if line.isascii():
+        if len(line) <= _FOLD_LIMIT:
+            return line
+        return _FOLD_SEP.join(line[i:i + _FOLD_LIMIT]
+                              for i in range(0, len(line), _FOLD_LIMIT))
+
+    chars = []
+    octets = 0
+    for char in line:
+        size = len(char.encode("utf-8"))
+        octets += size
+        if octets > _FOLD_LIMIT:
+            chars.append(_FOLD_SEP)
+            octets = size
+        chars.append(char)
+    return "".join(chars)
+
+
+def _param_value(value):
+    value = value.replace('"', "'")
+    if _QUOTABLE.search(value):
+        return '"%s"' % (value,)
+    return value
+
+
+def format_datetime(name, value, utc=False):
+    """
+    Format a DATE-TIME property.
+
+    :param name: property name
+    :param value: datetime, naive or aware
+    :param utc: write the value in UTC, naive values are taken as UTC.
+    :return: content line
+    """
+    if utc:
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return "%s;VALUE=DATE-TIME:%s" % (name,
+                                          value.strftime("%Y%m%dT%H%M%SZ"))
+
+    tzid = None
+    if value.tzinfo is not None:
+        tzid = getattr(value.tzinfo, "zone", None) or value.tzname()
+    text = value.strftime("%Y%m%dT%H%M%S")
+    if tzid == "UTC":
+        return "%s;VALUE=DATE-TIME:%sZ" % (name, text)
+    if tzid:
+        return "%s;TZID=%s;VALUE=DATE-TIME:%s" % (name, _param_value(tzid),
+                                                  text)
+    return "%s;VALUE=DATE-TIME:%s" % (name, text)
+
+
+def make_vevent(prodid, uid, summary, description, begin, end, stamp,
+                created=None):
+    """
+    Generate a VCALENDAR with one VEVENT.
+
+    :param prodid: product identifier of the calendar
+    :param uid: schedule uid
+    :param summary: schedule title
+    :param description: schedule description
+    :param begin: DTSTART
+    :param end: DTEND
+    :param stamp: DTSTAMP and LAST-MODIFIED
+    :param created: CREATED, omitted if None
+    :return: iCalendar text
+    """
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        fold_line("PRODID:" + escape_text(prodid)),
+        "BEGIN:VEVENT",
+        fold_line("SUMMARY:" + escape_text(summary)),
+        fold_line(format_datetime("DTSTART", begin)),
+        fold_line(format_datetime("DTEND", end)),
+        format_datetime("DTSTAMP", stamp, True),
+        fold_line("UID:" + escape_text(uid)),
+    ]
+    if created is not None:
+        lines.append(format_datetime("CREATED", created, True))
+    lines.append(fold_line("DESCRIPTION:" + escape_text(description)))
+    lines.append(format_datetime("LAST-MODIFIED", stamp, True))
+    lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    lines.append("")
+    return "\r\n".join(lines)
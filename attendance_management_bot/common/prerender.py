@@ -0,0 +1,124 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Cache of the static bot messages.
+A message which doesn't depend on the user, the time or the database
+is built once, with all its languages, and kept as serialized JSON.
+The messages are rendered by prerender_messages before fork,
+the workers share them.
+Check also: attendance_management_bot/externals/send_message.py
+"""
+
+__all__ = ['Prerendered', 'static_message', 'prerender_messages']
+
+import json
+import logging
+import functools
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+_TEMPLATES = []
+_MESSAGES = {}
+
+
+class Prerendered:
+    """
+    A message content serialized once.
+    push_message splices it into the request body as it is.
+    """
+    __slots__ = ('json',)
+
+    def __init__(self, content):
+        self.json = json.dumps(content).encode("utf-8")
+
+    def content(self):
+        """
+        :return: a new copy of the message content.
+        """
+        return json.loads(self.json.decode("utf-8"))
+
+    def request(self, account_id):
+        """
+        :param account_id: user account id
+        :return: the body of the push message request.
+        """
+        return b'{"accountId": %s, "content": %s}' % \
+            (json.dumps(account_id).encode("utf-8"), self.json)
+
+    def __eq__(self, other):
+        return isinstance(other, Prerendered) and self.json == other.json
+
+    def __hash__(self):
+        return hash(self.json)
+
+    def __repr__(self):
+        return "Prerendered(%s)" % (self.json.decode("utf-8"),)
+
+
+def render(content):
+    """
+    :param content: a message content or a list of them.
+    :return: Prerendered, or a tuple of Prerendered for a list.
+    """
+    if content is None or isinstance(content, Prerendered):
+        return content
+    if isinstance(content, (list, tuple)):
+        return tuple(render(item) for item in content)
+    return Prerendered(content)
+
+
+def static_message(*variants):
+    """
+    Decorator of a function building a static message.
+    The function runs once per arguments, later calls return the cache.
+
+    :param variants: the argument tuples rendered by prerender_messages,
+        the default is the call without arguments.
+    """
+    if not variants:
+        variants = ((),)
+
+    def decorator(builder):
+        @functools.wraps(builder)
+        def wrapper(*args):
+            key = (builder, args)
+            if key not in _MESSAGES:
+                _MESSAGES[key] = render(builder(*args))
+            return _MESSAGES[key]
+
+        _TEMPLATES.append((wrapper, variants))
+        return wrapper
+
+    return decorator
+
+
+def prerender_messages():
+    """
+    Render all the registered static messages.
+    The gettext catalogs must be loaded before.
+
+    :return: the number of rendered messages.
+    """
+    count = 0
+    for template, variants in _TEMPLATES:
+        for args in variants:
+            template(*args)
+            count += 1
+    LOGGER.info("%d static messages prerendered.", count)
+    return count
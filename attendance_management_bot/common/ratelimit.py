@@ -0,0 +1,96 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Pacing of the requests to the LINE WORKS APIs: retry delays and
+a token bucket.
+"""
+
+__all__ = ['backoff_delay', 'TokenBucket']
+
+import time
+import random
+import tornado.gen
+import tornado.locks
+
+
+def backoff_delay(attempts, base, cap):
+    """
+    Exponential backoff with jitter.
+
+    :param attempts: failed attempts, from 1.
+    :param base: seconds before the first retry, doubled at each attempt.
+    :param cap: maximum seconds.
+    :return: seconds, between half and all of the backoff, so the
+        requests failed together are not retried together.
+    """
+    delay = min(base * 2 ** (attempts - 1), cap)
+    return delay * random.uniform(0.5, 1)
+
+
+class TokenBucket:
+    """
+    `rate` requests per second on average, up to `burst` at once.
+    The callers of acquire are served in order.
+    """
+
+    def __init__(self, rate, burst):
+        self.__rate = rate
+        self.__burst = burst
+        self.__tokens = burst
+        self.__updated = time.monotonic()
+        self.__paused_until = 0
+        self.__lock = tornado.locks.Lock()
+
+    def __fill(self, now):
+        # no token comes while paused
+        elapsed = now - max(self.__updated, self.__paused_until)
+        if elapsed > 0:
+            self.__tokens = min(self.__burst,
+                                self.__tokens + elapsed * self.__rate)
+        self.__updated = max(self.__updated, now)
+
+    @tornado.gen.coroutine
+    def acquire(self):
+        """
+        Wait for a token.
+        """
+        with (yield self.__lock.acquire()):
+            while True:
+                now = time.monotonic()
+                if now < self.__paused_until:
+                    yield tornado.gen.sleep(self.__paused_until - now)
+                    continue
+                self.__fill(now)
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                yield tornado.gen.sleep((1 - self.__tokens) / self.__rate)
+
+    def pause(self, seconds):
+        """
+        No token for `seconds`, e.g. after the server answered 429.
+        """
+        now = time.monotonic()
+        self.__fill(now)
+        self.__tokens = 0
+        self.__paused_until = max(self.__paused_until, now + seconds)
+
+    def tokens(self):
+        self.__fill(time.monotonic())
+        return self.__tokens
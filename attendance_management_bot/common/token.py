@@ -18,17 +18,49 @@ limitations under the License.
 
 """
 Generate token according to JWT protocol
+The request handlers get the token from token_manager, which keeps it
+in memory, refreshes it before it expires and never sends more than
+one request to the auth server at a time.
 """
 
-__all__ = ['create_tmp_token', 'generate_token']
+__all__ = ['create_tmp_token', 'generate_token', 'fetch_token',
+           'TokenManager', 'token_manager']
 
 import python_jwt as jwt
 import jwcrypto.jwk as jwk
 import datetime
 import requests
 import json
+import sys
+import time
+import logging
+import tornado.gen
+import tornado.ioloop
+from tornado.concurrent import Future, future_set_exc_info, \
+    future_set_result_unless_cancelled
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
 from attendance_management_bot.constant import API_BO, HEROKU_SERVER_ID, \
     PRIVATE_KEY_PATH
+from attendance_management_bot.settings import TOKEN_REFRESH_MARGIN, \
+    TOKEN_RETRY_INTERVAL, TOKEN_DEFAULT_LIFETIME, HTTP_CONNECT_TIMEOUT, \
+    HTTP_REQUEST_TIMEOUT
+from attendance_management_bot.metrics import API_SECONDS
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+_private_keys = {}
+
+
+def load_private_key(key_path):
+    """
+    Read and parse the private key, once per key path.
+    """
+    private_key = _private_keys.get(key_path, None)
+    if private_key is None:
+        with open(key_path, "rb") as _file:
+            private_key = jwk.JWK.from_pem(_file.read())
+        _private_keys[key_path] = private_key
+    return private_key
 
 
 def create_tmp_token(key_path, server_id):
@@ -43,14 +75,35 @@ def create_tmp_token(key_path, server_id):
         - https://developers.worksmobile.com/jp/document/1002002?lang=en
     """
 
-    with open(key_path, "rb") as _file:
-        key = _file.read()
-        private_key = jwk.JWK.from_pem(key)
-        payload = {"iss": server_id}
-        token = jwt.generate_jwt(payload, private_key, 'RS256',
-                                 datetime.timedelta(minutes=5))
-        return token
-    return None
+    private_key = load_private_key(key_path)
+    payload = {"iss": server_id}
+    token = jwt.generate_jwt(payload, private_key, 'RS256',
+                             datetime.timedelta(minutes=5))
+    return token
+
+
+def token_request():
+    tmp_token = create_tmp_token(PRIVATE_KEY_PATH, HEROKU_SERVER_ID)
+    if tmp_token is None:
+        raise Exception("generate tmp token failed.")
+    headers = {
+        "Content-Type": "application/x-www-form-urlencoded",
+        "charset": "UTF-8"
+    }
+    url = API_BO["auth_url"] + tmp_token
+    return url, headers
+
+
+def parse_token(content):
+    """
+    :return: (token, seconds until it expires)
+    """
+    content = json.loads(content)
+    token = content.get("access_token", None)
+    if token is None:
+        raise Exception("response token is None.")
+
+    return token, int(content.get("expires_in", TOKEN_DEFAULT_LIFETIME))
 
 
 def generate_token():
@@ -63,21 +116,127 @@ def generate_token():
         - https://developers.worksmobile.com/jp/document/1002002?lang=en
     """
 
-    tmp_token = create_tmp_token(PRIVATE_KEY_PATH, HEROKU_SERVER_ID)
-    if tmp_token is None:
-        raise Exception("generate tmp token failed.")
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded",
-        "charset": "UTF-8"
-    }
-    url = API_BO["auth_url"] + tmp_token
+    url, headers = token_request()
     response = requests.post(url, headers=headers)
     if response.status_code != 200:
         raise Exception("generate token failed.")
 
-    content = json.loads(response.content)
-    token = content.get("access_token", None)
-    if token is None:
-        raise Exception("response token is None.")
-
+    token, _ = parse_token(response.content)
     return token
+
+
+@tornado.gen.coroutine
+def fetch_token():
+    """
+    generate_token without blocking the IOLoop.
+
+    :return: (token, seconds until it expires)
+    """
+
+    url, headers = token_request()
+    request = HTTPRequest(url, method="POST", headers=headers, body=b"",
+                          connect_timeout=HTTP_CONNECT_TIMEOUT,
+                          request_timeout=HTTP_REQUEST_TIMEOUT)
+    start = time.monotonic()
+    response = yield AsyncHTTPClient().fetch(request, raise_error=False)
+    API_SECONDS.observe(time.monotonic() - start, "token",
+                        str(response.code))
+    if response.code != 200:
+        raise Exception("generate token failed. code:%d" % (response.code,))
+
+    return parse_token(response.body)
+
+
+class TokenManager:
+    """
+    Server token of this process.
+
+    A refresh is started TOKEN_REFRESH_MARGIN seconds before the token
+    expires, and the current token is used until the new one arrives.
+    Callers that need a refresh at the same time share one request.
+    """
+
+    def __init__(self, fetch=fetch_token):
+        """
+        :param fetch: coroutine returning (token, seconds until it expires)
+        """
+        self._fetch = fetch
+        self._token = None
+        self._expires_at = 0
+        self._refreshing = None
+        self._timeout = None
+
+    @tornado.gen.coroutine
+    def get_token(self):
+        """
+        :return: a token that has not expired.
+        """
+        if self._token is not None and time.time() < self._expires_at:
+            return self._token
+        token = yield self.refresh()
+        return token
+
+    def refresh(self, failed_token=None):
+        """
+        Get a new token.
+
+        :param failed_token: the token the server refused. If the token
+            has been refreshed since, the current token is returned
+            without a new request.
+        :return: Future of the new token.
+        """
+        if failed_token is not None and failed_token != self._token \
+                and time.time() < self._expires_at:
+            future = Future()
+            future.set_result(self._token)
+            return future
+
+        if self._refreshing is None:
+            self._refreshing = Future()
+            tornado.ioloop.IOLoop.current().add_future(
+                tornado.gen.convert_yielded(self._fetch()), self._on_fetched)
+        return self._refreshing
+
+    def _on_fetched(self, result):
+        future = self._refreshing
+        self._refreshing = None
+        try:
+            token, expires_in = result.result()
+        except Exception:
+            LOGGER.exception("refresh token failed.")
+            if self._token is not None and time.time() < self._expires_at:
+                self._schedule(TOKEN_RETRY_INTERVAL)
+            future_set_exc_info(future, sys.exc_info())
+            return
+
+        self._token = token
+        self._expires_at = time.time() + expires_in
+        self._schedule(max(expires_in - TOKEN_REFRESH_MARGIN,
+                           TOKEN_RETRY_INTERVAL))
+        future_set_result_unless_cancelled(future, token)
+
+    def reschedule(self):
+        """
+        Schedule the next refresh on the current IOLoop.
+        Call it in a forked worker, the timer of the parent is lost.
+        """
+        self._timeout = None
+        self._refreshing = None
+        if self._token is not None:
+            self._schedule(max(self._expires_at - time.time()
+                               - TOKEN_REFRESH_MARGIN, 0))
+
+    def _schedule(self, delay):
+        io_loop = tornado.ioloop.IOLoop.current()
+        if self._timeout is not None:
+            io_loop.remove_timeout(self._timeout)
+        self._timeout = io_loop.call_later(delay, self._refresh_in_background)
+
+    def _refresh_in_background(self):
+        self._timeout = None
+        future = self.refresh()
+        # errors are logged and retried by _on_fetched
+        future.add_done_callback(lambda f: f.exception())
+
+
+token_manager = TokenManager()
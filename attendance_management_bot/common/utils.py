@@ -18,27 +18,53 @@ limitations under the License.
 
 """
 HTTP method providing authentication
+The requests are sent by tornado's AsyncHTTPClient and do not block
+the IOLoop. With pycurl installed, connections to the API servers are
+kept alive and reused, see configure_http_client.
 """
 
-__all__ = ['auth_post', 'auth_get', 'auth_del', 'auth_put']
+__all__ = ['configure_http_client', 'auth_post', 'auth_get', 'auth_del',
+           'auth_put']
 
-import requests
+import uuid
+import json as _json
 import logging
+import mimetypes
+import os
+import time
+import tornado.gen
 from tornado.web import HTTPError
-from attendance_management_bot.common.token import generate_token
-from attendance_management_bot.common.global_data import get_value, set_value
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.httputil import url_concat
+from attendance_management_bot.common.token import token_manager
+from attendance_management_bot.common.global_data import get_value
+from attendance_management_bot.metrics import API_SECONDS, api_endpoint
+from attendance_management_bot.settings import HTTP_MAX_CLIENTS, \
+    HTTP_CONNECT_TIMEOUT, HTTP_REQUEST_TIMEOUT
 
 LOGGER = logging.getLogger("attendance_management_bot")
 
 
-def refresh_token():
-    my_token = generate_token()
-    set_value("token", my_token)
-    return my_token
+def configure_http_client():
+    """
+    Select the AsyncHTTPClient implementation, call it before
+    the first request.
+    CurlAsyncHTTPClient keeps a cache of open connections per host,
+    SimpleAsyncHTTPClient opens a new connection for every request.
 
+        reference
+        - https://www.tornadoweb.org/en/stable/httpclient.html
+    """
+    try:
+        import pycurl
+    except ImportError:
+        LOGGER.warning("pycurl is not installed, "
+                       "connections to the API servers are not reused.")
+        AsyncHTTPClient.configure(None, max_clients=HTTP_MAX_CLIENTS)
+        return
 
-def get_token():
-    return get_value("token", None)
+    AsyncHTTPClient.configure("tornado.curl_httpclient.CurlAsyncHTTPClient",
+                              max_clients=HTTP_MAX_CLIENTS)
 
 
 def replace_url_bot_no(url):
@@ -51,136 +77,152 @@ def replace_url_bot_no(url):
     return url
 
 
-def auth_post(url, data=None,  headers=None, files=None,
-              params=None, json=None, refresh_token_flag=False):
+def encode_multipart(files, headers):
     """
-    Encapsulates the post method of adding token to headers.
+    Encode files as multipart/form-data, like requests does.
+
+    :param files: {field name: file object}
+    :param headers: the Content-Type header is set here.
+    :return: request body
+    """
+    boundary = uuid.uuid4().hex
+    body = b""
+    for name, _file in files.items():
+        file_name = os.path.basename(getattr(_file, "name", name))
+        content_type = mimetypes.guess_type(file_name)[0] \
+            or "application/octet-stream"
+        with _file:
+            data = _file.read()
+        body += ("--%s\r\nContent-Disposition: form-data; name=\"%s\"; "
+                 "filename=\"%s\"\r\nContent-Type: %s\r\n\r\n"
+                 % (boundary, name, file_name, content_type)).encode()
+        body += data + b"\r\n"
+    body += ("--%s--\r\n" % (boundary,)).encode()
+
+    headers["Content-Type"] = "multipart/form-data; boundary=" + boundary
+    return body
+
+
+@tornado.gen.coroutine
+def fetch(method, url, headers=None, body=None):
+    if body is None and method in ("POST", "PUT"):
+        body = b""
+    request = HTTPRequest(url, method=method, headers=headers, body=body,
+                          connect_timeout=HTTP_CONNECT_TIMEOUT,
+                          request_timeout=HTTP_REQUEST_TIMEOUT)
+    start = time.monotonic()
+    response = yield AsyncHTTPClient().fetch(request, raise_error=False)
+    API_SECONDS.observe(time.monotonic() - start, api_endpoint(url),
+                        str(response.code))
+    return response
+
+
+@tornado.gen.coroutine
+def auth_fetch(method, url, headers=None, body=None,
+               refresh_token_flag=False):
+    """
+    Send a request with the token in headers.
+    The token is refreshed and the request sent again
+    if the server answers 401 or 403.
     Check also: attendance_management_bot/common/token.py
-    parameters and return values, refer to:
 
-        reference
-        - https://3.python-requests.org/user/advanced/#request-and-response-objects
+    :return: tornado.httpclient.HTTPResponse, failures are not raised.
+        Connection errors and timeouts have code 599.
     """
 
     if headers is not None and not refresh_token_flag:
-        my_token = get_token()
-        if my_token is None:
-            my_token = refresh_token()
+        headers = dict(headers)
+        my_token = yield token_manager.get_token()
 
         headers["Authorization"] = "Bearer " + my_token
-        response = requests.post(url, data=data, headers=headers,
-                                 files=files, params=params, json=json)
+        response = yield fetch(method, url, headers=headers, body=body)
 
-        if response.status_code == 401 or response.status_code == 403:
-            my_token = refresh_token()
+        if response.code == 401 or response.code == 403:
+            my_token = yield token_manager.refresh(my_token)
             headers["Authorization"] = "Bearer " + my_token
-            response = requests.post(url, data=data, headers=headers,
-                                     files=files, params=params, json=json)
+            response = yield fetch(method, url, headers=headers, body=body)
         return response
     else:
         if refresh_token_flag and headers is not None:
-            my_token = refresh_token()
+            headers = dict(headers)
+            my_token = yield token_manager.refresh()
             headers["Authorization"] = "Bearer " + my_token
-        return requests.post(url, data=data, headers=headers,
-                             files=files, params=params, json=json)
-
-    return None
+        response = yield fetch(method, url, headers=headers, body=body)
+        return response
 
 
-def auth_get(url, headers=None, refresh_token_flag=False):
+def make_body(url, data=None, headers=None, files=None,
+              params=None, json=None):
     """
-    Encapsulates the get method of adding token to headers.
-    Check also: attendance_management_bot/common/token.py
-    parameters and return values, refer to:
+    :return: url with params, request body, headers with its Content-Type.
+        headers stays None if it is None, the request is then sent
+        without token.
+    """
+    if params is not None:
+        url = url_concat(url, params)
+    if files is None and json is None:
+        return url, data, headers
+
+    content_headers = {}
+    if files is not None:
+        data = encode_multipart(files, content_headers)
+    else:
+        data = _json.dumps(json)
+        content_headers["Content-Type"] = "application/json"
+    if headers is not None:
+        headers = dict(headers, **content_headers)
+    return url, data, headers
 
-        reference
-        - https://3.python-requests.org/user/advanced/#request-and-response-objects
+
+@tornado.gen.coroutine
+def auth_post(url, data=None,  headers=None, files=None,
+              params=None, json=None, refresh_token_flag=False):
+    """
+    Encapsulates the post method of adding token to headers.
+    parameters are the same as the ones of requests.post,
+    check also: auth_fetch
     """
 
-    if headers is not None and not refresh_token_flag:
-        my_token = get_token()
-        if my_token is None:
-            my_token = refresh_token()
+    url, data, headers = make_body(url, data, headers, files, params, json)
+    response = yield auth_fetch("POST", url, headers, data,
+                                refresh_token_flag)
+    return response
 
-        headers["Authorization"] = "Bearer " + my_token
-        response = requests.get(url, headers=headers)
 
-        if response.status_code == 401 or response.status_code == 403:
-            my_token = refresh_token()
-            headers["Authorization"] = "Bearer " + my_token
-            response = requests.get(url, headers=headers)
-        return response
-    else:
-        if refresh_token_flag and headers is not None:
-            my_token = refresh_token()
-            headers["Authorization"] = "Bearer " + my_token
-        return requests.get(url, headers=headers)
+@tornado.gen.coroutine
+def auth_get(url, headers=None, refresh_token_flag=False):
+    """
+    Encapsulates the get method of adding token to headers.
+    Check also: auth_fetch
+    """
 
-    return None
+    response = yield auth_fetch("GET", url, headers,
+                                refresh_token_flag=refresh_token_flag)
+    return response
 
 
+@tornado.gen.coroutine
 def auth_del(url, headers=None, refresh_token_flag=False):
     """
     Encapsulates the delete method of adding token to headers.
-    Check also: attendance_management_bot/common/token.py
-    parameters and return values, refer to:
-
-        reference
-        - https://3.python-requests.org/user/advanced/#request-and-response-objects
+    Check also: auth_fetch
     """
 
-    if headers is not None and not refresh_token_flag:
-        my_token = get_token()
-        if my_token is None:
-            my_token = init_token()
-
-        headers["Authorization"] = "Bearer " + my_token
-        response = requests.delete(url, headers=headers)
-
-        if response.status_code == 401 or response.status_code == 403:
-            my_token = refresh_token()
-            headers["Authorization"] = "Bearer " + my_token
-            response = requests.delete(url, headers=headers)
-        return response
-    else:
-        if refresh_token_flag and headers is not None:
-            my_token = refresh_token()
-            headers["Authorization"] = "Bearer " + my_token
-        return requests.delete(url, headers=headers)
-
-    return None
+    response = yield auth_fetch("DELETE", url, headers,
+                                refresh_token_flag=refresh_token_flag)
+    return response
 
 
+@tornado.gen.coroutine
 def auth_put(url, data=None,  headers=None, files=None,
               params=None, json=None, refresh_token_flag=False):
     """
     Encapsulates the put method of adding token to headers.
-    Check also: attendance_management_bot/common/token.py
-    parameters and return values, refer to:
-
-        reference
-        - https://3.python-requests.org/user/advanced/#request-and-response-objects
+    parameters are the same as the ones of requests.put,
+    check also: auth_fetch
     """
-    if headers is not None and not refresh_token_flag:
-        my_token = get_token()
-        if my_token is None:
-            my_token = refresh_token()
-
-        headers["Authorization"] = "Bearer " + my_token
-        response = requests.put(url, data=data, headers=headers,
-                                 files=files, params=params, json=json)
-
-        if response.status_code == 401 or response.status_code == 403:
-            my_token = refresh_token()
-            headers["Authorization"] = "Bearer " + my_token
-            response = requests.put(url, data=data, headers=headers,
-                                     files=files, params=params, json=json)
-        return response
-    else:
-        if refresh_token_flag and headers is not None:
-            my_token = refresh_token()
-            headers["Authorization"] = "Bearer " + my_token
-        return requests.put(url, data=data, headers=headers,
-                             files=files, params=params, json=json)
 
-    return None
+    url, data, headers = make_body(url, data, headers, files, params, json)
+    response = yield auth_fetch("PUT", url, headers, data,
+                                refresh_token_flag)
+    return response
@@ -38,6 +38,14 @@ STORAGE_DOMAIN = "storage.worksmobile.com"
 AUTH_DOMAIN = "auth.worksmobile.com"
 DEVELOP_API_DOMAIN = "apis.worksmobile.com"
 
+# API ROOT URLS
+# LINEWORKS_API_ROOT sends all the API requests to one server instead,
+# e.g. http://127.0.0.1:9000 for tools/fake_lineworks.py.
+API_ROOT = os.environ.get("LINEWORKS_API_ROOT", None)
+STORAGE_ROOT = API_ROOT or "http://" + STORAGE_DOMAIN
+AUTH_ROOT = API_ROOT or "https://" + AUTH_DOMAIN
+DEVELOP_API_ROOT = API_ROOT or "https://" + DEVELOP_API_DOMAIN
+
 # RICH_MENUS
 RICH_MENUS = {
                 'en':
@@ -86,25 +94,25 @@ API_BO = {
                 "content-type": "application/json",
                 "charset": "UTF-8"
             },
-            "upload_url": "http://" + STORAGE_DOMAIN
+            "upload_url": STORAGE_ROOT
                           + "/openapi/message/upload.api",
-            "push_url": "https://" + DEVELOP_API_DOMAIN + "/r/"
+            "push_url": DEVELOP_API_ROOT + "/r/"
                         + API_ID + "/message/v1/bot/_BOT_NO_/message/push",
-            "rich_menu_url": "https://" + DEVELOP_API_DOMAIN + "/r/"
+            "rich_menu_url": DEVELOP_API_ROOT + "/r/"
                              + API_ID + "/message/v1/bot/_BOT_NO_/richmenu",
 
             "calendar":
             {
                 "name": "calendar bot",
-                "create_calendar_url": "https://" + DEVELOP_API_DOMAIN + "/r/"
+                "create_calendar_url": DEVELOP_API_ROOT + "/r/"
                                        + API_ID +
                                        "/calendar/v1/_ACCOUNT_ID_/"
                                        "calendarList",
-                "create_schedule_url": "https://" + DEVELOP_API_DOMAIN + "/r/"
+                "create_schedule_url": DEVELOP_API_ROOT + "/r/"
                                        + API_ID +
                                        "/calendar/v1/_ACCOUNT_ID_/calendars/"
                                        "_CALENDAR_ID_/events",
-                "modify_schedule_url": "https://" + DEVELOP_API_DOMAIN + "/r/"
+                "modify_schedule_url": DEVELOP_API_ROOT + "/r/"
                                        + API_ID +
                                        "/calendar/v1/_ACCOUNT_ID_/calendars/"
                                        "_CALENDAR_ID_/events/_CALENDAR_UUID_",
@@ -112,11 +120,11 @@ API_BO = {
 
             "TZone":
             {
-                "contacts_url": "https://" + DEVELOP_API_DOMAIN + "/r/"
+                "contacts_url": DEVELOP_API_ROOT + "/r/"
                                     + API_ID
                                     + "/contact/v2/accounts/_USER_ACCOUNT_ID_"
             },
-            "auth_url": "https://" + AUTH_DOMAIN + "/b/" + API_ID
+            "auth_url": AUTH_ROOT + "/b/" + API_ID
                         + "/server/token?grant_type=urn%3Aietf%3Aparams%3Aoauth"
                           "%3Agrant-type%3Ajwt-bearer&assertion="
         }
@@ -141,4 +149,5 @@ DB_CONFIG = {
 # FILE SYSTEM
 FILE_SYSTEM = {
     "image_dir": ABSDIR_OF_PARENT+"/image",
+    "locale_dir": ABSDIR_OF_PARENT+"/locales",
 }
@@ -0,0 +1,187 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Export of bot_calendar_record for the payroll, one row per account and day:
+
+    account,date,begin_time,end_time,hours
+
+The times are local, Check also: conf/config.py TZone.
+The hours are computed by the database from begin_time and end_time,
+they are empty while the user is still checked in.
+
+The rows are streamed, the memory stays the same whatever their number:
+the CSV is written by COPY ... TO STDOUT, the Parquet file is read with
+a server-side cursor and written EXPORT_ROW_GROUP_SIZE rows at a time.
+Parquet needs pyarrow, which is not a requirement of the bot.
+Check also: scripts/export.py, attendance_management_bot/exportHandler.py
+"""
+
+__all__ = ['EXPORT_COLUMNS', 'export_sql', 'copy_csv', 'write_parquet',
+           'ExportCursor']
+
+import decimal
+import logging
+import psycopg2
+from conf.config import TZone
+from attendance_management_bot.constant import DB_CONFIG
+from attendance_management_bot.model.asyncPostGreSqlPool import \
+    AsyncPostGreSql
+from attendance_management_bot.settings import EXPORT_FETCH_SIZE, \
+    EXPORT_ROW_GROUP_SIZE
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+EXPORT_COLUMNS = ("account", "date", "begin_time", "end_time", "hours")
+
+# %(begin)s, %(end)s: the dates, included. %(tz)s: the time zone.
+# Before the check-out, the sync process is sign_in_done and end_time
+# is not the check-out time yet.
+_EXPORT_SQL = (
+    "SELECT r.account, r.cur_date AS date, "
+    "(to_timestamp(r.begin_time) AT TIME ZONE %(tz)s)::timestamp(0) "
+    "AS begin_time, "
+    "CASE WHEN s.process='sign_in_done' THEN NULL "
+    "ELSE (to_timestamp(r.end_time) AT TIME ZONE %(tz)s)::timestamp(0) "
+    "END AS end_time, "
+    "CASE WHEN s.process='sign_in_done' THEN NULL "
+    "ELSE round(GREATEST(r.end_time-r.begin_time, 0)/3600.0, 2) "
+    "END AS hours "
+    "FROM bot_calendar_record r LEFT JOIN bot_calendar_sync s "
+    "ON s.account=r.account AND s.cur_date=r.cur_date "
+    "WHERE r.cur_date BETWEEN %(begin)s AND %(end)s "
+    "ORDER BY r.account, r.cur_date")
+
+
+def export_sql(begin, end):
+    """
+    :param begin: first date, included.
+    :param end: last date, included.
+    :return: (statement, parameters) in the psycopg2 style.
+    """
+    return _EXPORT_SQL, {"begin": begin, "end": end, "tz": TZone}
+
+
+def copy_csv(begin, end, output):
+    """
+    Write the rows as CSV, with a header line.
+
+    :param output: file opened for writing, in text mode.
+    """
+    sql, params = export_sql(begin, end)
+    with psycopg2.connect(**DB_CONFIG) as conn:
+        with conn.cursor() as cur:
+            # COPY takes no parameter, the values are quoted by psycopg2
+            query = cur.mogrify(sql, params).decode("utf-8")
+            cur.copy_expert("COPY (%s) TO STDOUT WITH (FORMAT csv, HEADER)"
+                            % (query,), output)
+
+
+def _parquet_value(value):
+    return float(value) if isinstance(value, decimal.Decimal) else value
+
+
+def write_parquet(begin, end, output):
+    """
+    Write the rows as a Parquet file.
+
+    :param output: path or file opened for writing, in binary mode.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("the Parquet export needs pyarrow, "
+                           "pip install pyarrow")
+
+    schema = pyarrow.schema([
+        ("account", pyarrow.string()),
+        ("date", pyarrow.date32()),
+        ("begin_time", pyarrow.timestamp("s")),
+        ("end_time", pyarrow.timestamp("s")),
+        ("hours", pyarrow.float64()),
+    ])
+    sql, params = export_sql(begin, end)
+    with psycopg2.connect(**DB_CONFIG) as conn:
+        # named: the rows stay on the server until they are fetched
+        with conn.cursor(name="bot_export") as cur:
+            cur.itersize = EXPORT_FETCH_SIZE
+            cur.execute(sql, params)
+            with pyarrow.parquet.ParquetWriter(output, schema) as writer:
+                while True:
+                    rows = cur.fetchmany(EXPORT_ROW_GROUP_SIZE)
+                    if not rows:
+                        break
+                    columns = [[_parquet_value(value) for value in column]
+                               for column in zip(*rows)]
+                    writer.write_table(pyarrow.Table.from_arrays(
+                        [pyarrow.array(column, type=field.type)
+                         for column, field in zip(columns, schema)],
+                        schema=schema))
+
+
+class ExportCursor:
+    """
+    Server-side cursor of the export rows, read by the request handlers
+    without blocking the IOLoop. It keeps a connection of the pool and
+    a transaction open until close.
+
+        cursor = ExportCursor(begin, end)
+        await cursor.open()
+        try:
+            rows = await cursor.fetch()
+        finally:
+            await cursor.close()
+    """
+
+    def __init__(self, begin, end):
+        self.__begin = begin
+        self.__end = end
+        self.__db = None
+        self.__cursor = None
+
+    async def open(self):
+        sql, params = export_sql(self.__begin, self.__end)
+        db = AsyncPostGreSql(transaction=True)
+        cursor = await db.__aenter__()
+        try:
+            await cursor.execute("DECLARE bot_export NO SCROLL CURSOR FOR "
+                                 + sql, params)
+        except Exception as ex:
+            await db.__aexit__(type(ex), ex, ex.__traceback__)
+            raise
+        self.__db = db
+        self.__cursor = cursor
+
+    async def fetch(self, size=None):
+        """
+        :param size: default EXPORT_FETCH_SIZE.
+        :return: the next `size` rows at most, [] after the last one.
+        """
+        if size is None:
+            size = EXPORT_FETCH_SIZE
+        await self.__cursor.execute("FETCH %d FROM bot_export" % (size,))
+        return await self.__cursor.fetchall()
+
+    async def close(self):
+        if self.__db is None:
+            return
+        db = self.__db
+        self.__db = None
+        self.__cursor = None
+        await db.__aexit__(None, None, None)
@@ -0,0 +1,94 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Attendance records as CSV, for the payroll.
+
+    GET /export?from=2019-11-01&to=2019-11-30
+
+The rows are read with a server-side cursor and written as they come,
+EXPORT_FETCH_SIZE at a time. The header is the one of the export
+command, Check also: attendance_management_bot/export.py
+An error after the first rows are sent closes the connection, so that
+the payroll never takes a cut file for a complete one.
+"""
+
+__all__ = ['ExportHandler', 'format_csv']
+
+import io
+import csv
+import logging
+import tornado.gen
+import tornado.web
+from attendance_management_bot.export import EXPORT_COLUMNS, ExportCursor
+from attendance_management_bot.reportsHandler import check_token, date_range
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+
+def format_csv(rows):
+    """
+    :return: the rows as the CSV lines of COPY, None is an empty field.
+    """
+    text = io.StringIO()
+    writer = csv.writer(text, lineterminator="\n")
+    writer.writerows(rows)
+    return text.getvalue()
+
+
+class ExportHandler(tornado.web.RequestHandler):
+    """
+    Download of the attendance records, for the clients with REPORTS_TOKEN.
+    """
+
+    def prepare(self):
+        check_token(self.request)
+
+    @tornado.gen.coroutine
+    def get(self):
+        begin, end = date_range(self)
+
+        self.set_header("Content-Type", "text/csv; charset=UTF-8")
+        self.set_header("Content-Disposition",
+                        'attachment; filename="attendance_%s_%s.csv"'
+                        % (begin, end))
+        self.write(format_csv([EXPORT_COLUMNS]))
+
+        cursor = ExportCursor(begin, end)
+        yield cursor.open()
+        written = 0
+        try:
+            try:
+                while True:
+                    rows = yield cursor.fetch()
+                    if not rows:
+                        break
+                    self.write(format_csv(rows))
+                    yield self.flush()
+                    written += len(rows)
+            finally:
+                yield cursor.close()
+        except Exception:
+            if written == 0:
+                raise
+            # the status is sent already, a closed connection tells the
+            # client the file is not complete.
+            LOGGER.exception("export stopped after %d rows.", written)
+            self.request.connection.close()
+            return
+        self.finish()
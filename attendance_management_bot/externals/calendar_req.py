@@ -26,15 +26,12 @@ __all__ = ['make_icalendar_data', 'create_calendar', 'create_schedule',
 import io
 import logging
 import json
-import pytz
 import uuid
 import tornado.gen
 from tornado.web import HTTPError
-from datetime import datetime, timezone
-from icalendar import Calendar, Event, Timezone, TimezoneStandard
 from attendance_management_bot.common.utils \
     import auth_get, auth_post, auth_put
-from conf.config import TZone
+from attendance_management_bot.common.ical import make_vevent
 from attendance_management_bot.constant import API_BO, \
     OPEN_API, ADMIN_ACCOUNT, DOMAIN_ID
 from attendance_management_bot.common.global_data import get_value
@@ -52,46 +49,21 @@ def make_icalendar_data(uid, summary, current, end, begin,
                         account_id, create_flag=False):
     """
     Generate iCalendar data format message body.
+    Check also: attendance_management_bot/common/ical.py
 
         reference
         - https://developers.worksmobile.com/jp/document/1007011?lang=en
     """
 
-    cal = Calendar()
-    cal.add('PRODID', 'Works sample bot Calendar')
-    cal.add('VERSION', '2.0')
-
-    standard = TimezoneStandard()
-    standard.add('DTSTART', datetime(1970, 1, 1, 0, 0, 0,
-                                     tzinfo=pytz.timezone(TZone)))
-    standard.add('TZOFFSETFROM', current.utcoffset())
-    standard.add('TZOFFSETTO', current.utcoffset())
-    standard.add('TZNAME', current.tzname())
-
-    #tz = Timezone()
-    #tz.add_component(standard)
-    #tz.add('TZID', TZone)
-
-    event = Event()
-    event.add('UID', uid)
-
-    if create_flag:
-        event.add('CREATED', current)
-
-    event.add('DESCRIPTION', account_id)
-    event.add('SUMMARY', summary)
-    event.add('DTSTART', begin)
-    event.add('DTEND', end)
-    event.add('LAST-MODIFIED', current)
-    event.add('DTSTAMP', current)
-
-    cal.add_component(event)
-    #cal.add_component(tz)
-    schedule_local_string = bytes.decode(cal.to_ical())
+    schedule_local_string = make_vevent("Works sample bot Calendar", uid,
+                                        summary, account_id, begin, end,
+                                        current,
+                                        current if create_flag else None)
     LOGGER.info("schedule:%s", schedule_local_string)
     return schedule_local_string
 
 
+@tornado.gen.coroutine
 def create_calendar():
     """
     create calender.
@@ -116,33 +88,36 @@ def create_calendar():
     url = url.replace("_ACCOUNT_ID_", ADMIN_ACCOUNT)
     LOGGER.info("create calendar. url:%s body:%s", url, str(body))
 
-    response = auth_post(url, data=json.dumps(body), headers=headers)
-    if response.status_code != 200:
-        LOGGER.error("create calendar failed. url:%s text:%s body:%s",
-                    url, response.text, response.content)
+    response = yield auth_post(url, data=json.dumps(body), headers=headers)
+    if response.code != 200:
+        LOGGER.error("create calendar failed. url:%s body:%s",
+                    url, response.body)
         raise Exception("create calendar id. http response code error.")
 
-    LOGGER.info("create calendar id. url:%s txt:%s body:%s",
-                url, response.text, response.content)
-    tmp_req = json.loads(response.content)
+    LOGGER.info("create calendar id. url:%s body:%s",
+                url, response.body)
+    tmp_req = json.loads(response.body)
     if tmp_req["result"] != "success":
-        LOGGER.error("create calendar failed. url:%s text:%s body:%s",
-                     url, response.text, response.content)
+        LOGGER.error("create calendar failed. url:%s body:%s",
+                     url, response.body)
         raise Exception("create calendar id. response no success.")
     return tmp_req["returnValue"]
 
 
-def create_schedule(current, end, begin, account_id, title):
+@tornado.gen.coroutine
+def create_schedule(current, end, begin, account_id, title, uid=None):
     """
     create schedule.
 
         reference
         - https://developers.worksmobile.com/jp/document/100702703?lang=en
 
+    :param uid: schedule id to use, generated if None.
     :return: schedule id.
     """
 
-    uid = str(uuid.uuid4()) + account_id
+    if uid is None:
+        uid = str(uuid.uuid4()) + account_id
     schedule_data = make_icalendar_data(uid, title, current,
                                         end, begin, account_id, True)
     body = {
@@ -159,35 +134,36 @@ def create_schedule(current, end, begin, account_id, title):
     url = url.replace("_ACCOUNT_ID_", ADMIN_ACCOUNT)
     url = url.replace("_CALENDAR_ID_", calendar_id)
 
-    response = auth_post(url, data=json.dumps(body), headers=headers)
-    if response.status_code != 200:
-        LOGGER.error("create schedules failed. url:%s text:%s body:%s",
-                    url, response.text, response.content)
+    response = yield auth_post(url, data=json.dumps(body), headers=headers)
+    if response.code != 200:
+        LOGGER.error("create schedules failed. url:%s body:%s",
+                    url, response.body)
         raise HTTPError(500, "internal error. create schedule http code error.")
 
-    tmp_req = json.loads(response.content)
+    tmp_req = json.loads(response.body)
     if tmp_req["result"] != "success":
-        LOGGER.error("create schedule failed. url:%s text:%s body:%s",
-                     url, response.text, response.content)
+        LOGGER.error("create schedule failed. url:%s body:%s",
+                     url, response.body)
         raise HTTPError(500, "internal error. http response error.")
 
-    LOGGER.info("create schedule. url:%s text:%s body:%s",
-                 url, response.text, response.content)
+    LOGGER.info("create schedule. url:%s body:%s",
+                 url, response.body)
 
     return_value = tmp_req.get("returnValue", None)
     if return_value is None:
-        LOGGER.error("create schedule failed. url:%s text:%s body:%s",
-                     url, response.text, response.content)
+        LOGGER.error("create schedule failed. url:%s body:%s",
+                     url, response.body)
         raise HTTPError(500, "internal error. create schedule content error.")
 
     schedule_uid = return_value.get("icalUid", None)
     if schedule_uid is None:
-        LOGGER.error("create schedule failed. url:%s text:%s body:%s",
-                     url, response.text, response.content)
+        LOGGER.error("create schedule failed. url:%s body:%s",
+                     url, response.body)
         raise HTTPError(500, "internal error. create schedule content error.")
     return schedule_uid
 
 
+@tornado.gen.coroutine
 def modify_schedule(calendar_uid, current, end, begin, account_id, title):
     """
     modify schedule.
@@ -215,23 +191,24 @@ def modify_schedule(calendar_uid, current, end, begin, account_id, title):
     url = url.replace("_CALENDAR_UUID_", calendar_uid)
 
     headers = create_headers()
-    response = auth_put(url, data=json.dumps(body), headers=headers)
-    if response.status_code != 200:
-        LOGGER.error("modify schedules failed. url:%s text:%s body:%s",
-                     url, response.text, response.content)
+    response = yield auth_put(url, data=json.dumps(body), headers=headers)
+    if response.code != 200:
+        LOGGER.error("modify schedules failed. url:%s body:%s",
+                     url, response.body)
         raise HTTPError(500,
                         "internal error. create schedule http code error.")
 
-    LOGGER.info("modify schedules. url:%s text:%s body:%s",
-                 url, response.text, response.content)
+    LOGGER.info("modify schedules. url:%s body:%s",
+                 url, response.body)
 
-    tmp_req = json.loads(response.content)
+    tmp_req = json.loads(response.body)
     if tmp_req["result"] != "success":
-        LOGGER.error("modify schedule failed. url:%s text:%s body:%s",
-                     url, response.text, response.content)
+        LOGGER.error("modify schedule failed. url:%s body:%s",
+                     url, response.body)
         raise HTTPError(500, "internal error. http response error.")
 
 
+@tornado.gen.coroutine
 def init_calendar():
     """
     init calendar.
@@ -240,7 +217,7 @@ def init_calendar():
 
     :return: calendar id
     """
-    calendar_id = create_calendar()
+    calendar_id = yield create_calendar()
     if calendar_id is None:
         raise Exception("init calendar failed.")
     return calendar_id
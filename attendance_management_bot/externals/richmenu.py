@@ -40,6 +40,7 @@ _ = gettext.gettext
 LOGGER = logging.getLogger("attendance_management_bot")
 
 
+@tornado.gen.coroutine
 def upload_content(file_path):
     """
     Upload rich menu background picture.
@@ -62,18 +63,19 @@ def upload_content(file_path):
 
     LOGGER.info("upload content . url:%s", url)
 
-    response = auth_post(url, files=files, headers=headers)
-    if response.status_code != 200:
-        LOGGER.info("push message failed. url:%s text:%s body:%s",
-                    url, response.text, response.content)
+    response = yield auth_post(url, files=files, headers=headers)
+    if response.code != 200:
+        LOGGER.info("push message failed. url:%s body:%s",
+                    url, response.body)
         raise Exception("upload content. http return error.")
     if "x-works-resource-id" not in response.headers:
-        LOGGER.error("invalid content. url:%s txt:%s headers:%s",
-                    url, response.text, response.headers)
+        LOGGER.error("invalid content. url:%s headers:%s",
+                    url, response.headers)
         raise Exception("upload content. not fond 'x-works-resource-id'.")
     return response.headers["x-works-resource-id"]
 
 
+@tornado.gen.coroutine
 def make_add_rich_menu_body(rich_menu_name):
     """
     add rich menu body
@@ -118,19 +120,21 @@ def make_add_rich_menu_body(rich_menu_name):
 
     LOGGER.info("register richmenu. url:%s", url)
 
-    response = auth_post(url, data=json.dumps(rich_menu), headers=headers)
-    if response.status_code != 200:
-        LOGGER.info("register richmenu failed. url:%s text:%s body:%s",
-                    url, response.text, response.content)
+    response = yield auth_post(url, data=json.dumps(rich_menu),
+                               headers=headers)
+    if response.code != 200:
+        LOGGER.info("register richmenu failed. url:%s body:%s",
+                    url, response.body)
         raise Exception("register richmenu. http return error.")
 
-    LOGGER.info("register richmenu success. url:%s txt:%s body:%s",
-                url, response.text, response.content)
+    LOGGER.info("register richmenu success. url:%s body:%s",
+                url, response.body)
 
-    tmp = json.loads(response.content)
+    tmp = json.loads(response.body)
     return tmp["richMenuId"]
 
 
+@tornado.gen.coroutine
 def set_rich_menu_image(resource_id, rich_menu_id):
     """
     Set a rich menu image.
@@ -151,16 +155,17 @@ def set_rich_menu_image(resource_id, rich_menu_id):
     url = utils.replace_url_bot_no(url)
     LOGGER.info("set rich menu image . url:%s", url)
 
-    response = auth_post(url, data=json.dumps(body), headers=headers)
-    if response.status_code != 200:
-        LOGGER.info("set rich menu image failed. url:%s text:%s body:%s",
-                    url, response.text, response.content)
+    response = yield auth_post(url, data=json.dumps(body), headers=headers)
+    if response.code != 200:
+        LOGGER.info("set rich menu image failed. url:%s body:%s",
+                    url, response.body)
         raise Exception("set richmenu image. http return error.")
 
-    LOGGER.info("set rich menu image success. url:%s txt:%s body:%s",
-                url, response.text, response.content)
+    LOGGER.info("set rich menu image success. url:%s body:%s",
+                url, response.body)
 
 
+@tornado.gen.coroutine
 def set_user_specific_rich_menu(rich_menu_id, account_id):
     """
     Set a user-specific rich menu.
@@ -178,15 +183,16 @@ def set_user_specific_rich_menu(rich_menu_id, account_id):
 
     url = utils.replace_url_bot_no(url)
 
-    response = auth_post(url, headers=headers)
-    if response.status_code != 200:
-        LOGGER.info("push message failed. url:%s text:%s body:%s",
-                    url, response.text, response.content)
+    response = yield auth_post(url, headers=headers)
+    if response.code != 200:
+        LOGGER.info("push message failed. url:%s body:%s",
+                    url, response.body)
         raise Exception("set user specific richmenu. http return error.")
-    LOGGER.info("set user specific richmenu success. url:%s txt:%s body:%s",
-                url, response.text, response.content)
+    LOGGER.info("set user specific richmenu success. url:%s body:%s",
+                url, response.body)
 
 
+@tornado.gen.coroutine
 def get_rich_menus():
     """
     Get rich menus
@@ -202,22 +208,23 @@ def get_rich_menus():
     url = utils.replace_url_bot_no(url)
 
     LOGGER.info("push message begin. url:%s", url)
-    response = auth_get(url, headers=headers)
-    if response.status_code != 200:
-        LOGGER.info("push message failed. url:%s text:%s body:%s",
-                    url, response.text, response.content)
+    response = yield auth_get(url, headers=headers)
+    if response.code != 200:
+        LOGGER.info("push message failed. url:%s body:%s",
+                    url, response.body)
         return None
 
-    LOGGER.info("push message success. url:%s txt:%s body:%s",
-                url, response.text, response.content)
+    LOGGER.info("push message success. url:%s body:%s",
+                url, response.body)
 
-    tmp = json.loads(response.content)
+    tmp = json.loads(response.body)
     if "richmenus" in tmp:
         return tmp["richmenus"]
 
     return None
 
 
+@tornado.gen.coroutine
 def cancel_user_specific_rich_menu(account_id):
     """
     Cancel a user-specific rich menu
@@ -232,15 +239,16 @@ def cancel_user_specific_rich_menu(account_id):
     url = API_BO["rich_menu_url"] + "/account/" + account_id
     url = utils.replace_url_bot_no(url)
 
-    response = auth_del(url, headers=headers)
-    if response.status_code != 200:
-        LOGGER.info("push message failed. url:%s text:%s body:%s",
-                    url, response.text, response.content)
+    response = yield auth_del(url, headers=headers)
+    if response.code != 200:
+        LOGGER.info("push message failed. url:%s body:%s",
+                    url, response.body)
         raise Exception("canncel user specific richmenu. http return error.")
-    LOGGER.info("push message success. url:%s txt:%s body:%s",
-                url, response.text, response.content)
+    LOGGER.info("push message success. url:%s body:%s",
+                url, response.body)
 
 
+@tornado.gen.coroutine
 def init_rich_menu(local):
     """
     init rich menu.
@@ -254,7 +262,7 @@ def init_rich_menu(local):
         raise Exception("init rich menus failed. default language error.")
 
     il8n_rich_menu_id = {}
-    rich_menus = get_rich_menus()
+    rich_menus = yield get_rich_menus()
     if rich_menus is not None:
         for menu in rich_menus:
             if str(menu["name"]) == RICH_MENUS[local]["name"]:
@@ -262,9 +270,9 @@ def init_rich_menu(local):
                     menu["richMenuId"]
                 return il8n_rich_menu_id
 
-    rich_menu_id = make_add_rich_menu_body(RICH_MENUS[local]["name"])
-    resource_id = upload_content(RICH_MENUS[local]["path"])
-    set_rich_menu_image(resource_id, rich_menu_id)
+    rich_menu_id = yield make_add_rich_menu_body(RICH_MENUS[local]["name"])
+    resource_id = yield upload_content(RICH_MENUS[local]["path"])
+    yield set_rich_menu_image(resource_id, rich_menu_id)
     il8n_rich_menu_id[RICH_MENUS[local]["name"]] = rich_menu_id
 
     return il8n_rich_menu_id
\ No newline at end of file
@@ -18,9 +18,13 @@ limitations under the License.
 
 """
 send message to user
+With MESSAGE_OUTBOX, the messages are saved in bot_message_outbox and
+sent by the outbox worker, else they are sent at once.
+Check also: attendance_management_bot/outbox.py
 """
 
-__all__ = ['push_message', 'push_messages']
+__all__ = ['make_request_body', 'deliver_message', 'push_message',
+           'push_messages']
 
 import io
 import logging
@@ -30,51 +34,85 @@ from tornado.web import HTTPError
 from attendance_management_bot.common.utils import auth_post, replace_url_bot_no
 from tornado.httpclient import AsyncHTTPClient
 from attendance_management_bot.constant import API_BO, OPEN_API
+from attendance_management_bot.common.prerender import Prerendered
+from attendance_management_bot.model.asyncDBHandle import enqueue_messages
+from attendance_management_bot.outbox import notify_outbox
+from attendance_management_bot.settings import MESSAGE_OUTBOX
 
 LOGGER = logging.getLogger("attendance_management_bot")
 
 
-@tornado.gen.coroutine
-def push_message(account_id, content, header=None):
+def make_request_body(account_id, content):
     """
-    Send message to user. the package is the following JSON structure.
+    Request body of the message API. the package is the following
+    JSON structure.
 
         reference
         - https://developers.worksmobile.com/jp/document/1005008?lang=en
 
     :param account_id: user account id
-    :param content: message content
-    :param header: http header
+    :param content: message content, dict or Prerendered
+    :return: JSON string
     """
-
     if content is None:
         LOGGER.info("content is None.")
         raise HTTPError(500, "internal error. content is None.")
 
-    request = {
+    if isinstance(content, Prerendered):
+        return content.request(account_id).decode("utf-8")
+    return json.dumps({
         "accountId": account_id,
         "content": content
-    }
+    })
 
-    headers = API_BO["headers"]
-    if header is not None:
-        headers = Merge(header, headers)
 
+@tornado.gen.coroutine
+def deliver_message(body, header=None):
+    """
+    Send a request body of the message API.
+
+    :param body: Check also: make_request_body
+    :param header: http header
+    :return: tornado.httpclient.HTTPResponse, failures are not raised.
+    """
+    headers = dict(API_BO["headers"], **(header or {}))
     headers["consumerKey"] = OPEN_API["consumerKey"]
 
     url = API_BO["push_url"]
     url = replace_url_bot_no(url)
-    response = auth_post(url, data=json.dumps(request), headers=headers)
-    if response.status_code != 200:
-        LOGGER.error("push message failed. url:%s text:%s body:%s",
-                    url, response.text, response.content)
+    response = yield auth_post(url, data=body,
+                               headers=headers)
+    return response
+
+
+@tornado.gen.coroutine
+def push_message(account_id, content, header=None):
+    """
+    Send message to user.
+
+    :param account_id: user account id
+    :param content: message content, dict or Prerendered
+    :param header: http header, the message is then sent at once.
+    """
+    body = make_request_body(account_id, content)
+    if MESSAGE_OUTBOX and header is None:
+        yield enqueue_messages(account_id, [body])
+        notify_outbox()
+        return
+
+    response = yield deliver_message(body, header)
+    if response.code != 200:
+        LOGGER.error("push message failed. account_id:%s body:%s",
+                    account_id, response.body)
         raise HTTPError(500, "internal error. Internal interface call error.")
 
 
 @tornado.gen.coroutine
 def push_messages(account_id, contents):
     """
-    Send multiple messages to users
+    Send multiple messages to users, in order.
+    With MESSAGE_OUTBOX they are added with one statement, else they are
+    sent one right after the other, stopping at the first failure.
 
     :param account_id: user account id
     :param contents: message content list
@@ -83,5 +121,17 @@ def push_messages(account_id, contents):
         LOGGER.info("contents is None.")
         raise HTTPError(500, "internal error. contents is None.")
 
-    for content in contents:
-        yield push_message(account_id, content)
+    bodies = [make_request_body(account_id, content) for content in contents]
+    if MESSAGE_OUTBOX:
+        yield enqueue_messages(account_id, bodies)
+        notify_outbox()
+        return
+
+    for index, body in enumerate(bodies):
+        response = yield deliver_message(body)
+        if response.code != 200:
+            LOGGER.error("push messages failed, %d of %d sent. "
+                         "account_id:%s body:%s", index, len(bodies),
+                         account_id, response.body)
+            raise HTTPError(500,
+                            "internal error. Internal interface call error.")
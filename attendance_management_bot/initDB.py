@@ -17,16 +17,139 @@ limitations under the License.
 
 """
 Initialize the data structure.
+
+bot_calendar_record and bot_process_status are partitioned by month of
+cur_date when PARTITION_TABLES is set, so the rows of the current days
+stay in a small table and its indexes. maintain_partitions creates the
+partitions of the next months and, once PROCESS_STATUS_RETENTION_MONTHS
+is set, removes the old ones of bot_process_status. Run it every day.
+Check also: scripts/partitions.py
 """
 
 __all__ = ['create_calendar_table', 'create_init_status_table',
-           'create_process_status_table', 'init_db']
+           'create_process_status_table', 'create_calendar_sync_table',
+           'create_contact_name_table', 'create_message_outbox_table',
+           'create_callback_dedup_table', 'create_reminder_table',
+           'partition_name',
+           'create_partitions', 'maintain_partitions', 'partition_tables',
+           'init_db']
 
 import json
+import datetime
+import logging
 import psycopg2
 import psycopg2.extras as extras
 from psycopg2.errors import DuplicateTable, DuplicateObject
 from attendance_management_bot.constant import DB_CONFIG
+from attendance_management_bot.common.local_timezone import local_date_time
+from attendance_management_bot.settings import PARTITION_TABLES, \
+    PARTITION_MONTHS_AHEAD, PROCESS_STATUS_RETENTION_MONTHS, \
+    PROCESS_STATUS_RETENTION
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+# tables partitioned by month of cur_date
+PARTITIONED_TABLES = ("bot_calendar_record", "bot_process_status")
+
+# advisory lock of maintain_partitions, run by cron and by init_db.
+PARTITION_LOCK = 0x626f7470
+
+
+def _add_months(date, months):
+    """
+    :return: first day of the month `months` after the one of date.
+    """
+    month = date.year * 12 + date.month - 1 + months
+    return datetime.date(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    """
+    :return: name of the partition of table holding the month of `month`.
+    """
+    return "%s_%s" % (table, month.strftime("%Y%m"))
+
+
+def _relation_kind(cur, table):
+    """
+    :return: "r" for a table, "p" for a partitioned one, None if there
+        is no such table in the search path.
+    """
+    cur.execute("SELECT relkind FROM pg_class WHERE oid=to_regclass(%s)",
+                (table,))
+    row = cur.fetchone()
+    return None if row is None else row[0]
+
+
+# the key of a partitioned table has the partition column.
+_PARTITIONED_SQL = {
+    "bot_calendar_record": ('''
+                CREATE TABLE IF NOT EXISTS bot_calendar_record(
+                 schedule_id  varchar(128)      NOT NULL,
+                 account      varchar(64)       NOT NULL,
+                 cur_date     date              NOT NULL,
+                 begin_time   bigint            NOT NULL,
+                 end_time     bigint            NOT NULL,
+                 create_time  timestamp         NOT NULL
+                 default current_timestamp,
+                 update_time  timestamp         NOT NULL
+                 default current_timestamp,
+                 close_out    varchar(16)       DEFAULT NULL,
+                 PRIMARY KEY (schedule_id, cur_date))
+                 PARTITION BY RANGE (cur_date);
+                 ''',
+                            '''CREATE UNIQUE INDEX IF NOT EXISTS account_time
+                ON bot_calendar_record(account, cur_date);''',
+                            '''CREATE INDEX IF NOT EXISTS calendar_record_date
+                ON bot_calendar_record(cur_date, account);'''),
+    "bot_process_status": ('''
+                CREATE TABLE IF NOT EXISTS bot_process_status(
+                 account      varchar(64)   NOT NULL,
+                 cur_date     date          NOT NULL,
+                 status       m_status      DEFAULT NULL,
+                 process      m_process     DEFAULT NULL,
+                 create_time  timestamp     NOT NULL
+                 default current_timestamp,
+                 update_time  timestamp     NOT NULL
+                 default current_timestamp,
+                 PRIMARY KEY (account, cur_date))
+                 PARTITION BY RANGE (cur_date);
+                 ''',
+                           '''CREATE INDEX IF NOT EXISTS process_status_date
+                ON bot_process_status(cur_date, process, account);'''),
+}
+
+
+def _create_partitioned_table(cur, table, first):
+    """
+    Create table partitioned by month of cur_date, with the partitions
+    from the month of first to PARTITION_MONTHS_AHEAD months after today.
+    """
+    for sql in _PARTITIONED_SQL[table]:
+        cur.execute(sql)
+    create_partitions(cur, table, first, _add_months(
+        local_date_time().date(), PARTITION_MONTHS_AHEAD))
+
+
+def create_partitions(cur, table, first, last):
+    """
+    Create the missing monthly partitions of table, and its default
+    partition for the dates out of them.
+
+    :param cur: cursor
+    :param first: a date of the first month.
+    :param last: a date of the last month, included.
+    """
+    cur.execute("CREATE TABLE IF NOT EXISTS %s_default "
+                "PARTITION OF %s DEFAULT" % (table, table))
+    month = _add_months(first, 0)
+    while month <= last:
+        following = _add_months(month, 1)
+        cur.execute("CREATE TABLE IF NOT EXISTS %s PARTITION OF %s "
+                    "FOR VALUES FROM (%%s) TO (%%s)"
+                    % (partition_name(table, month), table),
+                    (month, following))
+        month = following
 
 
 def create_calendar_table():
@@ -43,6 +166,7 @@ def create_calendar_table():
     begin_time  schedule begin time.
     end_time    schedule end time.
     create_time record creation time.
+    close_out   policy of the close-out job if the user did not clock out, else NULL.
     =========== ===================================================================================
     """
 
@@ -63,13 +187,31 @@ def create_calendar_table():
     index_sql = '''CREATE UNIQUE INDEX account_time 
                 ON bot_calendar_record(account, cur_date);'''
 
+    # the tables created before the close-out job
+    close_out_sql = '''ALTER TABLE bot_calendar_record
+                ADD COLUMN IF NOT EXISTS close_out varchar(16) DEFAULT NULL;'''
+
+    # the reports select a range of dates.
+    date_index_sql = '''CREATE INDEX IF NOT EXISTS calendar_record_date
+                ON bot_calendar_record(cur_date, account);'''
+
     with psycopg2.connect(**DB_CONFIG) as conn:
         with conn.cursor() as cur:
-            try:
-                cur.execute(create_sql)
-                cur.execute(index_sql)
-            except DuplicateTable:
-                pass
+            if PARTITION_TABLES:
+                if _relation_kind(cur, "bot_calendar_record") is None:
+                    _create_partitioned_table(cur, "bot_calendar_record",
+                                              local_date_time().date())
+            else:
+                try:
+                    cur.execute(create_sql)
+                    cur.execute(index_sql)
+                except DuplicateTable:
+                    pass
+
+    with psycopg2.connect(**DB_CONFIG) as conn:
+        with conn.cursor() as cur:
+            cur.execute(close_out_sql)
+            cur.execute(date_index_sql)
 
 
 def create_init_status_table():
@@ -163,18 +305,393 @@ def create_process_status_table():
                  PRIMARY KEY (account, cur_date));
                  '''
 
+    # the reminders select the accounts of a date.
+    date_index_sql = '''CREATE INDEX IF NOT EXISTS process_status_date
+                ON bot_process_status(cur_date, process, account);'''
+
     with psycopg2.connect(**DB_CONFIG) as conn:
         with conn.cursor() as cur:
             try:
                 cur.execute(status_type_sql)
                 cur.execute(process_type_sql)
-                cur.execute(create_sql)
+                if not PARTITION_TABLES:
+                    cur.execute(create_sql)
+                elif _relation_kind(cur, "bot_process_status") is None:
+                    _create_partitioned_table(cur, "bot_process_status",
+                                              local_date_time().date())
             except DuplicateObject:
                 print("bot_process_status is DuplicateObject. please check it.")
                 pass
             except DuplicateTable:
                 pass
 
+    with psycopg2.connect(**DB_CONFIG) as conn:
+        with conn.cursor() as cur:
+            cur.execute(date_index_sql)
+
+
+def create_calendar_sync_table():
+    """
+    create the calendar sync queue.
+    A row is added with the schedule, the calendar event is
+    created or updated later by attendance_management_bot/calendar_sync.py.
+    The row is deleted with its schedule.
+
+    m_sync: Is a enum type value
+
+    =========== ===========
+    type        description
+    =========== ===========
+    pending     The calendar event is waiting to be created or updated.
+    synced      The calendar event is up to date.
+    failed      The retries are exhausted.
+    =========== ===========
+
+    bot_calendar_sync table
+
+    =========== ===========
+    column      description
+    =========== ===========
+    account     user account id,
+    cur_date    schedule date, with account the key of bot_calendar_record,
+    process     sign_in_done or sign_out_done, gives the event title,
+    state       is m_sync value,
+    created     the calendar event exists,
+    version     incremented each time the schedule changes,
+    attempts    failed attempts since the last change,
+    next_time   when the row can be taken by a worker,
+    last_error  error of the last attempt,
+    create_time record creation time
+    =========== ===========
+    """
+    sync_type_sql = '''
+                    DO $$ BEGIN
+                        CREATE TYPE m_sync AS
+                            ENUM('pending', 'synced', 'failed');
+                    EXCEPTION WHEN duplicate_object THEN NULL;
+                    END $$;
+                    '''
+
+    create_sql = '''
+                CREATE TABLE IF NOT EXISTS bot_calendar_sync(
+                 account      varchar(64)   NOT NULL,
+                 cur_date     date          NOT NULL,
+                 process      m_process     NOT NULL,
+                 state        m_sync        NOT NULL DEFAULT 'pending',
+                 created      boolean       NOT NULL DEFAULT false,
+                 version      integer       NOT NULL DEFAULT 1,
+                 attempts     integer       NOT NULL DEFAULT 0,
+                 next_time    timestamp     NOT NULL
+                 default current_timestamp,
+                 last_error   text          DEFAULT NULL,
+                 create_time  timestamp     NOT NULL
+                 default current_timestamp,
+                 update_time  timestamp     NOT NULL
+                 default current_timestamp,
+                 PRIMARY KEY (account, cur_date),
+                 FOREIGN KEY (account, cur_date)
+                 REFERENCES bot_calendar_record(account, cur_date)
+                 ON DELETE CASCADE);
+                 '''
+
+    index_sql = '''CREATE INDEX IF NOT EXISTS calendar_sync_pending
+                ON bot_calendar_sync(next_time) WHERE state='pending';'''
+
+    # the close-out job selects the days not clocked out.
+    open_index_sql = '''CREATE INDEX IF NOT EXISTS calendar_sync_open
+                ON bot_calendar_sync(cur_date) WHERE process='sign_in_done';'''
+
+    with psycopg2.connect(**DB_CONFIG) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sync_type_sql)
+            cur.execute(create_sql)
+            cur.execute(index_sql)
+            cur.execute(open_index_sql)
+
+
+def create_contact_name_table():
+    """
+    create the user name cache, shared by the worker processes.
+    Check also: attendance_management_bot/common/contacts.py
+
+    =========== ===========
+    column      description
+    =========== ===========
+    account     user account id,
+    name        user name, NULL if the account is unknown,
+    create_time record creation time
+    update_time time the name was read from the contacts API
+    =========== ===========
+    """
+    create_sql = '''
+                CREATE TABLE IF NOT EXISTS bot_contact_name(
+                 account      varchar(64)   NOT NULL,
+                 name         varchar(128)  DEFAULT NULL,
+                 create_time  timestamp     NOT NULL
+                 default current_timestamp,
+                 update_time  timestamp     NOT NULL
+                 default current_timestamp,
+                 PRIMARY KEY (account));
+                 '''
+
+    with psycopg2.connect(**DB_CONFIG) as conn:
+        with conn.cursor() as cur:
+            cur.execute(create_sql)
+
+
+def create_message_outbox_table():
+    """
+    create the outbox of the messages to the users.
+    push_message adds the messages, attendance_management_bot/outbox.py
+    sends them, in order for each account. A sent message is deleted.
+
+    m_delivery: Is a enum type value
+
+    =========== ===========
+    type        description
+    =========== ===========
+    pending     The message is waiting to be sent.
+    failed      The server refused the message or the retries are exhausted.
+    =========== ===========
+
+    bot_message_outbox table
+
+    =========== ===========
+    column      description
+    =========== ===========
+    id          message order,
+    account     user account id,
+    body        request body of the message API,
+    state       is m_delivery value,
+    attempts    failed attempts,
+    next_time   when the message can be taken by a worker,
+    last_error  error of the last attempt,
+    priority    0 for the answers to the users, 1 for the reminders,
+    create_time record creation time
+    =========== ===========
+    """
+    delivery_type_sql = '''
+                    DO $$ BEGIN
+                        CREATE TYPE m_delivery AS
+                            ENUM('pending', 'failed');
+                    EXCEPTION WHEN duplicate_object THEN NULL;
+                    END $$;
+                    '''
+
+    create_sql = '''
+                CREATE TABLE IF NOT EXISTS bot_message_outbox(
+                 id           bigserial     NOT NULL,
+                 account      varchar(64)   NOT NULL,
+                 body         text          NOT NULL,
+                 state        m_delivery    NOT NULL DEFAULT 'pending',
+                 attempts     integer       NOT NULL DEFAULT 0,
+                 next_time    timestamp     NOT NULL
+                 default current_timestamp,
+                 last_error   text          DEFAULT NULL,
+                 priority     smallint      NOT NULL DEFAULT 0,
+                 create_time  timestamp     NOT NULL
+                 default current_timestamp,
+                 update_time  timestamp     NOT NULL
+                 default current_timestamp,
+                 PRIMARY KEY (id));
+                 '''
+
+    # the outboxes created before the reminders
+    priority_sql = '''ALTER TABLE bot_message_outbox ADD COLUMN IF NOT EXISTS
+                priority smallint NOT NULL DEFAULT 0;'''
+
+    index_sql = '''CREATE INDEX IF NOT EXISTS message_outbox_pending
+                ON bot_message_outbox(account, id)
+                WHERE state='pending';'''
+
+    priority_index_sql = '''CREATE INDEX IF NOT EXISTS message_outbox_priority
+                ON bot_message_outbox(priority, id)
+                WHERE state='pending';'''
+
+    with psycopg2.connect(**DB_CONFIG) as conn:
+        with conn.cursor() as cur:
+            cur.execute(delivery_type_sql)
+            cur.execute(create_sql)
+            cur.execute(priority_sql)
+            cur.execute(index_sql)
+            cur.execute(priority_index_sql)
+
+
+def create_callback_dedup_table():
+    """
+    create the callbacks already received, shared by the worker processes.
+    Check also: attendance_management_bot/callback_dedup.py
+
+    =========== ===========
+    column      description
+    =========== ===========
+    key         hash of the callback,
+    code        status code answered, NULL while it is handled,
+    create_time time the callback was received
+    =========== ===========
+    """
+    create_sql = '''
+                CREATE TABLE IF NOT EXISTS bot_callback_dedup(
+                 key          char(64)      NOT NULL,
+                 code         smallint      DEFAULT NULL,
+                 create_time  timestamp     NOT NULL
+                 default current_timestamp,
+                 PRIMARY KEY (key));
+                 '''
+
+    index_sql = '''CREATE INDEX IF NOT EXISTS callback_dedup_time
+                ON bot_callback_dedup(create_time);'''
+
+    with psycopg2.connect(**DB_CONFIG) as conn:
+        with conn.cursor() as cur:
+            cur.execute(create_sql)
+            cur.execute(index_sql)
+
+
+def create_reminder_table():
+    """
+    create the reminders sent, shared by the worker processes.
+    Check also: attendance_management_bot/reminders.py
+
+    ============ ===========
+    column       description
+    ============ ===========
+    name         reminder, e.g. "sign_in 09:30",
+    cur_date     date of the reminder by local time,
+    last_account last account added to the outbox, they go in order,
+    sent         accounts added to the outbox,
+    done         all the accounts are added,
+    create_time  record creation time
+    update_time  time of the last batch, the process sending the
+                 reminder updates it
+    ============ ===========
+    """
+    create_sql = '''
+                CREATE TABLE IF NOT EXISTS bot_reminder_run(
+                 name         varchar(32)   NOT NULL,
+                 cur_date     date          NOT NULL,
+                 last_account varchar(64)   NOT NULL DEFAULT '',
+                 sent         integer       NOT NULL DEFAULT 0,
+                 done         boolean       NOT NULL DEFAULT false,
+                 create_time  timestamp     NOT NULL
+                 default current_timestamp,
+                 update_time  timestamp     NOT NULL
+                 default current_timestamp,
+                 PRIMARY KEY (name, cur_date));
+                 '''
+
+    with psycopg2.connect(**DB_CONFIG) as conn:
+        with conn.cursor() as cur:
+            cur.execute(create_sql)
+
+
+def _remove_partitions(cur, table, before):
+    """
+    Detach the monthly partitions of table older than the month of
+    before, and drop them unless PROCESS_STATUS_RETENTION is "detach".
+
+    :return: names of the partitions removed.
+    """
+    cur.execute("SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid=i.inhrelid "
+                "WHERE i.inhparent=to_regclass(%s) ORDER BY 1", (table,))
+    names = [name for name, in cur.fetchall()]
+
+    removed = []
+    for name in names:
+        if name < partition_name(table, before) and \
+                name[len(table) + 1:].isdigit():
+            cur.execute("ALTER TABLE %s DETACH PARTITION %s" % (table, name))
+            if PROCESS_STATUS_RETENTION == "drop":
+                cur.execute("DROP TABLE %s" % (name,))
+            removed.append(name)
+
+    # the rows out of the monthly partitions
+    cur.execute("DELETE FROM %s_default WHERE cur_date<%%s" % (table,),
+                (before,))
+    return removed
+
+
+def maintain_partitions(today=None):
+    """
+    Create the partitions of the current month and of the next
+    PARTITION_MONTHS_AHEAD months, and remove the bot_process_status
+    partitions older than PROCESS_STATUS_RETENTION_MONTHS.
+    The tables which are not partitioned are left as they are.
+
+    :param today: default the current date by local time.
+    :return: names of the partitions removed.
+    """
+    if today is None:
+        today = local_date_time().date()
+
+    removed = []
+    with psycopg2.connect(**DB_CONFIG) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (PARTITION_LOCK,))
+            for table in PARTITIONED_TABLES:
+                if _relation_kind(cur, table) == "p":
+                    create_partitions(cur, table, today, _add_months(
+                        today, PARTITION_MONTHS_AHEAD))
+
+            if PROCESS_STATUS_RETENTION_MONTHS is not None and \
+                    _relation_kind(cur, "bot_process_status") == "p":
+                removed = _remove_partitions(
+                    cur, "bot_process_status",
+                    _add_months(today, -PROCESS_STATUS_RETENTION_MONTHS))
+
+    for name in removed:
+        LOGGER.info("partition removed: %s", name)
+    return removed
+
+
+def partition_tables():
+    """
+    Move the rows of bot_calendar_record and bot_process_status created
+    before PARTITION_TABLES into partitioned tables, in one transaction.
+    The tables are locked meanwhile, stop the bot first.
+
+    :return: names of the tables partitioned.
+    """
+    partitioned = []
+    with psycopg2.connect(**DB_CONFIG) as conn:
+        with conn.cursor() as cur:
+            for table in PARTITIONED_TABLES:
+                if _relation_kind(cur, table) != "r":
+                    continue
+                old = table + "_unpartitioned"
+
+                # e.g. bot_calendar_sync references bot_calendar_record
+                cur.execute("SELECT conrelid::regclass::text, conname, "
+                            "pg_get_constraintdef(oid) FROM pg_constraint "
+                            "WHERE confrelid=to_regclass(%s)", (table,))
+                references = cur.fetchall()
+                for source, name, _ in references:
+                    cur.execute("ALTER TABLE %s DROP CONSTRAINT %s"
+                                % (source, name))
+
+                # the new indexes take the names of the old ones
+                cur.execute("ALTER TABLE %s RENAME TO %s" % (table, old))
+                cur.execute("SELECT c.relname FROM pg_index i "
+                            "JOIN pg_class c ON c.oid=i.indexrelid "
+                            "WHERE i.indrelid=to_regclass(%s)", (old,))
+                for index, in cur.fetchall():
+                    cur.execute("ALTER INDEX %s RENAME TO %s"
+                                % (index, ("%s_old" % (index,))[:63]))
+
+                cur.execute("SELECT min(cur_date) FROM %s" % (old,))
+                first = cur.fetchone()[0] or local_date_time().date()
+                _create_partitioned_table(cur, table, first)
+                cur.execute("INSERT INTO %s SELECT * FROM %s" % (table, old))
+                cur.execute("DROP TABLE %s" % (old,))
+
+                for source, name, definition in references:
+                    cur.execute("ALTER TABLE %s ADD CONSTRAINT %s %s"
+                                % (source, name, definition))
+                partitioned.append(table)
+    return partitioned
+
+
 def init_db():
     """
     Initialize the data structure.
@@ -184,7 +701,22 @@ def init_db():
     - bot_calendar_record
     - system_init_status
     - bot_process_status
+    - bot_calendar_sync
+    - bot_contact_name
+    - bot_message_outbox
+    - bot_callback_dedup
+    - bot_reminder_run
+
+    bot_calendar_record and bot_process_status are partitioned by month
+    when PARTITION_TABLES is set and they do not exist yet.
+    Check also: partition_tables, maintain_partitions
     """
     create_calendar_table()
     create_init_status_table()
     create_process_status_table()
+    create_calendar_sync_table()
+    create_contact_name_table()
+    create_message_outbox_table()
+    create_callback_dedup_table()
+    create_reminder_table()
+    maintain_partitions()
@@ -0,0 +1,246 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Latency histograms in the Prometheus text format.
+Each process counts its own requests. The IOLoop runs on one thread,
+so the counters are plain numbers updated without locks; an
+observation is a bisect and two additions.
+Check also: attendance_management_bot/metricsHandler.py
+
+    reference
+    - https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+__all__ = ['Histogram', 'format_family', 'api_endpoint', 'LoopLagMonitor',
+           'start_loop_lag_monitor', 'get_loop_lag', 'histograms',
+           'CALLBACK_SECONDS', 'ACTION_SECONDS', 'DB_SECONDS',
+           'API_SECONDS', 'LOOP_LAG_SECONDS']
+
+import os
+import time
+import bisect
+import tornado.ioloop
+from attendance_management_bot.settings import METRICS_BUCKETS, \
+    LOOP_LAG_INTERVAL
+
+# all the histograms, in registration order.
+histograms = []
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    if not isinstance(value, str):
+        return _format_value(value)
+    return value.replace("\\", "\\\\").replace("\n", "\\n") \
+        .replace("\"", "\\\"")
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join("%s=\"%s\"" % (name, _escape(value))
+                          for name, value in pairs) + "}"
+
+
+def format_family(name, kind, help, samples):
+    """
+    :param name: metric name.
+    :param kind: counter, gauge or histogram.
+    :param help: one line description.
+    :param samples: list of (name suffix, label pairs, value)
+    :return: lines of the text format.
+    """
+    lines = ["# HELP %s %s" % (name, help), "# TYPE %s %s" % (name, kind)]
+    for suffix, pairs, value in samples:
+        lines.append("%s%s%s %s" % (name, suffix, _format_labels(pairs),
+                                    _format_value(value)))
+    return lines
+
+
+class _Series:
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.histogram.observe(time.monotonic() - self.start, *self.labels)
+
+
+class Histogram:
+    """
+    Counts of observations by upper bound, for each set of label values.
+    """
+
+    def __init__(self, name, help, labels=(), buckets=METRICS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> _Series, the last count is for +Inf.
+        self.__series = {}
+        histograms.append(self)
+
+    def observe(self, value, *labels):
+        series = self.__series.get(labels, None)
+        if series is None:
+            if len(labels) != len(self.labels):
+                raise ValueError("%s takes labels %s."
+                                 % (self.name, ", ".join(self.labels)))
+            series = _Series(len(self.buckets) + 1)
+            self.__series[labels] = series
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.sum += value
+
+    def time(self, *labels):
+        """
+        :return: context manager observing the seconds spent in it.
+        """
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        series = self.__series.get(labels, None)
+        return 0 if series is None else sum(series.counts)
+
+    def render(self):
+        samples = []
+        for labels, series in sorted(self.__series.items()):
+            pairs = list(zip(self.labels, labels))
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),),
+                                    series.counts):
+                total += count
+                samples.append(("_bucket", pairs + [("le", bound)], total))
+            samples.append(("_sum", pairs, series.sum))
+            samples.append(("_count", pairs, total))
+        return format_family(self.name, "histogram", self.help, samples)
+
+
+# URL part -> endpoint label of API_SECONDS
+_ENDPOINTS = [
+    ("/message/push", "push"),
+    ("/richmenu", "richmenu"),
+    ("/calendar/", "calendar"),
+    ("/contact/", "contacts"),
+    ("/server/token", "token"),
+    ("/upload.api", "upload"),
+]
+
+
+def api_endpoint(url):
+    """
+    :return: the API called by url, "other" if it is unknown.
+    """
+    for part, endpoint in _ENDPOINTS:
+        if part in url:
+            return endpoint
+    return "other"
+
+
+CALLBACK_SECONDS = Histogram(
+    "bot_callback_seconds",
+    "Seconds to answer a callback, by status code.", ["code"])
+ACTION_SECONDS = Histogram(
+    "bot_action_seconds",
+    "Seconds spent in the action of a callback.", ["action"])
+DB_SECONDS = Histogram(
+    "bot_db_statement_seconds",
+    "Seconds to run a registered statement.", ["statement"])
+API_SECONDS = Histogram(
+    "bot_api_request_seconds",
+    "Seconds of a request to the LINE WORKS APIs, by endpoint and "
+    "status code, 599 for connection errors.", ["endpoint", "code"])
+LOOP_LAG_SECONDS = Histogram(
+    "bot_loop_lag_seconds",
+    "Seconds a timer of the IOLoop ran late.")
+
+
+class LoopLagMonitor:
+    """
+    Schedules a timer every `interval` seconds and records how late it
+    runs, the time the IOLoop spent in callbacks that don't yield.
+    """
+
+    def __init__(self, interval=LOOP_LAG_INTERVAL):
+        self.__interval = interval
+        self.__expected = None
+        self.__lag = 0.0
+
+    def start(self):
+        io_loop = tornado.ioloop.IOLoop.current()
+        self.__expected = io_loop.time() + self.__interval
+        io_loop.call_at(self.__expected, self.__tick)
+
+    def __tick(self):
+        io_loop = tornado.ioloop.IOLoop.current()
+        now = io_loop.time()
+        self.__lag = max(now - self.__expected, 0.0)
+        LOOP_LAG_SECONDS.observe(self.__lag)
+        self.__expected = now + self.__interval
+        io_loop.call_at(self.__expected, self.__tick)
+
+    def lag(self):
+        """
+        :return: seconds the last timer ran late.
+        """
+        return self.__lag
+
+
+_monitors = {}
+
+
+def start_loop_lag_monitor():
+    """
+    Start the monitor of this process, on the current IOLoop.
+    """
+    pid = os.getpid()
+    if pid in _monitors:
+        return
+    _monitors.clear()
+    monitor = LoopLagMonitor()
+    monitor.start()
+    _monitors[pid] = monitor
+
+
+def get_loop_lag():
+    """
+    :return: LoopLagMonitor.lag of this process, None if not started.
+    """
+    monitor = _monitors.get(os.getpid(), None)
+    if monitor is None:
+        return None
+    return monitor.lag()
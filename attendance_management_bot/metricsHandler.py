@@ -0,0 +1,139 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Metrics of the process answering the request
+"""
+
+__all__ = ['MetricsHandler', 'collect_metrics', 'get']
+
+import ipaddress
+import tornado.web
+from attendance_management_bot.metrics import histograms, format_family, \
+    get_loop_lag
+from attendance_management_bot.callback_queue import get_callback_queue_stats
+from attendance_management_bot.account_lanes import get_account_lanes_stats
+from attendance_management_bot.callback_dedup import callback_dedup
+from attendance_management_bot.calendar_sync import get_calendar_sync_stats
+from attendance_management_bot.outbox import get_outbox_stats
+from attendance_management_bot.reminders import get_reminders_stats
+from attendance_management_bot.model.asyncPostGreSqlPool import \
+    get_async_pool_stats
+from attendance_management_bot.settings import METRICS_ALLOWED_NETWORKS
+
+_allowed_networks = [ipaddress.ip_network(network)
+                     for network in METRICS_ALLOWED_NETWORKS]
+
+
+def _gauge(name, help, value):
+    return format_family(name, "gauge", help, [("", [], value)])
+
+
+def _results(name, help, stats, keys):
+    """
+    :return: a counter with one result label per key of stats.
+    """
+    samples = [("", [("result", key)], stats[key]) for key in keys]
+    return format_family(name, "counter", help, samples)
+
+
+def collect_metrics():
+    """
+    The histograms, then the queues and the workers of this process.
+
+    :return: text in the Prometheus format.
+    """
+    lines = []
+    for histogram in histograms:
+        lines.extend(histogram.render())
+
+    queue = get_callback_queue_stats()
+    if queue is not None:
+        lines.extend(_gauge("bot_callback_queue_depth",
+                            "Callbacks waiting in the queue.",
+                            queue["depth"]))
+        lines.extend(_gauge("bot_callback_queue_age_seconds",
+                            "Seconds the oldest queued callback waited.",
+                            queue["age"]))
+        lines.extend(_gauge("bot_callback_queue_in_progress",
+                            "Queued callbacks being handled.",
+                            queue["in_progress"]))
+        lines.extend(_results("bot_callback_queue_callbacks_total",
+                              "Queued callbacks by result.", queue,
+                              ["processed", "failed", "rejected"]))
+
+    lanes = get_account_lanes_stats()
+    lines.extend(_gauge("bot_account_lanes_waiting",
+                        "Callbacks waiting behind another of their account.",
+                        lanes["waiting"]))
+
+    lines.extend(format_family(
+        "bot_callback_duplicates_total", "counter",
+        "Retried callbacks answered without handling them.",
+        [("", [], callback_dedup.stats()["duplicates"])]))
+
+    outbox = get_outbox_stats()
+    if outbox is not None:
+        lines.extend(_results("bot_outbox_messages_total",
+                              "Messages sent by the outbox, by result.",
+                              outbox,
+                              ["sent", "retried", "limited", "failed"]))
+
+    reminders = get_reminders_stats()
+    if reminders is not None:
+        lines.extend(format_family(
+            "bot_reminders_total", "counter",
+            "Accounts reminded to clock in or out.",
+            [("", [], reminders["reminded"])]))
+
+    sync = get_calendar_sync_stats()
+    if sync is not None:
+        lines.extend(_results("bot_calendar_sync_total",
+                              "Calendar events written, by result.", sync,
+                              ["synced", "retried", "failed"]))
+
+    pool = get_async_pool_stats()
+    if pool is not None:
+        lines.extend(format_family(
+            "bot_db_pool_connections", "gauge",
+            "Connections of the database pool.",
+            [("", [("state", "idle")], pool["idle"]),
+             ("", [("state", "used")], pool["size"] - pool["idle"])]))
+
+    lag = get_loop_lag()
+    if lag is not None:
+        lines.extend(_gauge("bot_loop_lag_last_seconds",
+                            "Seconds the last IOLoop timer ran late.", lag))
+
+    lines.append("")
+    return "\n".join(lines)
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """
+    Serve the metrics to the clients of METRICS_ALLOWED_NETWORKS.
+    The processes share the port, each scrape is answered by one of them.
+    """
+
+    def get(self):
+        remote_ip = ipaddress.ip_address(self.request.remote_ip)
+        if not any(remote_ip in network for network in _allowed_networks):
+            raise tornado.web.HTTPError(403, "not allowed.")
+
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.finish(collect_metrics())
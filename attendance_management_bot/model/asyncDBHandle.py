@@ -0,0 +1,589 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Non-blocking CRUD operation of bot_process_status, bot_calendar_record,
+bot_calendar_sync, bot_contact_name, bot_message_outbox and
+system_init_status, for the request handlers.
+The functions have the same names, parameters and return values as the
+ones of processStatusDBHandle, calendarDBHandle and initStatusDBHandle,
+but they are coroutines.
+Statements on bot_process_status and bot_calendar_record are prepared
+once per connection.
+The *_by_user transitions change both tables in one statement,
+so a user action costs one round trip.
+Check also: attendance_management_bot/model/sqlStatements.py
+Check also: attendance_management_bot/model/asyncPostGreSqlPool.py
+"""
+
+__all__ = ['insert_replace_status_by_user_date', 'set_status_by_user_date',
+           'get_status_by_user', 'delete_status_by_user_date',
+           'clean_status_by_user', 'set_schedule_by_user',
+           'get_schedule_by_user', 'modify_schedule_by_user',
+           'clean_schedule_by_user', 'replace_schedule_id',
+           'report_worked_time', 'claim_calendar_sync', 'done_calendar_sync',
+           'fail_calendar_sync',
+           'get_contact_name', 'set_contact_name', 'enqueue_messages',
+           'claim_messages', 'delete_messages', 'release_messages',
+           'retry_message', 'claim_callback', 'finish_callback',
+           'forget_callback', 'clean_callbacks', 'enqueue_reminders',
+           'claim_reminder', 'finish_reminder', 'get_reminder_accounts',
+           'confirm_in_by_user', 'confirm_out_by_user', 'enter_time_by_user',
+           'insert_init_status', 'update_init_status', 'get_init_status',
+           'delete_init_status']
+
+import logging
+from attendance_management_bot.model.asyncPostGreSqlPool \
+    import AsyncPostGreSql
+from attendance_management_bot.model.sqlStatements \
+    import async_execute_statement
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+
+async def _execute_statement(name, params):
+    async with AsyncPostGreSql() as cursor:
+        await async_execute_statement(cursor, name, params)
+
+
+async def _fetch_one_statement_row(name, params):
+    """
+    :return: the row if the statement returns exactly one row, else None.
+    """
+    async with AsyncPostGreSql() as cursor:
+        await async_execute_statement(cursor, name, params)
+        rows = await cursor.fetchall()
+        if rows is not None and len(rows) == 1:
+            return rows[0]
+    return None
+
+
+async def _fetch_all_statement_rows(name, params):
+    async with AsyncPostGreSql() as cursor:
+        await async_execute_statement(cursor, name, params)
+        return await cursor.fetchall()
+
+
+async def insert_replace_status_by_user_date(account, date, status,
+                                             process=None):
+    """
+    insert or update user's status.
+
+    :param account: user account
+    :param date: current date by local time.
+    :param status: user text input status.
+    :param process: processing progress.
+    :return: Return false when status is None Else, Return None
+    """
+
+    if status is None:
+        return False
+
+    await _execute_statement("insert_replace_status_by_user_date",
+                             (account, date, status, process))
+
+
+async def set_status_by_user_date(account, date, status=None, process=None):
+    """
+    update user's status.
+
+    :param account: user account
+    :param date: current date by local time.
+    :param status: user text input status.
+    :param process: processing progress.
+    :return: no
+    """
+
+    await _execute_statement("set_status_by_user_date",
+                             (account, date, status, process))
+
+
+async def get_status_by_user(account, date):
+    """
+    select user's status.
+
+    :param account: user account
+    :param date: current date by local time.
+    :return: (status, process) or None
+    """
+
+    return await _fetch_one_statement_row("get_status_by_user",
+                                          (account, date))
+
+
+async def delete_status_by_user_date(account, date):
+    """
+    delete user's status.
+
+    :param account: user account
+    :param date: current date by local time.
+    :return: no
+    """
+
+    await _execute_statement("delete_status_by_user_date", (account, date))
+
+
+async def clean_status_by_user(account, date):
+    """
+    delete a item.
+
+    :param account: user account
+    :param date: current date by local time.
+    :return: no
+    """
+
+    await _execute_statement("clean_status_by_user", (account, date))
+
+
+async def set_schedule_by_user(schedule_id, account, date, begin, end):
+    """
+    insert schedule
+
+    :param schedule_id: schedule_id
+    :param account: user account
+    :param date: current date by local time.
+    :param begin: schedule begin time.
+    :param end: schedule end time.
+    :return: no
+    """
+
+    await _execute_statement("set_schedule_by_user",
+                             (schedule_id, account, date, begin, end))
+
+
+async def get_schedule_by_user(account, date):
+    """
+    get schedule
+
+    :param account: user account
+    :param date: current date by local time.
+    :return: schedule id, begin time
+    """
+
+    return await _fetch_one_statement_row("get_schedule_by_user",
+                                          (account, date))
+
+
+async def modify_schedule_by_user(schedule_id, end):
+    """
+    update schedule's end time
+
+    :param schedule_id: schedule_id
+    :param end: schedule end time.
+    :return: no
+    """
+
+    await _execute_statement("modify_schedule_by_user", (schedule_id, end))
+
+
+async def clean_schedule_by_user(account, date):
+    """
+    delete a schedule
+
+    :param account: user account
+    :param date: current date by local time.
+    :return: no
+    """
+
+    await _execute_statement("clean_schedule_by_user", (account, date))
+
+
+async def replace_schedule_id(schedule_id, new_schedule_id):
+    """
+    change the schedule id of a schedule
+
+    :param schedule_id: current schedule id
+    :param new_schedule_id: schedule id returned by the calendar.
+    :return: no
+    """
+
+    await _execute_statement("replace_schedule_id",
+                             (schedule_id, new_schedule_id))
+
+
+async def report_worked_time(period, begin, end, after, limit, account=None):
+    """
+    worked time of the accounts, by period.
+
+    :param period: day, week or month.
+    :param begin: first date, included.
+    :param end: last date, included.
+    :param after: only the accounts after this one, "" for the first page.
+    :param limit: maximum number of accounts.
+    :param account: only this account, None for all.
+    :return: list of (account, first date of the period, days,
+        days still checked in, worked seconds), by account and period.
+    """
+
+    return await _fetch_all_statement_rows(
+        "report_worked_time", (period, begin, end, after, limit, account))
+
+
+async def claim_calendar_sync(limit, lease):
+    """
+    Take the schedules due for a calendar request.
+
+    :param limit: maximum number of schedules.
+    :param lease: seconds before another worker can take them again.
+    :return: list of (account, date, process, created, version, attempts,
+        schedule id, begin time, end time)
+    """
+
+    return await _fetch_all_statement_rows("claim_calendar_sync",
+                                           (limit, lease))
+
+
+async def done_calendar_sync(account, date, version):
+    """
+    The calendar event is created or updated.
+
+    :param account: user account
+    :param date: schedule date.
+    :param version: version returned by claim_calendar_sync.
+    :return: no
+    """
+
+    await _execute_statement("done_calendar_sync", (account, date, version))
+
+
+async def fail_calendar_sync(account, date, version, delay, error):
+    """
+    The calendar request failed.
+
+    :param account: user account
+    :param date: schedule date.
+    :param version: version returned by claim_calendar_sync.
+    :param delay: seconds before the next attempt, None to give up.
+    :param error: error message.
+    :return: no
+    """
+
+    await _execute_statement("fail_calendar_sync",
+                             (account, date, version, delay, error))
+
+
+async def get_contact_name(account):
+    """
+    get a cached user name
+
+    :param account: user account
+    :return: (name, age in seconds) or None, name is None
+        for an unknown account.
+    """
+
+    return await _fetch_one_statement_row("get_contact_name", (account,))
+
+
+async def set_contact_name(account, name):
+    """
+    insert or update a cached user name
+
+    :param account: user account
+    :param name: user name, None for an unknown account.
+    :return: no
+    """
+
+    await _execute_statement("set_contact_name", (account, name))
+
+
+async def claim_callback(key, lease):
+    """
+    record a callback, unless it was received already.
+
+    :param key: hash of the callback.
+    :param lease: seconds after which a callback still handled is
+        handled again.
+    :return: (True, None) if the callback is to be handled, else
+        (False, status code), the code is None while it is handled.
+    """
+
+    return await _fetch_one_statement_row("claim_callback", (key, lease))
+
+
+async def finish_callback(key, code):
+    """
+    record the status code of a handled callback.
+
+    :param key: hash of the callback.
+    :param code: status code.
+    :return: no
+    """
+
+    await _execute_statement("finish_callback", (key, code))
+
+
+async def forget_callback(key):
+    """
+    remove a callback, it is handled again if it is retried.
+
+    :param key: hash of the callback.
+    :return: no
+    """
+
+    await _execute_statement("forget_callback", (key,))
+
+
+async def clean_callbacks(ttl):
+    """
+    remove the callbacks received more than ttl seconds ago.
+
+    :param ttl: seconds
+    :return: no
+    """
+
+    await _execute_statement("clean_callbacks", (ttl,))
+
+
+async def enqueue_messages(account, bodies):
+    """
+    add messages to the outbox, they are sent in this order.
+
+    :param account: user account
+    :param bodies: request bodies of the message API.
+    :return: no
+    """
+
+    await _execute_statement("enqueue_messages", (account, list(bodies)))
+
+
+async def enqueue_reminders(name, date, accounts, bodies):
+    """
+    add one reminder to each account, after the answers to the users,
+    and remember the last account in bot_reminder_run.
+
+    :param name: reminder name
+    :param date: reminder date
+    :param accounts: user accounts, in order.
+    :param bodies: request bodies of the message API, one per account.
+    :return: no
+    """
+
+    await _execute_statement("enqueue_reminders",
+                             (list(accounts), list(bodies), name, date,
+                              accounts[-1]))
+
+
+async def claim_reminder(name, date, lease):
+    """
+    Take a reminder of a day, unless another process has it.
+
+    :param name: reminder name
+    :param date: reminder date
+    :param lease: seconds without progress before another process can
+        take it over.
+    :return: the last account already reminded, "" for none,
+        None if the reminder is done or taken.
+    """
+
+    row = await _fetch_one_statement_row("claim_reminder",
+                                         (name, date, lease))
+    if row is None:
+        return None
+    return row[0]
+
+
+async def finish_reminder(name, date):
+    """
+    :return: the number of accounts reminded.
+    """
+
+    row = await _fetch_one_statement_row("finish_reminder", (name, date))
+    if row is None:
+        return 0
+    return row[0]
+
+
+async def get_reminder_accounts(process, date, active_days, after=""):
+    """
+    the accounts to remind, in order.
+
+    :param process: None to remind the accounts which have not clocked in,
+        sign_in_done those which have not clocked out.
+    :param date: current date by local time.
+    :param active_days: the accounts with a status in these days before
+        date are reminded to clock in.
+    :param after: only the accounts after this one.
+    :return: account list
+    """
+
+    if process is None:
+        rows = await _fetch_all_statement_rows(
+            "missing_sign_in", (date, active_days, after))
+    else:
+        rows = await _fetch_all_statement_rows(
+            "missing_sign_out", (date, after))
+    return [account for account, in rows]
+
+
+async def claim_messages(limit, lease, run):
+    """
+    Take the accounts whose first pending message is due, with their
+    first pending messages.
+
+    :param limit: maximum number of accounts.
+    :param lease: seconds before another worker can take them again.
+    :param run: maximum number of messages of an account.
+    :return: list of (id, account, body, attempts)
+    """
+
+    return await _fetch_all_statement_rows("claim_messages",
+                                           (limit, lease, run))
+
+
+async def delete_messages(message_ids):
+    """
+    remove the sent messages from the outbox.
+
+    :param message_ids: ids returned by claim_messages.
+    :return: no
+    """
+
+    await _execute_statement("delete_messages", (list(message_ids),))
+
+
+async def release_messages(message_ids):
+    """
+    Give back messages taken but not tried, they are taken again
+    with the first pending message of their account.
+
+    :param message_ids: ids returned by claim_messages.
+    :return: no
+    """
+
+    await _execute_statement("release_messages", (list(message_ids),))
+
+
+async def retry_message(message_id, delay, error, counted=True):
+    """
+    The message was not sent.
+
+    :param message_id: id returned by claim_messages.
+    :param delay: seconds before the next attempt, None to give up.
+    :param error: error message.
+    :param counted: False if the attempt doesn't count, e.g. rate limited.
+    :return: no
+    """
+
+    await _execute_statement("retry_message",
+                             (message_id, delay, error, counted))
+
+
+async def confirm_in_by_user(schedule_id, account, schedule_date,
+                             begin, end, date):
+    """
+    Insert the schedule and set the status to in_done, sign_in_done.
+    The schedule is queued for the calendar.
+
+    :param schedule_id: schedule_id
+    :param account: user account
+    :param schedule_date: date of the check-in time.
+    :param begin: schedule begin time.
+    :param end: schedule end time.
+    :param date: current date by local time.
+    :return: (status, process, previous status, previous process),
+        None if the user already has a schedule on schedule_date.
+    """
+
+    return await _fetch_one_statement_row(
+        "confirm_in_by_user",
+        (schedule_id, account, schedule_date, begin, end, date))
+
+
+async def confirm_out_by_user(account, schedule_date, end, date):
+    """
+    Update the schedule's end time and
+    set the status to out_done, sign_out_done.
+    The schedule is queued for the calendar.
+
+    :param account: user account
+    :param schedule_date: date of the check-out time.
+    :param end: schedule end time.
+    :param date: current date by local time.
+    :return: (schedule id, begin time, status, process),
+        None if the user has no schedule on schedule_date.
+    """
+
+    return await _fetch_one_statement_row(
+        "confirm_out_by_user", (account, schedule_date, end, date))
+
+
+async def enter_time_by_user(account, date, user_time):
+    """
+    Take the time entered by the user.
+    wait_in becomes in_done. wait_out becomes out_done,
+    unless the user has checked in after user_time.
+
+    :param account: user account
+    :param date: current date by local time.
+    :param user_time: entered time, a timestamp.
+    :return: (status, process, schedule begin time, new status)
+        new status is None if the status is unchanged.
+        None if the user has no status.
+    """
+
+    return await _fetch_one_statement_row("enter_time_by_user",
+                                          (account, date, user_time))
+
+
+async def insert_init_status(action, extra):
+    """
+    Inserts the initialization status of an item after initialization.
+
+    :param action: Initialized item
+    :param extra: Initialized data or status
+    :return: no
+    """
+
+    await _execute_statement("insert_init_status", (action, extra))
+
+
+async def update_init_status(action, extra):
+    """
+    Update the initialization status of an item after initialization.
+
+    :param action: Initialized item
+    :param extra: Initialized data or status
+    :return: no
+    """
+
+    await _execute_statement("update_init_status", (action, extra))
+
+
+async def get_init_status(action):
+    """
+    Get an item initialized data or status.
+
+    :param action: item
+    :return: initialized data or status
+    """
+
+    row = await _fetch_one_statement_row("get_init_status", (action,))
+    if row is None:
+        return None
+    return row[0]
+
+
+async def delete_init_status(action):
+    """
+    delete an item initialized data or status.
+
+    :param action: item
+    :return: no
+    """
+
+    await _execute_statement("delete_init_status", (action,))
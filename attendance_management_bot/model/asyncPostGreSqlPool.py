@@ -0,0 +1,153 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+asyncio connection pool for database.
+The request handlers use it so that a query never blocks the event loop.
+Check also: attendance_management_bot/model/asyncDBHandle.py
+
+    reference
+    - https://aiopg.readthedocs.io/en/stable/core.html#pool
+"""
+
+__all__ = ['get_pool', 'init_pool', 'close_pool', 'get_async_pool_stats',
+           'AsyncPostGreSql']
+
+import os
+import asyncio
+import logging
+import aiopg
+from attendance_management_bot.constant import DB_CONFIG
+from attendance_management_bot.settings import DB_ASYNC_POOL_MIN_SIZE, \
+    DB_ASYNC_POOL_MAX_SIZE, DB_POOL_TIMEOUT, DB_POOL_MAX_LIFETIME
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+# pid -> future of the aiopg pool of that process
+_pools = {}
+
+
+def _forget_failed_pool(pid, future):
+    if future.cancelled() or future.exception() is not None:
+        if _pools.get(pid) is future:
+            del _pools[pid]
+
+
+def get_pool(**config):
+    """
+    Get the pool of the current process, create it on first use.
+    A forked worker never reuses the connections of its parent.
+
+    :param config: overrides DB_CONFIG, only used when the pool is created.
+    :return: awaitable of aiopg.Pool
+    """
+    pid = os.getpid()
+    future = _pools.get(pid)
+    if future is None:
+        _pools.clear()
+        kwargs = dict(DB_CONFIG)
+        kwargs.update(config)
+        future = asyncio.ensure_future(
+            aiopg.create_pool(minsize=DB_ASYNC_POOL_MIN_SIZE,
+                              maxsize=DB_ASYNC_POOL_MAX_SIZE,
+                              timeout=DB_POOL_TIMEOUT,
+                              pool_recycle=DB_POOL_MAX_LIFETIME,
+                              enable_hstore=False,
+                              **kwargs))
+        future.add_done_callback(
+            lambda f: _forget_failed_pool(pid, f))
+        _pools[pid] = future
+    return future
+
+
+async def init_pool(**config):
+    """
+    Create the pool ahead of the first request.
+    Tests can pass connection parameters of a local Postgres.
+
+    :param config: overrides DB_CONFIG, e.g. host, port, dbname.
+    :return: aiopg.Pool
+    """
+    return await get_pool(**config)
+
+
+async def close_pool():
+    """
+    Close the pool of the current process and wait for its connections.
+    """
+    future = _pools.pop(os.getpid(), None)
+    if future is None:
+        return
+    pool = await future
+    pool.close()
+    await pool.wait_closed()
+
+
+def get_async_pool_stats():
+    """
+    :return: connections of the pool of this process, None if it is not
+        created yet.
+    """
+    future = _pools.get(os.getpid(), None)
+    if future is None or not future.done() or future.cancelled() \
+            or future.exception() is not None:
+        return None
+    pool = future.result()
+    return {"size": pool.size, "idle": pool.freesize,
+            "max_size": pool.maxsize}
+
+
+class AsyncPostGreSql:
+    """
+    Async counterpart of PostGreSql.
+
+        async with AsyncPostGreSql() as cursor:
+            await cursor.execute(sql, params)
+
+    Statements run in autocommit mode, pass transaction=True to wrap
+    the block in BEGIN / COMMIT, or ROLLBACK when it raises.
+    """
+
+    def __init__(self, transaction=False):
+        self._transaction = transaction
+        self._pool = None
+        self._conn = None
+        self._cursor = None
+
+    async def __aenter__(self):
+        self._pool = await get_pool()
+        self._conn = await self._pool.acquire()
+        try:
+            self._cursor = await self._conn.cursor()
+            if self._transaction:
+                await self._cursor.execute("BEGIN")
+        except Exception:
+            self._pool.release(self._conn)
+            raise
+        return self._cursor
+
+    async def __aexit__(self, type, value, tb):
+        try:
+            if self._transaction and not self._conn.closed:
+                if tb is None:
+                    await self._cursor.execute("COMMIT")
+                else:
+                    await self._cursor.execute("ROLLBACK")
+        finally:
+            self._cursor.close()
+            self._pool.release(self._conn)
@@ -23,10 +23,12 @@ Check also: scripts/initDB.py
 """
 
 __all__ = ['set_schedule_by_user', 'get_schedule_by_user',
-           'modify_schedule_by_user', 'clean_schedule_by_user']
+           'modify_schedule_by_user', 'clean_schedule_by_user',
+           'close_out_days']
 
 import logging
 from attendance_management_bot.model.postgreSqlPool import PostGreSql
+from attendance_management_bot.model.sqlStatements import execute_statement
 from psycopg2.errors import DuplicateTable
 
 LOGGER = logging.getLogger("attendance_management_bot")
@@ -44,15 +46,10 @@ def set_schedule_by_user(schedule_id, account, date,  begin, end):
     :return: no
     """
 
-    insert_sql = "INSERT INTO bot_calendar_record(schedule_id, account, " \
-                 "cur_date, begin_time, end_time) " \
-                 "VALUES('%s', '%s', '%s', %d, %d)" \
-                 % (schedule_id, account, date, begin, end)
-
     post_gre = PostGreSql()
-
     with post_gre as cursor:
-        cursor.execute(insert_sql)
+        execute_statement(cursor, "set_schedule_by_user",
+                          (schedule_id, account, date, begin, end))
 
 
 def get_schedule_by_user(account, date):
@@ -63,15 +60,11 @@ def get_schedule_by_user(account, date):
     :param date: current date by local time.
     :return: schedule id, begin time
     """
-    select_sql = "SELECT schedule_id, begin_time " \
-                 "FROM bot_calendar_record " \
-                 "WHERE account='%s' and cur_date='%s'" \
-                 % (account, date)
 
     row = None
     post_gre = PostGreSql()
     with post_gre as cursor:
-        cursor.execute(select_sql)
+        execute_statement(cursor, "get_schedule_by_user", (account, date))
         rows = cursor.fetchall()
         if rows is not None and len(rows) == 1:
             # ["schedule_id", "begin_time"]
@@ -87,14 +80,11 @@ def modify_schedule_by_user(schedule_id, end):
     :param end: schedule end time.
     :return: no
     """
-    select_sql = "UPDATE bot_calendar_record " \
-                 "SET end_time=%d, update_time=now()" \
-                 "WHERE schedule_id='%s'" \
-                 % (end, schedule_id)
 
     post_gre = PostGreSql()
     with post_gre as cursor:
-        cursor.execute(select_sql)
+        execute_statement(cursor, "modify_schedule_by_user",
+                          (schedule_id, end))
 
 
 def clean_schedule_by_user(account, date):
@@ -105,10 +95,27 @@ def clean_schedule_by_user(account, date):
     :param date: current date by local time.
     :return: no
     """
-    delete_sql = "DELETE FROM bot_calendar_record " \
-                 "WHERE account='%s' and cur_date='%s'" \
-                 % (account, date)
 
     post_gre = PostGreSql()
     with post_gre as cursor:
-        cursor.execute(delete_sql)
+        execute_statement(cursor, "clean_schedule_by_user", (account, date))
+
+
+def close_out_days(date, policy, end_time, time_zone, limit):
+    """
+    close the days before date the users clocked in and not out.
+
+    :param date: current date by local time.
+    :param policy: "end_time" to clock them out at end_time,
+        "review" to flag them only.
+    :param end_time: local time of the check-out, "HH:MM".
+    :param time_zone: time zone of end_time.
+    :param limit: maximum number of days closed.
+    :return: the number of days closed.
+    """
+
+    post_gre = PostGreSql()
+    with post_gre as cursor:
+        execute_statement(cursor, "close_out_days",
+                          (date, policy, end_time, time_zone, limit))
+        return cursor.fetchone()[0]
@@ -0,0 +1,163 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Message catalogs and date formatting for the i18n contents.
+Every .mo file under locales/ is loaded once, and dates are formatted
+with the tables below instead of locale.setlocale and strftime. Building
+a message then reads no file and changes no process-wide state.
+Check also: attendance_management_bot/model/i18n_data.py
+"""
+
+__all__ = ['LANGUAGES', 'load_catalogs', 'get_catalog', 'format_date']
+
+import os
+import re
+import gettext
+import threading
+from attendance_management_bot.constant import FILE_SYSTEM
+
+# (locale, language) of the contents, in the order they are sent.
+LANGUAGES = (('en_US', 'en'), ('ja_JP', 'ja'), ('ko_KR', 'ko'))
+
+_catalogs = {}
+_catalogs_lock = threading.RLock()
+
+
+def load_catalogs(locale_dir=FILE_SYSTEM["locale_dir"]):
+    """
+    Load <locale_dir>/<language>/LC_MESSAGES/<domain>.mo, for every
+    language and domain.
+
+    :return: number of catalogs loaded.
+    """
+    catalogs = {}
+    for language in os.listdir(locale_dir):
+        messages_dir = os.path.join(locale_dir, language, "LC_MESSAGES")
+        if not os.path.isdir(messages_dir):
+            continue
+        for file_name in os.listdir(messages_dir):
+            domain, ext = os.path.splitext(file_name)
+            if ext != ".mo":
+                continue
+            with open(os.path.join(messages_dir, file_name), "rb") as _file:
+                catalogs[(domain, language)] = gettext.GNUTranslations(_file)
+
+    with _catalogs_lock:
+        _catalogs.clear()
+        _catalogs.update(catalogs)
+    return len(catalogs)
+
+
+def get_catalog(domain, language):
+    """
+    :param domain: like "confirm_out"
+    :param language: 'en', 'ja' or 'ko'
+    :return: gettext.GNUTranslations
+    """
+    if not _catalogs:
+        with _catalogs_lock:
+            if not _catalogs:
+                load_catalogs()
+    catalog = _catalogs.get((domain, language), None)
+    if catalog is None:
+        raise FileNotFoundError("no catalog for domain:%s language:%s"
+                                % (domain, language))
+    return catalog
+
+
+# The names are the ones of glibc's en_US, ja_JP and ko_KR locales.
+# Weekdays begin on Monday, like datetime.weekday().
+_NAMES = {
+    'en': {
+        'A': ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+              'Saturday', 'Sunday'),
+        'a': ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'),
+        'B': ('January', 'February', 'March', 'April', 'May', 'June',
+              'July', 'August', 'September', 'October', 'November',
+              'December'),
+        'b': ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+              'Oct', 'Nov', 'Dec'),
+        'p': ('AM', 'PM'),
+        'P': ('am', 'pm'),
+    },
+    'ja': {
+        'A': ('月曜日', '火曜日', '水曜日', '木曜日', '金曜日', '土曜日',
+              '日曜日'),
+        'a': ('月', '火', '水', '木', '金', '土', '日'),
+        'B': tuple('%d月' % (month,) for month in range(1, 13)),
+        'b': tuple('%2d月' % (month,) for month in range(1, 13)),
+        'p': ('午前', '午後'),
+        'P': ('午前', '午後'),
+    },
+    'ko': {
+        'A': ('월요일', '화요일', '수요일', '목요일', '금요일', '토요일',
+              '일요일'),
+        'a': ('월', '화', '수', '목', '금', '토', '일'),
+        'B': tuple('%d월' % (month,) for month in range(1, 13)),
+        'b': tuple('%2d월' % (month,) for month in range(1, 13)),
+        'p': ('오전', '오후'),
+        'P': ('오전', '오후'),
+    },
+}
+
+_DIRECTIVE = re.compile(r'%(-?)(.)')
+
+
+def _numbers(date):
+    hour12 = date.hour % 12
+    if hour12 == 0:
+        hour12 = 12
+    return {'d': date.day, 'm': date.month, 'H': date.hour, 'I': hour12,
+            'M': date.minute, 'S': date.second, 'y': date.year % 100}
+
+
+def format_date(date, fmt, language):
+    """
+    strftime with the names of a language, without setlocale.
+    Supports %a %A %b %B %p %P %d %m %H %I %M %S %y %Y %%, and the "-"
+    flag of glibc that removes the padding, like %-d.
+    Other directives are passed to datetime.strftime.
+
+    :param date: datetime
+    :param fmt: format, like "%A, %B %-d"
+    :param language: 'en', 'ja' or 'ko', or a locale like 'ja_JP'
+    :return: formatted string
+    """
+    names = _NAMES[language.split('_')[0]]
+    numbers = _numbers(date)
+
+    def replace(match):
+        no_padding, directive = match.groups()
+        if directive in ('A', 'a'):
+            return names[directive][date.weekday()]
+        if directive in ('B', 'b'):
+            return names[directive][date.month - 1]
+        if directive in ('p', 'P'):
+            return names[directive][date.hour // 12]
+        if directive in numbers:
+            if no_padding:
+                return str(numbers[directive])
+            return '%02d' % (numbers[directive],)
+        if directive == 'Y':
+            return str(date.year)
+        if directive == '%':
+            return '%'
+        return date.strftime(match.group(0))
+
+    return _DIRECTIVE.sub(replace, fmt)
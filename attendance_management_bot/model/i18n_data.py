@@ -27,8 +27,9 @@ __all__ = ['get_i18n_content', 'get_i18n_content_by_lang', 'make_i18n_button',
 import json
 from attendance_management_bot.constant import IMAGE_CAROUSEL
 from attendance_management_bot.model.data import *
+from attendance_management_bot.model.i18n_catalog import LANGUAGES, \
+    get_catalog, format_date
 import gettext
-import locale
 _ = gettext.gettext
 
 
@@ -49,10 +50,8 @@ def get_i18n_content(fmt, local, **kw):
     :return:
         If the parameter contains the package function of the package, An encapsulated multilingual dictionary object will be returned.
         If the parameter does not contain a package function, this returns a Multilingual list object.
+    Check also: attendance_management_bot/model/i18n_catalog.py
     """
-    ko = gettext.translation(local, 'locales', ['ko'])
-    en = gettext.translation(local, 'locales', ['en'])
-    ja = gettext.translation(local, 'locales', ['ja'])
 
     i18n_content = {}
     function = None
@@ -69,11 +68,10 @@ def get_i18n_content(fmt, local, **kw):
     if 'date' in kw:
         date = kw['date']
 
-    for lang in [('en_US', en), ('ja_JP', ja), ('ko_KR', ko)]:
+    for lang in [(code, get_catalog(local, language))
+                 for code, language in LANGUAGES]:
         if fmt1 is not None and date is not None:
-            locale.setlocale(locale.LC_TIME,
-                             "{lang}{code}".format(lang=lang[0], code=".utf8"))
-            kw['date'] = date.strftime(lang[1].gettext(fmt1))
+            kw['date'] = format_date(date, lang[1].gettext(fmt1), lang[0])
 
         if function is not None:
             if len(kw) > 0:
@@ -88,8 +86,6 @@ def get_i18n_content(fmt, local, **kw):
             i18n_content[lang[0]] = lang[1].gettext(fmt).format(**kw)
         else:
             i18n_content[lang[0]] = lang[1].gettext(fmt)
-    locale.setlocale(locale.LC_TIME,
-                     "{lang}{code}".format(lang='en_US', code=".utf8"))
     return i18n_content
 
 
@@ -108,8 +104,7 @@ def get_i18n_content_by_lang(fmt, local, lang, **kw):
         date: Local time of datetime object.
     :return: a string.
     """
-    local_map = {'en': 'en_US', 'ja': 'ja_JP', 'ko': 'ko_KR'}
-    local_text = gettext.translation(local, 'locales', [lang])
+    local_text = get_catalog(local, lang)
 
     date = None
     if 'date' in kw:
@@ -120,18 +115,13 @@ def get_i18n_content_by_lang(fmt, local, lang, **kw):
         fmt1 = kw['fmt1']
 
     if date is not None and fmt1 is not None:
-        locale.setlocale(locale.LC_TIME,
-                         "{lang}{code}".format(lang=local_map[lang],
-                                               code=".utf8"))
-        kw['date'] = date.strftime(local_text.gettext(fmt1))
+        kw['date'] = format_date(date, local_text.gettext(fmt1), lang)
 
     del kw['fmt1']
     if len(kw) > 0:
         content = local_text.gettext(fmt).format(**kw)
     else:
         content = local_text.gettext(fmt)
-    locale.setlocale(locale.LC_TIME,
-                     "{lang}{code}".format(lang='en_US', code=".utf8"))
     return content
 
 
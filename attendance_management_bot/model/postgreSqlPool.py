@@ -17,22 +17,267 @@ limitations under the License.
 """
 
 """
-Connection pool for database
+Connection pool for database.
+
+One pool is created per worker process, the first time a connection
+is needed, and is shared by every PostGreSql context after that.
+Check also: attendance_management_bot/settings.py
 
     reference
-    - https://cito.github.io/DBUtils/UsersGuide.html#pooleddb
+    - https://www.psycopg.org/docs/connection.html
 """
 
+__all__ = ['PoolTimeout', 'ConnectionPool', 'PostGreSql', 'get_pool_stats',
+           'close_pool']
+
+import os
+import time
+import logging
+import threading
+from collections import deque
 import psycopg2
-import psycopg2.extras as extras
-from psycopg2.errors import DuplicateTable
-from DBUtils.PooledDB import PooledDB
-from DBUtils.PersistentDB import PersistentDB
+import psycopg2.extensions as extensions
 from attendance_management_bot.constant import DB_CONFIG
+from attendance_management_bot.settings import DB_POOL_MIN_SIZE, \
+    DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, DB_POOL_IDLE_TIMEOUT, \
+    DB_POOL_MAX_LIFETIME, DB_POOL_PRE_PING
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+
+class PoolTimeout(Exception):
+    """
+    No connection became free within DB_POOL_TIMEOUT seconds.
+    """
+
+
+class PooledConnection(extensions.connection):
+    """
+    psycopg2 connection that remembers when it was opened and
+    when it was last given back to the pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.time()
+        self.released_at = self.created_at
+
+
+class ConnectionPool:
+    """
+    A bounded pool of psycopg2 connections.
+
+    Connections older than max_lifetime, or idle longer than
+    idle_timeout, are closed instead of being handed out. A connection
+    idle longer than pre_ping seconds is checked with "SELECT 1" first.
+    """
+
+    def __init__(self, min_size, max_size, timeout, idle_timeout,
+                 max_lifetime, pre_ping, **connect_kwargs):
+        self.pid = os.getpid()
+        self._min_size = min_size
+        self._max_size = max_size
+        self._timeout = timeout
+        self._idle_timeout = idle_timeout
+        self._max_lifetime = max_lifetime
+        self._pre_ping = pre_ping
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+
+        # counters, see stats()
+        self._checked_out = 0
+        self._created = 0
+        self._recycled = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+
+        for _ in range(min_size):
+            self._size += 1
+            self._idle.append(self._create())
+
+    def _create(self):
+        try:
+            conn = psycopg2.connect(connection_factory=PooledConnection,
+                                    **self._connect_kwargs)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _expired(self, conn, now):
+        if conn.closed:
+            return True
+        if self._max_lifetime and now - conn.created_at > self._max_lifetime:
+            return True
+        if self._idle_timeout and now - conn.released_at > self._idle_timeout:
+            return True
+        return False
+
+    def _discard(self, conn):
+        """
+        Close a connection and free its slot. Must hold self._cond.
+        """
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        self._size -= 1
+        self._recycled += 1
+        self._cond.notify()
+
+    def _ping(self, conn):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            LOGGER.info("drop a broken connection from the pool.")
+            return False
+
+    def _checkout(self, deadline):
+        """
+        Take an idle connection or reserve a slot for a new one.
+
+        :return: a connection, or None if a slot was reserved.
+        """
+        now = time.time()
+        waited = False
+        with self._cond:
+            while True:
+                while len(self._idle) > self._min_size \
+                        and self._expired(self._idle[0], now):
+                    self._discard(self._idle.popleft())
+
+                while self._idle:
+                    conn = self._idle.pop()
+                    if self._expired(conn, now):
+                        self._discard(conn)
+                        continue
+                    break
+                else:
+                    conn = None
+
+                if conn is not None or self._size < self._max_size:
+                    if conn is None:
+                        self._size += 1
+                    self._checked_out += 1
+                    break
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise PoolTimeout("no free connection in %.1f seconds."
+                                      % self._timeout)
+                waited = True
+                self._cond.wait(remaining)
+                now = time.time()
+
+            if waited:
+                wait_time = now - (deadline - self._timeout)
+                self._waits += 1
+                self._wait_time += wait_time
+                self._max_wait = max(self._max_wait, wait_time)
+        return conn
+
+    def connection(self):
+        """
+        Check out a connection. Give it back with release().
+
+        :return: psycopg2 connection
+        """
+        deadline = time.time() + self._timeout
+        while True:
+            conn = self._checkout(deadline)
+            if conn is None:
+                try:
+                    return self._create()
+                except Exception:
+                    with self._cond:
+                        self._checked_out -= 1
+                    raise
+
+            if self._pre_ping is None \
+                    or time.time() - conn.released_at < self._pre_ping \
+                    or self._ping(conn):
+                return conn
+
+            with self._cond:
+                self._checked_out -= 1
+                self._discard(conn)
+
+    def release(self, conn):
+        """
+        Give a connection back to the pool.
+
+        :param conn: connection returned by connection()
+        """
+        if not conn.closed and conn.get_transaction_status() \
+                != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                conn.close()
+
+        with self._cond:
+            self._checked_out -= 1
+            if conn.closed:
+                self._discard(conn)
+                return
+            conn.released_at = time.time()
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self):
+        """
+        Close every idle connection.
+        """
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+    def stats(self):
+        """
+        Live counters of the pool.
+
+        =========== ===========
+        key         description
+        =========== ===========
+        size        open connections, idle and checked out.
+        idle        connections waiting in the pool.
+        checked_out connections in use.
+        max_size    upper bound of size.
+        created     connections opened since the pool was created.
+        recycled    connections closed for age, idleness or errors.
+        waits       checkouts that had to wait for a free connection.
+        wait_time   total seconds spent waiting.
+        max_wait    longest single wait in seconds.
+        =========== ===========
+        """
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "checked_out": self._checked_out,
+                "max_size": self._max_size,
+                "created": self._created,
+                "recycled": self._recycled,
+                "waits": self._waits,
+                "wait_time": self._wait_time,
+                "max_wait": self._max_wait
+            }
 
 
 class PostGreSql:
     __pool = None
+    __pool_lock = threading.Lock()
     _conn = None
     _cursor = None
 
@@ -60,27 +305,62 @@ class PostGreSql:
         return self._cursor.fetchone()
 
     def close(self):
-        self._conn.close()
         self._cursor.close()
+        PostGreSql.get_pool().release(self._conn)
 
     def __enter__(self):
         return self.cursor()
 
     def __exit__(self, type, value, tb):
-        if tb is None:
-            self.commit()
-        else:
-            self.rollback()
-        self.close()
+        try:
+            if tb is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            self.close()
+
+    @staticmethod
+    def get_pool():
+        """
+        Get the pool of the current process. A forked worker never
+        reuses the connections of its parent, it builds its own pool.
+        """
+        pool = PostGreSql.__pool
+        if pool is not None and pool.pid == os.getpid():
+            return pool
+
+        with PostGreSql.__pool_lock:
+            if PostGreSql.__pool is None \
+                    or PostGreSql.__pool.pid != os.getpid():
+                PostGreSql.__pool = ConnectionPool(
+                    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT,
+                    DB_POOL_IDLE_TIMEOUT, DB_POOL_MAX_LIFETIME,
+                    DB_POOL_PRE_PING, **DB_CONFIG)
+            return PostGreSql.__pool
 
     @staticmethod
     def __get_conn():
-        if PostGreSql.__pool is None:
-            __pool = PooledDB(creator=psycopg2, mincached=1, maxcached=20,
-                              host=DB_CONFIG["host"],
-                              port=DB_CONFIG["port"],
-                              user=DB_CONFIG["user"],
-                              password=DB_CONFIG["password"],
-                              database=DB_CONFIG["dbname"],
-                              sslmode=DB_CONFIG["sslmode"])
-        return __pool.connection()
+        return PostGreSql.get_pool().connection()
+
+
+def get_pool_stats():
+    """
+    Counters of this process's pool. Check also: ConnectionPool.stats
+
+    :return: dict of counters, None before the first query.
+    """
+    pool = PostGreSql._PostGreSql__pool
+    if pool is None or pool.pid != os.getpid():
+        return None
+    return pool.stats()
+
+
+def close_pool():
+    """
+    Close the idle connections of this process's pool, e.g. before fork,
+    so that no worker inherits them.
+    """
+    pool = PostGreSql._PostGreSql__pool
+    if pool is not None and pool.pid == os.getpid():
+        pool.close()
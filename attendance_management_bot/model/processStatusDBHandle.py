@@ -28,6 +28,7 @@ __all__ = ['insert_replace_status_by_user_date', 'set_status_by_user_date',
 
 import logging
 from attendance_management_bot.model.postgreSqlPool import PostGreSql
+from attendance_management_bot.model.sqlStatements import execute_statement
 from psycopg2.errors import DuplicateTable, DuplicateObject
 
 LOGGER = logging.getLogger("attendance_management_bot")
@@ -47,22 +48,10 @@ def insert_replace_status_by_user_date(account, date, status, process=None):
     if status is None:
         return False
 
-    insert_sql = "INSERT INTO bot_process_status(account, cur_date, status)" \
-                 " VALUES('%s', '%s', '%s') ON CONFLICT(account, cur_date) " \
-                 "DO UPDATE SET status='%s', update_time=now()" % \
-                 (account, date, status, status)
-    if process is not None:
-        insert_sql = "INSERT INTO bot_process_status(" \
-                     "account, cur_date, status, process) " \
-                     "VALUES('%s', '%s', '%s', '%s') " \
-                     "ON CONFLICT(account, cur_date) " \
-                     "DO UPDATE SET " \
-                     "status='%s', process='%s', update_time=now()" % \
-                     (account, date, status, process, status, process)
-
     post_gre = PostGreSql()
     with post_gre as cursor:
-        cursor.execute(insert_sql)
+        execute_statement(cursor, "insert_replace_status_by_user_date",
+                          (account, date, status, process))
 
 
 def set_status_by_user_date(account, date, status=None, process=None):
@@ -76,19 +65,10 @@ def set_status_by_user_date(account, date, status=None, process=None):
     :return: no
     """
 
-    condition = "WHERE account='%s' and cur_date='%s'" % (account, date)
-
-    update_sql = "UPDATE bot_process_status SET update_time=now()"
-    if status is not None:
-        update_sql = "%s , status='%s'" % (update_sql, status,)
-    if process is not None:
-        update_sql = "%s , process='%s'" % (update_sql, process,)
-
-    update_sql = "%s %s" % (update_sql, condition,)
-
     post_gre = PostGreSql()
     with post_gre as cursor:
-        cursor.execute(update_sql)
+        execute_statement(cursor, "set_status_by_user_date",
+                          (account, date, status, process))
 
 
 def get_status_by_user(account, date):
@@ -100,15 +80,10 @@ def get_status_by_user(account, date):
     :return: no
     """
 
-    select_sql = "SELECT status, process " \
-                 "FROM bot_process_status " \
-                 "WHERE account='%s' and cur_date='%s'" \
-                 % (account, date)
-
     row = None
     post_gre = PostGreSql()
     with post_gre as cursor:
-        cursor.execute(select_sql)
+        execute_statement(cursor, "get_status_by_user", (account, date))
         rows = cursor.fetchall()
         if rows is not None and len(rows) == 1:
             # ['status', 'process']
@@ -125,14 +100,10 @@ def delete_status_by_user_date(account, date):
     :return: no
     """
 
-    delete_status_sql = "UPDATE bot_process_status SET status=NULL, " \
-                        "update_time=now() " \
-                        "WHERE account='%s' and cur_date='%s'" % \
-                        (account, date)
-
     post_gre = PostGreSql()
     with post_gre as cursor:
-        cursor.execute(delete_status_sql)
+        execute_statement(cursor, "delete_status_by_user_date",
+                          (account, date))
 
 
 def clean_status_by_user(account, date):
@@ -144,9 +115,6 @@ def clean_status_by_user(account, date):
     :return: no
     """
 
-    delete_sql = "DELETE FROM bot_process_status " \
-                 "WHERE account='%s' and cur_date='%s' " % (account, date)
-
     post_gre = PostGreSql()
     with post_gre as cursor:
-        cursor.execute(delete_sql)
+        execute_statement(cursor, "clean_status_by_user", (account, date))
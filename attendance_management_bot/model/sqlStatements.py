@@ -0,0 +1,515 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Registry of the statements run against bot_process_status,
+bot_calendar_record, bot_calendar_sync, bot_contact_name,
+bot_message_outbox, bot_callback_dedup, bot_reminder_run and
+system_init_status.
+
+A statement is prepared on a connection the first time it is used
+there, then run with EXECUTE and bound parameters. Postgres parses and
+plans each statement once per connection, and its statistics
+(pg_stat_statements) are grouped by statement, not by account.
+
+    reference
+    - https://www.postgresql.org/docs/current/sql-prepare.html
+"""
+
+__all__ = ['Statement', 'register_statement', 'get_statement',
+           'execute_statement', 'async_execute_statement']
+
+import re
+import weakref
+from attendance_management_bot.metrics import DB_SECONDS
+
+# name -> Statement
+_statements = {}
+
+# connection -> names of the statements prepared on it.
+# The entry goes away with the connection.
+_prepared = weakref.WeakKeyDictionary()
+
+
+class Statement:
+    """
+    One query shape. Parameters are written $1, $2, ... in sql.
+    """
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        self.param_count = max([int(i) for i in re.findall(r"\$(\d+)", sql)],
+                               default=0)
+
+        self.prepare_sql = "PREPARE %s AS %s" % (name, sql)
+        if self.param_count > 0:
+            self.execute_sql = "EXECUTE %s(%s)" \
+                               % (name, ", ".join(["%s"] * self.param_count))
+        else:
+            self.execute_sql = "EXECUTE %s" % (name,)
+
+    def params(self, params):
+        if params is None:
+            params = ()
+        if len(params) != self.param_count:
+            raise ValueError("statement %s takes %d parameters, %d given."
+                             % (self.name, self.param_count, len(params)))
+        return params
+
+    def is_prepared(self, connection):
+        names = _prepared.get(connection)
+        return names is not None and self.name in names
+
+    def set_prepared(self, connection):
+        """
+        Remember the statement exists on this connection. A prepared
+        statement outlives a rollback, so this is only called once
+        PREPARE has succeeded, whatever happens to EXECUTE.
+        """
+        names = _prepared.get(connection)
+        if names is None:
+            names = set()
+            _prepared[connection] = names
+        names.add(self.name)
+
+
+def register_statement(name, sql):
+    """
+    Add a statement to the registry.
+
+    :param name: statement name, also used as the prepared statement name.
+    :param sql: statement text with $n parameters.
+    :return: Statement
+    """
+    if name in _statements:
+        raise ValueError("statement %s is already registered." % (name,))
+    statement = Statement(name, sql)
+    _statements[name] = statement
+    return statement
+
+
+def get_statement(name):
+    return _statements[name]
+
+
+def execute_statement(cursor, name, params=None):
+    """
+    Run a registered statement on a psycopg2 cursor.
+    The first use on a connection costs one more round trip for PREPARE.
+
+    :param cursor: cursor, e.g. from "with PostGreSql() as cursor"
+    :param name: statement name
+    :param params: parameter tuple, in $n order.
+    """
+    statement = _statements[name]
+    params = statement.params(params)
+    with DB_SECONDS.time(name):
+        if not statement.is_prepared(cursor.connection):
+            cursor.execute(statement.prepare_sql)
+            statement.set_prepared(cursor.connection)
+        cursor.execute(statement.execute_sql, params)
+
+
+async def async_execute_statement(cursor, name, params=None):
+    """
+    Run a registered statement on an aiopg cursor.
+    Check also: execute_statement
+    """
+    statement = _statements[name]
+    params = statement.params(params)
+    with DB_SECONDS.time(name):
+        if not statement.is_prepared(cursor.connection):
+            await cursor.execute(statement.prepare_sql)
+            statement.set_prepared(cursor.connection)
+        await cursor.execute(statement.execute_sql, params)
+
+
+# bot_process_status
+
+register_statement(
+    "get_status_by_user",
+    "SELECT status, process FROM bot_process_status "
+    "WHERE account=$1 AND cur_date=$2")
+
+register_statement(
+    "insert_replace_status_by_user_date",
+    "INSERT INTO bot_process_status(account, cur_date, status, process) "
+    "VALUES($1, $2, $3, $4) ON CONFLICT(account, cur_date) "
+    "DO UPDATE SET status=EXCLUDED.status, "
+    "process=COALESCE(EXCLUDED.process, bot_process_status.process), "
+    "update_time=now()")
+
+register_statement(
+    "set_status_by_user_date",
+    "UPDATE bot_process_status SET update_time=now(), "
+    "status=COALESCE($3, status), process=COALESCE($4, process) "
+    "WHERE account=$1 AND cur_date=$2")
+
+register_statement(
+    "delete_status_by_user_date",
+    "UPDATE bot_process_status SET status=NULL, update_time=now() "
+    "WHERE account=$1 AND cur_date=$2")
+
+register_statement(
+    "clean_status_by_user",
+    "DELETE FROM bot_process_status WHERE account=$1 AND cur_date=$2")
+
+# bot_calendar_record
+
+register_statement(
+    "set_schedule_by_user",
+    "INSERT INTO bot_calendar_record(schedule_id, account, cur_date, "
+    "begin_time, end_time) VALUES($1, $2, $3, $4, $5)")
+
+register_statement(
+    "get_schedule_by_user",
+    "SELECT schedule_id, begin_time FROM bot_calendar_record "
+    "WHERE account=$1 AND cur_date=$2")
+
+register_statement(
+    "modify_schedule_by_user",
+    "UPDATE bot_calendar_record SET end_time=$2, update_time=now() "
+    "WHERE schedule_id=$1")
+
+register_statement(
+    "clean_schedule_by_user",
+    "DELETE FROM bot_calendar_record WHERE account=$1 AND cur_date=$2")
+
+register_statement(
+    "replace_schedule_id",
+    "UPDATE bot_calendar_record SET schedule_id=$2, update_time=now() "
+    "WHERE schedule_id=$1")
+
+# The days before $1 the users clocked in and not out, $5 at most, are
+# closed by the policy $2. With end_time they are clocked out at the
+# local time $3 of the time zone $4, and their calendar event is queued.
+# With review they are only flagged.
+register_statement(
+    "close_out_days",
+    "WITH open AS ("
+    "SELECT c.schedule_id, c.cur_date FROM bot_calendar_sync s "
+    "JOIN bot_calendar_record c "
+    "ON c.account=s.account AND c.cur_date=s.cur_date "
+    "WHERE s.process='sign_in_done' AND s.cur_date<$1::date "
+    "AND c.close_out IS NULL "
+    "ORDER BY s.cur_date LIMIT $5 FOR UPDATE OF c SKIP LOCKED), "
+    "closed AS ("
+    "UPDATE bot_calendar_record c SET close_out=$2::varchar, "
+    "end_time=CASE WHEN $2::varchar='end_time' THEN GREATEST(c.begin_time, "
+    "extract(epoch FROM (c.cur_date+$3::time) AT TIME ZONE $4::text)"
+    "::bigint) ELSE c.end_time END, update_time=now() FROM open "
+    "WHERE c.schedule_id=open.schedule_id AND c.cur_date=open.cur_date "
+    "RETURNING c.account, c.cur_date), "
+    "sync AS ("
+    "UPDATE bot_calendar_sync s SET process='sign_out_done', "
+    "state='pending', version=s.version+1, attempts=0, "
+    "next_time=GREATEST(s.next_time, now()), update_time=now() "
+    "FROM closed WHERE $2::varchar='end_time' "
+    "AND s.account=closed.account AND s.cur_date=closed.cur_date), "
+    "status AS ("
+    "UPDATE bot_process_status p SET status='out_done', "
+    "process='sign_out_done', update_time=now() "
+    "FROM closed WHERE $2::varchar='end_time' "
+    "AND p.account=closed.account AND p.cur_date=closed.cur_date "
+    "AND p.process='sign_in_done') "
+    "SELECT count(*) FROM closed")
+
+# worked time by account and day, week or month ($1) between the dates
+# $2 and $3, for the first $5 accounts after $4, or only the account $6.
+# A day still checked in counts as open, with no worked time.
+# Check also: attendance_management_bot/reportsHandler.py
+
+register_statement(
+    "report_worked_time",
+    "WITH accounts AS ("
+    "SELECT DISTINCT account FROM bot_calendar_record "
+    "WHERE cur_date BETWEEN $2::date AND $3::date AND account>$4 "
+    "AND ($6::varchar IS NULL OR account=$6) "
+    "ORDER BY account LIMIT $5) "
+    "SELECT r.account, date_trunc($1::text, r.cur_date)::date, count(*), "
+    "count(*) FILTER (WHERE s.process='sign_in_done'), "
+    "COALESCE(sum(GREATEST(r.end_time-r.begin_time, 0)) "
+    "FILTER (WHERE s.process IS DISTINCT FROM 'sign_in_done'), 0) "
+    "FROM bot_calendar_record r JOIN accounts USING(account) "
+    "LEFT JOIN bot_calendar_sync s "
+    "ON s.account=r.account AND s.cur_date=r.cur_date "
+    "WHERE r.cur_date BETWEEN $2::date AND $3::date "
+    "GROUP BY 1, 2 ORDER BY 1, 2")
+
+# bot_calendar_sync, the schedules are added by the transitions below.
+# A worker takes up to $1 due rows and keeps them for $2 seconds.
+# The others skip the rows it has locked, then see the new next_time.
+
+register_statement(
+    "claim_calendar_sync",
+    "UPDATE bot_calendar_sync s SET attempts=s.attempts+1, "
+    "next_time=now()+make_interval(secs=>$2::float8), update_time=now() "
+    "FROM bot_calendar_record c "
+    "WHERE c.account=s.account AND c.cur_date=s.cur_date "
+    "AND (s.account, s.cur_date) IN ("
+    "SELECT account, cur_date FROM bot_calendar_sync "
+    "WHERE state='pending' AND next_time<=now() "
+    "ORDER BY next_time LIMIT $1 FOR UPDATE SKIP LOCKED) "
+    "RETURNING s.account, s.cur_date, s.process, s.created, s.version, "
+    "s.attempts, c.schedule_id, c.begin_time, c.end_time")
+
+# The schedule changed during the request if the version changed,
+# the row then stays pending.
+register_statement(
+    "done_calendar_sync",
+    "UPDATE bot_calendar_sync SET created=true, last_error=NULL, "
+    "state=CASE WHEN version=$3 THEN 'synced'::m_sync ELSE state END, "
+    "next_time=now(), update_time=now() "
+    "WHERE account=$1 AND cur_date=$2")
+
+# $4 is the delay before the next attempt, NULL when it is the last one.
+register_statement(
+    "fail_calendar_sync",
+    "UPDATE bot_calendar_sync SET last_error=$5, "
+    "state=CASE WHEN version=$3 AND $4::float8 IS NULL "
+    "THEN 'failed'::m_sync ELSE 'pending'::m_sync END, "
+    "next_time=now()+make_interval(secs=>COALESCE($4::float8, 0)), "
+    "update_time=now() WHERE account=$1 AND cur_date=$2")
+
+# bot_contact_name, the age is in seconds.
+
+register_statement(
+    "get_contact_name",
+    "SELECT name, EXTRACT(EPOCH FROM now()-update_time)::float8 "
+    "FROM bot_contact_name WHERE account=$1")
+
+register_statement(
+    "set_contact_name",
+    "INSERT INTO bot_contact_name(account, name) VALUES($1, $2) "
+    "ON CONFLICT(account) DO UPDATE SET name=EXCLUDED.name, "
+    "update_time=now()")
+
+# bot_callback_dedup. A callback still handled after $2 seconds is taken
+# to be lost with its process, and can be handled again.
+# Returns (true, NULL) if the callback is to be handled, else
+# (false, status code) with NULL while it is handled.
+
+register_statement(
+    "claim_callback",
+    "WITH claimed AS ("
+    "INSERT INTO bot_callback_dedup(key) VALUES($1) "
+    "ON CONFLICT(key) DO UPDATE SET create_time=now() "
+    "WHERE bot_callback_dedup.code IS NULL AND bot_callback_dedup.create_time"
+    "<now()-make_interval(secs=>$2::float8) RETURNING key) "
+    "SELECT EXISTS(SELECT 1 FROM claimed), "
+    "(SELECT code FROM bot_callback_dedup WHERE key=$1)")
+
+register_statement(
+    "finish_callback",
+    "UPDATE bot_callback_dedup SET code=$2 WHERE key=$1")
+
+register_statement(
+    "forget_callback",
+    "DELETE FROM bot_callback_dedup WHERE key=$1")
+
+register_statement(
+    "clean_callbacks",
+    "DELETE FROM bot_callback_dedup "
+    "WHERE create_time<now()-make_interval(secs=>$1::float8)")
+
+# bot_message_outbox. The messages of an account get increasing ids.
+# An account is taken when its first pending message is due, with at
+# most $3 of its pending messages, which are then sent in order. Another
+# worker can't take the account until they are sent, failed or released.
+# The answers to the users (priority 0) go before the reminders.
+
+register_statement(
+    "enqueue_messages",
+    "INSERT INTO bot_message_outbox(account, body) "
+    "SELECT $1, body FROM unnest($2::text[]) WITH ORDINALITY "
+    "AS messages(body, n) ORDER BY n")
+
+# one message to each account of $1, the bodies $2 in the same order.
+register_statement(
+    "enqueue_reminders",
+    "WITH messages AS ("
+    "INSERT INTO bot_message_outbox(account, body, priority) "
+    "SELECT account, body, 1 "
+    "FROM unnest($1::varchar[], $2::text[]) AS messages(account, body) "
+    "RETURNING 1) "
+    "UPDATE bot_reminder_run SET last_account=$5, "
+    "sent=sent+(SELECT count(*) FROM messages), update_time=now() "
+    "WHERE name=$3 AND cur_date=$4")
+
+register_statement(
+    "claim_messages",
+    "WITH heads AS ("
+    "SELECT o.account FROM bot_message_outbox o "
+    "WHERE o.state='pending' AND o.next_time<=now() "
+    "AND NOT EXISTS(SELECT 1 FROM bot_message_outbox p "
+    "WHERE p.account=o.account AND p.state='pending' AND p.id<o.id) "
+    "ORDER BY o.priority, o.id LIMIT $1 FOR UPDATE SKIP LOCKED), "
+    "runs AS ("
+    "SELECT m.id, row_number() OVER ("
+    "PARTITION BY m.account ORDER BY m.id) AS n "
+    "FROM bot_message_outbox m JOIN heads USING(account) "
+    "WHERE m.state='pending') "
+    "UPDATE bot_message_outbox SET attempts=attempts+1, "
+    "next_time=now()+make_interval(secs=>$2::float8), update_time=now() "
+    "WHERE id IN (SELECT id FROM runs WHERE n<=$3) "
+    "RETURNING id, account, body, attempts")
+
+register_statement(
+    "delete_messages",
+    "DELETE FROM bot_message_outbox WHERE id=ANY($1::bigint[])")
+
+# taken but not tried, because an earlier message of the account failed.
+register_statement(
+    "release_messages",
+    "UPDATE bot_message_outbox SET attempts=attempts-1, next_time=now(), "
+    "update_time=now() WHERE id=ANY($1::bigint[])")
+
+# $2 is the delay before the next attempt, NULL to give up.
+# The attempt is not counted if $4 is false, e.g. after a 429.
+register_statement(
+    "retry_message",
+    "UPDATE bot_message_outbox SET last_error=$3, "
+    "state=CASE WHEN $2::float8 IS NULL "
+    "THEN 'failed'::m_delivery ELSE 'pending'::m_delivery END, "
+    "attempts=attempts-CASE WHEN $4::boolean THEN 0 ELSE 1 END, "
+    "next_time=now()+make_interval(secs=>COALESCE($2::float8, 0)), "
+    "update_time=now() WHERE id=$1")
+
+# state transitions, each one statement and so one transaction.
+
+register_statement(
+    "confirm_in_by_user",
+    "WITH previous AS ("
+    "SELECT status, process FROM bot_process_status "
+    "WHERE account=$2 AND cur_date=$6), "
+    "schedule AS ("
+    "INSERT INTO bot_calendar_record(schedule_id, account, cur_date, "
+    "begin_time, end_time) VALUES($1, $2, $3, $4, $5) "
+    "ON CONFLICT(account, cur_date) DO NOTHING RETURNING schedule_id), "
+    "sync AS ("
+    "INSERT INTO bot_calendar_sync(account, cur_date, process) "
+    "SELECT $2, $3::date, 'sign_in_done'::m_process FROM schedule), "
+    "status AS ("
+    "INSERT INTO bot_process_status(account, cur_date, status, process) "
+    "SELECT $2, $6::date, 'in_done'::m_status, 'sign_in_done'::m_process "
+    "FROM schedule ON CONFLICT(account, cur_date) "
+    "DO UPDATE SET status=EXCLUDED.status, process=EXCLUDED.process, "
+    "update_time=now() RETURNING status, process) "
+    "SELECT status.status, status.process, "
+    "previous.status, previous.process "
+    "FROM schedule JOIN status ON true LEFT JOIN previous ON true")
+
+register_statement(
+    "confirm_out_by_user",
+    "WITH schedule AS ("
+    "UPDATE bot_calendar_record SET end_time=$3, update_time=now() "
+    "WHERE account=$1 AND cur_date=$2 "
+    "RETURNING schedule_id, begin_time), "
+    "sync AS ("
+    "INSERT INTO bot_calendar_sync(account, cur_date, process, created) "
+    "SELECT $1, $2::date, 'sign_out_done'::m_process, true FROM schedule "
+    "ON CONFLICT(account, cur_date) DO UPDATE SET "
+    "process=EXCLUDED.process, state='pending', "
+    "version=bot_calendar_sync.version+1, attempts=0, "
+    "next_time=GREATEST(bot_calendar_sync.next_time, now()), "
+    "update_time=now()), "
+    "status AS ("
+    "UPDATE bot_process_status "
+    "SET status='out_done', process='sign_out_done', update_time=now() "
+    "WHERE account=$1 AND cur_date=$4 AND EXISTS(SELECT 1 FROM schedule) "
+    "RETURNING status, process) "
+    "SELECT schedule.schedule_id, schedule.begin_time, "
+    "status.status, status.process "
+    "FROM schedule LEFT JOIN status ON true")
+
+register_statement(
+    "enter_time_by_user",
+    "WITH current AS ("
+    "SELECT s.status, s.process, c.begin_time "
+    "FROM bot_process_status s LEFT JOIN bot_calendar_record c "
+    "ON c.account=s.account AND c.cur_date=s.cur_date "
+    "WHERE s.account=$1 AND s.cur_date=$2 FOR UPDATE OF s), "
+    "advanced AS ("
+    "UPDATE bot_process_status s SET update_time=now(), "
+    "status=CASE WHEN current.status='wait_in' THEN 'in_done'::m_status "
+    "ELSE 'out_done'::m_status END "
+    "FROM current WHERE s.account=$1 AND s.cur_date=$2 "
+    "AND (current.status='wait_in' OR (current.status='wait_out' "
+    "AND (current.process IS DISTINCT FROM 'sign_in_done' "
+    "OR current.begin_time<=$3))) "
+    "RETURNING s.status) "
+    "SELECT current.status, current.process, current.begin_time, "
+    "advanced.status FROM current LEFT JOIN advanced ON true")
+
+
+# bot_reminder_run, one row per reminder and day. A process takes the
+# reminder if the row is new, or if it is not done and its process has
+# not written it for $3 seconds; it then goes on after last_account.
+
+register_statement(
+    "claim_reminder",
+    "INSERT INTO bot_reminder_run(name, cur_date) VALUES($1, $2) "
+    "ON CONFLICT(name, cur_date) DO UPDATE SET update_time=now() "
+    "WHERE NOT bot_reminder_run.done AND bot_reminder_run.update_time<"
+    "now()-make_interval(secs=>$3::float8) "
+    "RETURNING last_account")
+
+register_statement(
+    "finish_reminder",
+    "UPDATE bot_reminder_run SET done=true, update_time=now() "
+    "WHERE name=$1 AND cur_date=$2 RETURNING sent")
+
+# The users of the bot are the accounts with a status in the $2 days
+# before $1, they are reminded to clock in if they have not on $1.
+# They are reminded to clock out if they clocked in on $1.
+# Only the accounts after the last parameter, in order.
+
+register_statement(
+    "missing_sign_in",
+    "SELECT DISTINCT a.account FROM bot_process_status a "
+    "WHERE a.cur_date>=$1::date-$2::integer AND a.cur_date<$1::date "
+    "AND a.account>$3 AND NOT EXISTS(SELECT 1 FROM bot_process_status t "
+    "WHERE t.account=a.account AND t.cur_date=$1::date "
+    "AND t.process IN ('sign_in_done', 'sign_out_done')) "
+    "ORDER BY a.account")
+
+register_statement(
+    "missing_sign_out",
+    "SELECT account FROM bot_process_status "
+    "WHERE cur_date=$1::date AND process='sign_in_done' "
+    "AND account>$2 ORDER BY account")
+
+register_statement(
+    "insert_init_status",
+    "INSERT INTO system_init_status(action, extra) VALUES($1, $2) "
+    "ON CONFLICT(action) DO UPDATE SET extra=EXCLUDED.extra, "
+    "update_time=now()")
+
+register_statement(
+    "update_init_status",
+    "UPDATE system_init_status SET update_time=now(), extra=$2 "
+    "WHERE action=$1")
+
+register_statement(
+    "get_init_status",
+    "SELECT extra FROM system_init_status WHERE action=$1")
+
+register_statement(
+    "delete_init_status",
+    "DELETE FROM system_init_status WHERE action=$1")
@@ -0,0 +1,271 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Delivery of the messages saved in bot_message_outbox.
+The worker of each process takes the accounts with pending messages,
+with up to OUTBOX_RUN messages each. The messages of an account are
+sent in order, one right after the other on the same keep-alive
+connection, and the sent ones are removed with one statement.
+Different accounts are sent concurrently, at most OUTBOX_RATE messages
+per second.
+A 429 answer pauses the sending and delays the message without counting
+the attempt. Other server errors and timeouts are retried with an
+exponential backoff, a refused message (4xx) is marked failed.
+Check also: attendance_management_bot/externals/send_message.py
+"""
+
+__all__ = ['Outbox', 'start_outbox', 'notify_outbox', 'stop_outbox',
+           'get_outbox_stats']
+
+import os
+import logging
+import datetime
+import collections
+import tornado.gen
+import tornado.ioloop
+import tornado.locks
+from attendance_management_bot.common.ratelimit import backoff_delay, \
+    TokenBucket
+from attendance_management_bot.model.asyncDBHandle import \
+    claim_messages, delete_messages, release_messages, retry_message
+from attendance_management_bot.settings import OUTBOX_RATE, OUTBOX_BURST, \
+    OUTBOX_BATCH, OUTBOX_RUN, OUTBOX_INTERVAL, OUTBOX_LEASE, OUTBOX_MAX_ATTEMPTS, \
+    OUTBOX_BACKOFF, OUTBOX_MAX_BACKOFF
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+
+def retry_after(response):
+    """
+    :return: seconds of the Retry-After header, None if there is none.
+    """
+    value = response.headers.get("Retry-After", None) \
+        if response.headers is not None else None
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class Outbox:
+    """
+    deliver(body) is a coroutine sending one request body and returning
+    the tornado.httpclient.HTTPResponse.
+    """
+
+    def __init__(self, deliver, rate=OUTBOX_RATE, burst=OUTBOX_BURST,
+                 batch=OUTBOX_BATCH, run=OUTBOX_RUN,
+                 interval=OUTBOX_INTERVAL):
+        self.__deliver = deliver
+        self.__bucket = TokenBucket(rate, burst)
+        self.__batch = batch
+        self.__run = run
+        self.__interval = interval
+        self.__wakeup = tornado.locks.Event()
+        self.__stopped = tornado.locks.Event()
+        self.__stopped.set()
+        self.__running = False
+        self.__sent = 0
+        self.__retried = 0
+        self.__limited = 0
+        self.__failed = 0
+
+    def start(self):
+        if self.__running:
+            return
+        self.__running = True
+        self.__stopped.clear()
+        tornado.ioloop.IOLoop.current().spawn_callback(self.__loop)
+
+    def notify(self):
+        """
+        Messages were added, take them without waiting for the next scan.
+        """
+        self.__wakeup.set()
+
+    def stop(self):
+        """
+        :return: Future, done when the messages being sent are handled.
+        """
+        self.__running = False
+        self.__wakeup.set()
+        return self.__stopped.wait()
+
+    @tornado.gen.coroutine
+    def __loop(self):
+        try:
+            while self.__running:
+                self.__wakeup.clear()
+                try:
+                    count = yield self.run_once()
+                except Exception:
+                    LOGGER.exception("outbox failed.")
+                    count = 0
+                # a sent message lets the next one of its account go
+                if count > 0:
+                    continue
+                try:
+                    yield self.__wakeup.wait(
+                        timeout=datetime.timedelta(seconds=self.__interval))
+                except tornado.gen.TimeoutError:
+                    pass
+        finally:
+            self.__stopped.set()
+
+    @tornado.gen.coroutine
+    def run_once(self):
+        """
+        Send the messages due now.
+
+        :return: the number of messages taken.
+        """
+        rows = yield claim_messages(self.__batch, OUTBOX_LEASE, self.__run)
+        runs = collections.OrderedDict()
+        # oldest first, RETURNING has no order
+        for row in sorted(rows):
+            runs.setdefault(row[1], []).append(row)
+        yield [self.__send_run(run) for run in runs.values()]
+        return len(rows)
+
+    @tornado.gen.coroutine
+    def __send_run(self, rows):
+        """
+        Send the messages of one account in order. The run stops at a
+        message to retry, the next ones wait for it.
+        """
+        sent = []
+        released = []
+        for index, row in enumerate(rows):
+            result = yield self.__send(*row)
+            if result == "sent":
+                sent.append(row[0])
+            elif result == "retried":
+                released = [message_id for message_id, *_ in rows[index + 1:]]
+                break
+
+        futures = []
+        if sent:
+            futures.append(delete_messages(sent))
+        if released:
+            futures.append(release_messages(released))
+        yield futures
+
+    @tornado.gen.coroutine
+    def __send(self, message_id, account_id, body, attempts):
+        """
+        :return: "sent", "retried" or "failed". A sent message is removed
+            by the caller.
+        """
+        yield self.__bucket.acquire()
+        try:
+            response = yield self.__deliver(body)
+            code = response.code
+            error = "http code %d %s" % (code, response.body)
+        except Exception as ex:
+            response = None
+            code = 599
+            error = str(ex)
+
+        if code == 200:
+            self.__sent += 1
+            return "sent"
+
+        if code == 429:
+            delay = retry_after(response)
+            if delay is None:
+                delay = backoff_delay(1, OUTBOX_BACKOFF, OUTBOX_MAX_BACKOFF)
+            self.__limited += 1
+            self.__bucket.pause(delay)
+            LOGGER.info("message rate limited, retried in %.0fs. "
+                        "account_id:%s", delay, account_id)
+            yield retry_message(message_id, delay, error, False)
+            return "retried"
+
+        if 400 <= code < 500 or attempts >= OUTBOX_MAX_ATTEMPTS:
+            self.__failed += 1
+            LOGGER.error("push message failed. account_id:%s attempts:%d %s",
+                         account_id, attempts, error)
+            yield retry_message(message_id, None, error)
+            return "failed"
+
+        delay = backoff_delay(attempts, OUTBOX_BACKOFF, OUTBOX_MAX_BACKOFF)
+        self.__retried += 1
+        LOGGER.info("push message retried in %.0fs. account_id:%s "
+                    "attempts:%d %s", delay, account_id, attempts, error)
+        yield retry_message(message_id, delay, error)
+        return "retried"
+
+    def stats(self):
+        return {
+            "running": self.__running,
+            "tokens": self.__bucket.tokens(),
+            "sent": self.__sent,
+            "retried": self.__retried,
+            "limited": self.__limited,
+            "failed": self.__failed,
+        }
+
+
+_outboxes = {}
+
+
+def start_outbox(deliver):
+    """
+    Start the outbox worker of this process, on the current IOLoop.
+
+    :param deliver: Check also: Outbox
+    """
+    pid = os.getpid()
+    if pid in _outboxes:
+        return
+    _outboxes.clear()
+    outbox = Outbox(deliver)
+    outbox.start()
+    _outboxes[pid] = outbox
+
+
+def notify_outbox():
+    """
+    Wake the worker of this process up, if it is started.
+    """
+    outbox = _outboxes.get(os.getpid(), None)
+    if outbox is not None:
+        outbox.notify()
+
+
+@tornado.gen.coroutine
+def stop_outbox():
+    """
+    Stop the worker of this process. The messages not sent yet stay
+    in bot_message_outbox for the next start.
+    """
+    outbox = _outboxes.get(os.getpid(), None)
+    if outbox is None:
+        return
+    yield outbox.stop()
+
+
+def get_outbox_stats():
+    """
+    :return: Outbox.stats of this process, None if not started.
+    """
+    outbox = _outboxes.get(os.getpid(), None)
+    if outbox is None:
+        return None
+    return outbox.stats()
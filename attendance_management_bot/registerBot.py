@@ -30,7 +30,7 @@ import datetime
 sys.path.append('./')
 from attendance_management_bot.model.i18n_data import get_i18n_content
 from attendance_management_bot.constant import PRIVATE_KEY_PATH, \
-    DEVELOP_API_DOMAIN, API_BO
+    DEVELOP_API_ROOT, API_BO
 from attendance_management_bot.model.initStatusDBHandle \
     import insert_init_status, get_init_status
 from conf.config import API_ID, DOMAIN_ID, ADMIN_ACCOUNT, LOCAL_ADDRESS, \
@@ -74,7 +74,7 @@ def register_bot(photo_address):
     :return: bot no
     """
 
-    url = "https://" + DEVELOP_API_DOMAIN + "/r/" + API_ID + "/message/v1/bot"
+    url = DEVELOP_API_ROOT + "/r/" + API_ID + "/message/v1/bot"
     fmt = _("Attendance management bot")
     a = lambda x, y: {"language": x, "name": y}
     b = lambda x, y: {"language": x, "description": y}
@@ -112,7 +112,7 @@ def register_bot_domain(bot_no):
 
     :param bot_no: bot no
     """
-    url = "https://" + DEVELOP_API_DOMAIN + "/r/" + API_ID + "/message/v1/bot/" \
+    url = DEVELOP_API_ROOT + "/r/" + API_ID + "/message/v1/bot/" \
           + str(bot_no) + "/domain/" + str(DOMAIN_ID)
     data = {"usePublic": True, "usePermission": False}
     r = requests.post(url, data=json.dumps(data), headers=headers())
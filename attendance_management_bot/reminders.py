@@ -0,0 +1,215 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Reminders of the users who have not clocked in, or not clocked out,
+at the local times of REMINDER_SIGN_IN_TIMES and REMINDER_SIGN_OUT_TIMES.
+The worker of each process looks for the due reminders every
+REMINDER_INTERVAL seconds, and one process takes each of them in
+bot_reminder_run. The accounts are selected with one query, then added
+to the outbox REMINDER_BATCH at a time, behind the answers to the users.
+The outbox sends them at its rate.
+Check also: attendance_management_bot/outbox.py
+"""
+
+__all__ = ['Reminders', 'due_reminders', 'start_reminders',
+           'stop_reminders', 'get_reminders_stats']
+
+import os
+import logging
+import datetime
+import tornado.gen
+import tornado.ioloop
+import tornado.locks
+from attendance_management_bot.common.local_timezone import local_date_time
+from attendance_management_bot.actions.message import reminder_message
+from attendance_management_bot.externals.send_message import \
+    make_request_body
+from attendance_management_bot.outbox import notify_outbox
+from attendance_management_bot.model.asyncDBHandle import \
+    claim_reminder, finish_reminder, get_reminder_accounts, \
+    enqueue_reminders
+from attendance_management_bot.settings import REMINDER_SIGN_IN_TIMES, \
+    REMINDER_SIGN_OUT_TIMES, REMINDER_WEEKDAYS, REMINDER_ACTIVE_DAYS, \
+    REMINDER_GRACE, REMINDER_INTERVAL, REMINDER_BATCH, REMINDER_LEASE
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+
+def due_reminders(now):
+    """
+    :param now: local date time.
+    :return: list of (name, process) of the reminders whose time is
+        less than REMINDER_GRACE seconds before now. process is None for
+        the clock-in reminders, sign_in_done for the clock-out ones.
+    """
+    if now.weekday() not in REMINDER_WEEKDAYS:
+        return []
+
+    due = []
+    for kind, process, times in (
+            ("sign_in", None, REMINDER_SIGN_IN_TIMES),
+            ("sign_out", "sign_in_done", REMINDER_SIGN_OUT_TIMES)):
+        for value in times:
+            hour, minute = value.split(":")
+            at = now.replace(hour=int(hour), minute=int(minute),
+                             second=0, microsecond=0)
+            if at <= now < at + datetime.timedelta(seconds=REMINDER_GRACE):
+                due.append(("%s %s" % (kind, value), process))
+    return due
+
+
+class Reminders:
+    """
+    Sends the due reminders, `batch` accounts at a time.
+    """
+
+    def __init__(self, interval=REMINDER_INTERVAL, batch=REMINDER_BATCH):
+        self.__interval = interval
+        self.__batch = batch
+        self.__wakeup = tornado.locks.Event()
+        self.__stopped = tornado.locks.Event()
+        self.__stopped.set()
+        self.__running = False
+        self.__stopping = False
+        self.__runs = 0
+        self.__reminded = 0
+
+    def start(self):
+        if self.__running:
+            return
+        self.__running = True
+        self.__stopping = False
+        self.__stopped.clear()
+        tornado.ioloop.IOLoop.current().spawn_callback(self.__loop)
+
+    def stop(self):
+        """
+        :return: Future, done after the current batch. The rest of
+            the reminder is sent later, by this process or another one.
+        """
+        self.__running = False
+        self.__stopping = True
+        self.__wakeup.set()
+        return self.__stopped.wait()
+
+    @tornado.gen.coroutine
+    def __loop(self):
+        try:
+            while self.__running:
+                try:
+                    yield self.run_once()
+                except Exception:
+                    LOGGER.exception("reminders failed.")
+                try:
+                    yield self.__wakeup.wait(
+                        timeout=datetime.timedelta(seconds=self.__interval))
+                except tornado.gen.TimeoutError:
+                    pass
+        finally:
+            self.__stopped.set()
+
+    @tornado.gen.coroutine
+    def run_once(self, now=None):
+        """
+        Send the reminders due now that no process has taken yet.
+
+        :param now: local date time, default the current one.
+        :return: the number of accounts reminded.
+        """
+        if now is None:
+            now = local_date_time()
+        count = 0
+        for name, process in due_reminders(now):
+            reminded = yield self.__remind(name, process, now.date())
+            count += reminded
+        return count
+
+    @tornado.gen.coroutine
+    def __remind(self, name, process, date):
+        after = yield claim_reminder(name, date, REMINDER_LEASE)
+        if after is None:
+            return 0
+
+        accounts = yield get_reminder_accounts(process, date,
+                                               REMINDER_ACTIVE_DAYS, after)
+        content = reminder_message(process)
+        count = 0
+        for index in range(0, len(accounts), self.__batch):
+            if self.__stopping:
+                return count
+            batch = accounts[index:index + self.__batch]
+            yield enqueue_reminders(name, date, batch,
+                                    [make_request_body(account, content)
+                                     for account in batch])
+            notify_outbox()
+            count += len(batch)
+            self.__reminded += len(batch)
+
+        self.__runs += 1
+        sent = yield finish_reminder(name, date)
+        LOGGER.info("reminder %s of %s sent to %d accounts.",
+                    name, date, sent)
+        return count
+
+    def stats(self):
+        return {
+            "running": self.__running,
+            "runs": self.__runs,
+            "reminded": self.__reminded,
+        }
+
+
+_reminders = {}
+
+
+def start_reminders():
+    """
+    Start the reminders of this process, on the current IOLoop.
+    Nothing is started without reminder times.
+    """
+    if not REMINDER_SIGN_IN_TIMES and not REMINDER_SIGN_OUT_TIMES:
+        return
+    pid = os.getpid()
+    if pid in _reminders:
+        return
+    _reminders.clear()
+    reminders = Reminders()
+    reminders.start()
+    _reminders[pid] = reminders
+
+
+@tornado.gen.coroutine
+def stop_reminders():
+    """
+    Stop the reminders of this process.
+    """
+    reminders = _reminders.get(os.getpid(), None)
+    if reminders is None:
+        return
+    yield reminders.stop()
+
+
+def get_reminders_stats():
+    """
+    :return: Reminders.stats of this process, None if not started.
+    """
+    reminders = _reminders.get(os.getpid(), None)
+    if reminders is None:
+        return None
+    return reminders.stats()
@@ -0,0 +1,181 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Worked time of the accounts, summed by the database
+
+    GET /reports?period=month&from=2019-11-01&to=2019-11-30
+        &limit=1000&after=<next of the previous page>&account=<account>
+
+The answer is written while the accounts are read, REPORT_FETCH_SIZE
+at a time, so a month of thousands of accounts is never held in memory.
+
+    {"period": "month", "from": "2019-11-01", "to": "2019-11-30",
+     "reports": [{"account": "user@example.com", "period": "2019-11-01",
+                  "days": 20, "open_days": 0, "worked_seconds": 576000,
+                  "worked_hours": 160.0}, ...],
+     "next": "user@example.com"}
+
+next is null once the last account is written. An error after the
+first accounts are sent closes the connection, so that a client never
+takes a cut answer for a complete one.
+"""
+
+__all__ = ['ReportsHandler', 'parse_date', 'check_token', 'date_range']
+
+import hmac
+import json
+import logging
+import datetime
+import tornado.gen
+import tornado.web
+from tornado.web import HTTPError
+from attendance_management_bot.common.local_timezone import local_date_time
+from attendance_management_bot.model.asyncDBHandle import report_worked_time
+from attendance_management_bot.settings import REPORTS_TOKEN, \
+    REPORT_PAGE_SIZE, REPORT_MAX_PAGE_SIZE, REPORT_FETCH_SIZE, \
+    REPORT_MAX_DAYS
+
+LOGGER = logging.getLogger("attendance_management_bot")
+
+PERIODS = ("day", "week", "month")
+
+
+def parse_date(value, name):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPError(400, "'%s' is not a date like 2019-11-13." % (name,))
+
+
+def check_token(request):
+    """
+    Raise 403 unless the request has the REPORTS_TOKEN bearer token.
+    """
+    if REPORTS_TOKEN is None:
+        raise HTTPError(403, "reports are disabled.")
+    authorization = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(authorization.encode(),
+                               ("Bearer " + REPORTS_TOKEN).encode()):
+        raise HTTPError(403, "invalid token.")
+
+
+def date_range(handler):
+    """
+    :param handler: RequestHandler with the from and to arguments,
+        from the first day of the current month to today by default.
+    :return: (first date, last date)
+    """
+    today = local_date_time().date()
+    begin = handler.get_argument("from", None)
+    begin = today.replace(day=1) if begin is None \
+        else parse_date(begin, "from")
+    end = handler.get_argument("to", None)
+    end = today if end is None else parse_date(end, "to")
+    if end < begin:
+        raise HTTPError(400, "'to' is before 'from'.")
+    if (end - begin).days >= REPORT_MAX_DAYS:
+        raise HTTPError(400, "at most %d days." % (REPORT_MAX_DAYS,))
+    return begin, end
+
+
+class ReportsHandler(tornado.web.RequestHandler):
+    """
+    Worked time by account and period, for the clients with REPORTS_TOKEN.
+    """
+
+    def prepare(self):
+        check_token(self.request)
+
+    def parse_arguments(self):
+        """
+        :return: (period, first date, last date, account, after, limit)
+        """
+        period = self.get_argument("period", "month")
+        if period not in PERIODS:
+            raise HTTPError(400, "'period' is one of %s." % (
+                ", ".join(PERIODS),))
+
+        begin, end = date_range(self)
+
+        try:
+            limit = int(self.get_argument("limit", REPORT_PAGE_SIZE))
+        except ValueError:
+            raise HTTPError(400, "'limit' is not a number.")
+        if limit < 1 or limit > REPORT_MAX_PAGE_SIZE:
+            raise HTTPError(400, "'limit' is between 1 and %d." % (
+                REPORT_MAX_PAGE_SIZE,))
+
+        account = self.get_argument("account", None)
+        after = self.get_argument("after", "")
+        return period, begin, end, account, after, limit
+
+    @tornado.gen.coroutine
+    def get(self):
+        period, begin, end, account, after, limit = self.parse_arguments()
+
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        self.write('{"period": %s, "from": %s, "to": %s, "reports": [' % (
+            json.dumps(period), json.dumps(str(begin)), json.dumps(str(end))))
+
+        separator = ""
+        remaining = limit
+        more = True
+        flushed = False
+        try:
+            while remaining > 0 and more:
+                # one more account tells whether there is a next page.
+                size = min(REPORT_FETCH_SIZE, remaining)
+                rows = yield report_worked_time(period, begin, end, after,
+                                                size + 1, account)
+                accounts = 0
+                more = False
+                chunk = []
+                for account_id, start, days, open_days, seconds in rows:
+                    seconds = int(seconds)
+                    if account_id != after:
+                        if accounts == size:
+                            more = True
+                            break
+                        accounts += 1
+                        after = account_id
+                    chunk.append(separator + json.dumps({
+                        "account": account_id,
+                        "period": str(start),
+                        "days": days,
+                        "open_days": open_days,
+                        "worked_seconds": seconds,
+                        "worked_hours": round(seconds / 3600, 2),
+                    }, ensure_ascii=False))
+                    separator = ", "
+                if chunk:
+                    self.write("".join(chunk))
+                    yield self.flush()
+                    flushed = True
+                remaining -= accounts
+        except Exception:
+            if not flushed:
+                raise
+            # the status is sent already, a closed connection tells the
+            # client the answer is not complete.
+            LOGGER.exception("report stopped after %s.", after)
+            self.request.connection.close()
+            return
+
+        next_account = after if more else None
+        self.finish("], \"next\": %s}" % (json.dumps(next_account),))
@@ -24,6 +24,9 @@ __all__ = ['getRouter']
 
 import tornado.web
 from attendance_management_bot.callbackHandler import CallbackHandler
+from attendance_management_bot.metricsHandler import MetricsHandler
+from attendance_management_bot.reportsHandler import ReportsHandler
+from attendance_management_bot.exportHandler import ExportHandler
 from attendance_management_bot.constant import FILE_SYSTEM
 
 
@@ -43,6 +46,9 @@ def getRouter():
 
     return tornado.web.Application([
         (r"/callback", CallbackHandler),
+        (r"/metrics", MetricsHandler),
+        (r"/reports", ReportsHandler),
+        (r"/export", ExportHandler),
         (r'/static/([a-zA-Z0-9\&%_\./-~-]*.([p|P][n|N][g|G]))',
             tornado.web.StaticFileHandler, 
             {"path": FILE_SYSTEM["image_dir"]}),
@@ -32,3 +32,193 @@ CALENDAR_LOG_LEVEL = "DEBUG"
 
 CALENDAR_PORT = 8080
 CALENDAR_PID_FILE = LOG_PATH + "attendance_management_bot.pid"
+
+# Monthly partitions by cur_date of bot_calendar_record and
+# bot_process_status. Check also: attendance_management_bot/initDB.py
+# True: the tables created by initDB are partitioned. This needs
+# PostgreSQL 12 or later, for the foreign key of bot_calendar_sync to
+# the partitioned bot_calendar_record. False keeps single tables.
+PARTITION_TABLES = False
+# months created ahead of the current one.
+PARTITION_MONTHS_AHEAD = 3
+# months of bot_process_status kept before the current one, None keeps
+# all. The older partitions are removed by init_db and
+# scripts/partitions.py.
+PROCESS_STATUS_RETENTION_MONTHS = None
+# "detach" the older partitions to archive them apart, or "drop" them.
+PROCESS_STATUS_RETENTION = "detach"
+
+# Database connection pool, one per worker process. Each process of
+# --workers opens up to DB_POOL_MAX_SIZE + DB_ASYNC_POOL_MAX_SIZE
+# connections, keep the total under max_connections of PostgreSQL.
+# Check also: attendance_management_bot/model/postgreSqlPool.py
+DB_POOL_MIN_SIZE = 1
+DB_POOL_MAX_SIZE = 20
+# seconds to wait for a free connection before giving up.
+DB_POOL_TIMEOUT = 10
+# seconds a connection may sit idle in the pool before it is closed.
+DB_POOL_IDLE_TIMEOUT = 300
+# seconds after which a connection is replaced, whatever its usage.
+DB_POOL_MAX_LIFETIME = 3600
+# connections idle longer than this (seconds) are pinged before use.
+# 0 pings on every checkout, None disables the ping.
+DB_POOL_PRE_PING = 30
+
+# asyncio connection pool used by the request handlers, one per worker
+# process. Timeout and lifetime are shared with the pool above.
+# Check also: attendance_management_bot/model/asyncPostGreSqlPool.py
+DB_ASYNC_POOL_MIN_SIZE = 1
+DB_ASYNC_POOL_MAX_SIZE = 20
+
+# Outbound HTTP client for the LINE WORKS APIs, one per worker process.
+# Connections are kept alive and reused when pycurl is installed.
+# Check also: attendance_management_bot/common/utils.py
+# requests in flight at the same time, more are queued.
+HTTP_MAX_CLIENTS = 20
+# seconds
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_REQUEST_TIMEOUT = 20
+
+# Server token of the LINE WORKS APIs, one per worker process.
+# Check also: attendance_management_bot/common/token.py
+# seconds before expiry at which the token is refreshed.
+TOKEN_REFRESH_MARGIN = 600
+# seconds between attempts after a failed refresh.
+TOKEN_RETRY_INTERVAL = 30
+# seconds, used when the auth server does not return expires_in.
+TOKEN_DEFAULT_LIFETIME = 86400
+
+# Answer the callback requests before handling them.
+# The checked callbacks are queued and handled by CALLBACK_CONSUMERS
+# coroutines. When the queue is full the callback is refused with 503.
+# Check also: attendance_management_bot/callback_queue.py
+CALLBACK_ACK_FIRST = False
+CALLBACK_QUEUE_SIZE = 1000
+CALLBACK_CONSUMERS = 10
+# seconds to wait for the queued callbacks at shutdown.
+CALLBACK_DRAIN_TIMEOUT = 10
+
+# The callbacks retried by the server are answered from the outcome of the
+# first one, kept in memory and in bot_callback_dedup.
+# Check also: attendance_management_bot/callback_dedup.py
+CALLBACK_DEDUP = True
+# callbacks kept in memory by each process.
+CALLBACK_DEDUP_SIZE = 10000
+# seconds a callback is remembered.
+CALLBACK_DEDUP_TTL = 86400
+# seconds after which a callback still handled is handled again,
+# e.g. its process died.
+CALLBACK_DEDUP_LEASE = 300
+# seconds between two removals of the expired callbacks.
+CALLBACK_DEDUP_CLEANUP = 600
+
+# The calendar schedules are written behind the check-in and check-out.
+# The bot answers once the times are saved, then a worker of each process
+# creates or updates the calendar events queued in bot_calendar_sync.
+# Check also: attendance_management_bot/calendar_sync.py
+CALENDAR_SYNC_BATCH = 20
+# seconds between two scans of the queue, for the retries.
+CALENDAR_SYNC_INTERVAL = 5
+# seconds a taken schedule is hidden from the other workers.
+CALENDAR_SYNC_LEASE = 120
+# a schedule is marked failed after CALENDAR_SYNC_MAX_ATTEMPTS attempts.
+CALENDAR_SYNC_MAX_ATTEMPTS = 10
+# seconds before the first retry, doubled at each attempt.
+CALENDAR_SYNC_BACKOFF = 5
+CALENDAR_SYNC_MAX_BACKOFF = 3600
+
+# User names of the schedule titles.
+# Check also: attendance_management_bot/common/contacts.py
+# names kept in memory by each process.
+CONTACT_CACHE_SIZE = 10000
+# seconds a name is used without asking the contacts API.
+CONTACT_CACHE_TTL = 86400
+# seconds an older name is still used while it is refreshed.
+CONTACT_CACHE_STALE = 604800
+# seconds an unknown account is remembered.
+CONTACT_CACHE_NEGATIVE_TTL = 600
+
+# The messages to the users are saved in bot_message_outbox, then sent by
+# a worker of each process, in order for each account.
+# Check also: attendance_management_bot/outbox.py
+MESSAGE_OUTBOX = True
+# messages per second and burst of each process. Set them so that
+# OUTBOX_RATE times the number of processes of --workers fits the quota
+# of the bot API. The reminders are sent through it, the calendar sync
+# workers of CALENDAR_SYNC_BATCH run in each process as well.
+OUTBOX_RATE = 20
+OUTBOX_BURST = 40
+# accounts taken at a time, and messages of an account sent one after
+# the other on the same connection.
+OUTBOX_BATCH = 50
+OUTBOX_RUN = 10
+# seconds between two scans of the outbox, for the retries.
+OUTBOX_INTERVAL = 2
+# seconds a taken message is hidden from the other workers.
+OUTBOX_LEASE = 60
+# a message is marked failed after OUTBOX_MAX_ATTEMPTS attempts.
+# Rate limited attempts (429) are not counted.
+OUTBOX_MAX_ATTEMPTS = 8
+# seconds before the first retry, doubled at each attempt.
+OUTBOX_BACKOFF = 1
+OUTBOX_MAX_BACKOFF = 300
+
+# Latency histograms and counters of each process, served on /metrics.
+# Check also: attendance_management_bot/metrics.py
+# upper bounds of the histogram buckets, in seconds.
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# seconds between two measures of the IOLoop lag.
+LOOP_LAG_INTERVAL = 0.5
+# clients allowed to read /metrics, the others get 403.
+METRICS_ALLOWED_NETWORKS = ["127.0.0.0/8", "::1/128", "10.0.0.0/8",
+                            "172.16.0.0/12", "192.168.0.0/16"]
+
+# Reminders of the users who have not clocked in or out yet,
+# added to the outbox behind the answers to the users.
+# Check also: attendance_management_bot/reminders.py
+# local times "HH:MM" of the reminders, none are sent by default.
+REMINDER_SIGN_IN_TIMES = []
+REMINDER_SIGN_OUT_TIMES = []
+# days of the reminders, Monday is 0.
+REMINDER_WEEKDAYS = (0, 1, 2, 3, 4)
+# the users of the bot are the accounts with a status in these last days.
+REMINDER_ACTIVE_DAYS = 14
+# a reminder is still sent this many seconds after its time,
+# e.g. when the bot was restarted then.
+REMINDER_GRACE = 1800
+# seconds between two checks of the reminder times.
+REMINDER_INTERVAL = 30
+# accounts added to the outbox with one statement.
+REMINDER_BATCH = 500
+# seconds without progress before another process finishes a reminder.
+REMINDER_LEASE = 300
+
+# Close-out of the days the users did not clock out, every night.
+# Check also: attendance_management_bot/close_out.py
+# "end_time" clocks them out at CLOSE_OUT_END_TIME, local time of their
+# day, "review" only flags them in bot_calendar_record.close_out.
+CLOSE_OUT_POLICY = "end_time"
+CLOSE_OUT_END_TIME = "18:00"
+# days closed with one statement.
+CLOSE_OUT_BATCH = 1000
+
+# Worked time reports on /reports, for the HR tools.
+# Check also: attendance_management_bot/reportsHandler.py
+# the clients send "Authorization: Bearer <REPORTS_TOKEN>",
+# None disables the reports.
+REPORTS_TOKEN = None
+# accounts of a response, unless the request asks for less.
+REPORT_PAGE_SIZE = 1000
+REPORT_MAX_PAGE_SIZE = 10000
+# accounts read from the database at a time, then written out.
+REPORT_FETCH_SIZE = 200
+# longest date range of a request, in days.
+REPORT_MAX_DAYS = 366
+
+# Export of the attendance records, on /export with the REPORTS_TOKEN
+# and with scripts/export.py.
+# Check also: attendance_management_bot/export.py
+# rows read from the database at a time.
+EXPORT_FETCH_SIZE = 2000
+# rows of a Parquet row group, held in memory while it is written.
+EXPORT_ROW_GROUP_SIZE = 50000
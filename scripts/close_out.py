@@ -0,0 +1,49 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+"""
+Close the days the users clocked in and never clocked out, every
+night from cron. Check also: scripts/calendercron.conf
+
+    python scripts/close_out.py
+    python scripts/close_out.py --date=2019-11-14 --policy=review
+"""
+
+import sys
+sys.path.append('./')
+import datetime
+from tornado.options import define, options
+from attendance_management_bot.close_out import close_out
+
+define("date", default=None,
+       help="close the days before this one, YYYY-MM-DD. default today")
+define("policy", default=None,
+       help="end_time or review. default CLOSE_OUT_POLICY")
+
+
+def main():
+    options.parse_command_line()
+    date = None
+    if options.date is not None:
+        date = datetime.datetime.strptime(options.date, "%Y-%m-%d").date()
+    print("%d days closed" % (close_out(date, options.policy),))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+"""
+Export the attendance records of a date range, CSV by default.
+
+    python scripts/export.py --month=2019-11 > attendance_2019-11.csv
+    python scripts/export.py --begin=2019-11-01 --end=2019-11-15 \
+        --format=parquet --output=attendance.parquet
+
+Check also: attendance_management_bot/export.py
+"""
+
+import sys
+sys.path.append('./')
+import datetime
+from tornado.options import define, options
+from attendance_management_bot.export import copy_csv, write_parquet
+
+define("month", default=None, help="YYYY-MM, instead of begin and end")
+define("begin", default=None, help="first date, YYYY-MM-DD")
+define("end", default=None, help="last date, YYYY-MM-DD")
+define("format", default="csv", help="csv or parquet. default csv")
+define("output", default=None, help="file path, default the standard output")
+
+
+def date_range():
+    if options.month is not None:
+        begin = datetime.datetime.strptime(options.month, "%Y-%m").date()
+        following = (begin + datetime.timedelta(days=31)).replace(day=1)
+        return begin, following - datetime.timedelta(days=1)
+    if options.begin is None or options.end is None:
+        raise ValueError("give --month, or --begin and --end")
+    return datetime.datetime.strptime(options.begin, "%Y-%m-%d").date(), \
+        datetime.datetime.strptime(options.end, "%Y-%m-%d").date()
+
+
+def main():
+    options.parse_command_line()
+    begin, end = date_range()
+
+    if options.format == "parquet":
+        if options.output is None:
+            write_parquet(begin, end, sys.stdout.buffer)
+        else:
+            write_parquet(begin, end, options.output)
+    elif options.format == "csv":
+        if options.output is None:
+            copy_csv(begin, end, sys.stdout)
+        else:
+            with open(options.output, "w", encoding="utf-8",
+                      newline="") as output:
+                copy_csv(begin, end, output)
+    else:
+        raise ValueError("unknown format %s" % (options.format,))
+
+
+if __name__ == "__main__":
+    main()
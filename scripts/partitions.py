@@ -0,0 +1,50 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+"""
+Create the partitions of the next months and remove the old ones of
+bot_process_status, every day from cron. Check also: scripts/calendercron.conf
+
+    python scripts/partitions.py
+
+--migrate first moves the rows of the tables created before
+PARTITION_TABLES into partitioned tables. Stop the bot meanwhile.
+"""
+
+import sys
+sys.path.append('./')
+from tornado.options import define, options
+from attendance_management_bot.initDB import partition_tables, \
+    maintain_partitions
+
+define("migrate", default=False, type=bool,
+       help="partition the existing single tables first")
+
+
+def main():
+    options.parse_command_line()
+    if options.migrate:
+        for table in partition_tables():
+            print("%s partitioned" % (table,))
+    for name in maintain_partitions():
+        print("%s removed" % (name,))
+
+
+if __name__ == "__main__":
+    main()
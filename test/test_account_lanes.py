@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+test the per-account lanes.
+"""
+
+import tornado.gen
+import tornado.ioloop
+from attendance_management_bot.account_lanes import AccountLanes
+
+
+def test_lanes():
+    lanes = AccountLanes()
+    events = []
+
+    @tornado.gen.coroutine
+    def handle(account_id, number, delay):
+        events.append(("begin", account_id, number))
+        yield tornado.gen.sleep(delay)
+        events.append(("end", account_id, number))
+        return number
+
+    @tornado.gen.coroutine
+    def scenario():
+        futures = [lanes.run("a", handle, "a", 1, 0.03),
+                   lanes.run("a", handle, "a", 2, 0.01),
+                   lanes.run("b", handle, "b", 1, 0.01),
+                   lanes.run("a", handle, "a", 3, 0)]
+        assert lanes.stats() == {"lanes": 2, "waiting": 2}
+        results = yield futures
+        assert results == [1, 2, 1, 3]
+
+    tornado.ioloop.IOLoop.current().run_sync(scenario)
+
+    account_a = [event for event in events if event[1] == "a"]
+    assert account_a == [("begin", "a", 1), ("end", "a", 1),
+                         ("begin", "a", 2), ("end", "a", 2),
+                         ("begin", "a", 3), ("end", "a", 3)]
+    # b did not wait for a
+    assert events.index(("end", "b", 1)) < events.index(("end", "a", 1))
+    assert lanes.stats() == {"lanes": 0, "waiting": 0}
+
+
+def test_lane_released_on_error():
+    lanes = AccountLanes()
+
+    @tornado.gen.coroutine
+    def fail():
+        raise ValueError()
+
+    @tornado.gen.coroutine
+    def succeed():
+        return 1
+
+    @tornado.gen.coroutine
+    def scenario():
+        try:
+            yield lanes.run("a", fail)
+        except ValueError:
+            pass
+        result = yield lanes.run("a", succeed)
+        assert result == 1
+
+    tornado.ioloop.IOLoop.current().run_sync(scenario)
+    assert lanes.stats() == {"lanes": 0, "waiting": 0}
@@ -0,0 +1,788 @@
+# -*- coding: utf-8 -*-
+"""
+test the asyncio data access layer against a local Postgres.
+
+Set ATTENDANCE_TEST_DSN to a libpq connection string, like
+"host=127.0.0.1 dbname=postgres user=postgres", to run these tests.
+The tables are created with initDB if they do not exist.
+"""
+
+import os
+import asyncio
+import pytest
+
+DSN = os.environ.get("ATTENDANCE_TEST_DSN")
+pytestmark = pytest.mark.skipif(DSN is None,
+                                reason="ATTENDANCE_TEST_DSN is not set")
+
+
+@pytest.fixture
+def db():
+    from psycopg2.extensions import parse_dsn
+    from attendance_management_bot.constant import DB_CONFIG
+    from attendance_management_bot.initDB import init_db
+    from attendance_management_bot.model import asyncPostGreSqlPool
+
+    saved = dict(DB_CONFIG)
+    DB_CONFIG.clear()
+    DB_CONFIG.update(parse_dsn(DSN))
+    init_db()
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(asyncPostGreSqlPool.init_pool())
+    yield loop
+    loop.run_until_complete(asyncPostGreSqlPool.close_pool())
+    DB_CONFIG.clear()
+    DB_CONFIG.update(saved)
+
+
+def test_status(db):
+    from attendance_management_bot.model.asyncDBHandle import \
+        insert_replace_status_by_user_date, set_status_by_user_date, \
+        get_status_by_user, delete_status_by_user_date, clean_status_by_user
+
+    account = "test_status@example.com"
+    date = "2019-11-13"
+
+    async def scenario():
+        await clean_status_by_user(account, date)
+        assert await get_status_by_user(account, date) is None
+
+        await insert_replace_status_by_user_date(account, date, "wait_in")
+        assert await get_status_by_user(account, date) == ("wait_in", None)
+
+        await set_status_by_user_date(account, date, status="in_done",
+                                      process="sign_in_done")
+        assert await get_status_by_user(account, date) == \
+            ("in_done", "sign_in_done")
+
+        await delete_status_by_user_date(account, date)
+        assert await get_status_by_user(account, date) == \
+            (None, "sign_in_done")
+
+        await clean_status_by_user(account, date)
+
+    db.run_until_complete(scenario())
+
+
+def test_schedule(db):
+    from attendance_management_bot.model.asyncDBHandle import \
+        set_schedule_by_user, get_schedule_by_user, \
+        modify_schedule_by_user, clean_schedule_by_user
+
+    account = "test_schedule@example.com"
+    date = "2019-11-13"
+
+    async def scenario():
+        await clean_schedule_by_user(account, date)
+        await set_schedule_by_user("test-uid", account, date,
+                                   1573631535, 1573631595)
+        assert await get_schedule_by_user(account, date) == \
+            ("test-uid", 1573631535)
+
+        await modify_schedule_by_user("test-uid", 1573643535)
+        await clean_schedule_by_user(account, date)
+        assert await get_schedule_by_user(account, date) is None
+
+    db.run_until_complete(scenario())
+
+
+def test_init_status(db):
+    from attendance_management_bot.model.asyncDBHandle import \
+        insert_init_status, update_init_status, get_init_status, \
+        delete_init_status
+
+    action = "test_init_status"
+
+    async def scenario():
+        await delete_init_status(action)
+        assert await get_init_status(action) is None
+
+        await insert_init_status(action, "created")
+        assert await get_init_status(action) == "created"
+        await insert_init_status(action, "replaced")
+        await update_init_status(action, "updated")
+        assert await get_init_status(action) == "updated"
+
+        await delete_init_status(action)
+        assert await get_init_status(action) is None
+
+    db.run_until_complete(scenario())
+
+
+def test_transitions(db):
+    from attendance_management_bot.model.asyncDBHandle import \
+        insert_replace_status_by_user_date, set_status_by_user_date, \
+        get_status_by_user, clean_status_by_user, get_schedule_by_user, \
+        clean_schedule_by_user, confirm_in_by_user, confirm_out_by_user, \
+        enter_time_by_user
+
+    account = "test_transitions@example.com"
+    date = "2019-11-13"
+    schedule_id = "test_transitions_schedule"
+
+    async def scenario():
+        await clean_status_by_user(account, date)
+        await clean_schedule_by_user(account, date)
+
+        await insert_replace_status_by_user_date(account, date, "wait_in")
+        assert await enter_time_by_user(account, date, 100) == \
+            ("wait_in", None, None, "in_done")
+
+        assert await confirm_in_by_user(schedule_id, account, date,
+                                        100, 160, date) == \
+            ("in_done", "sign_in_done", "in_done", None)
+        assert await confirm_in_by_user("other", account, date,
+                                        100, 160, date) is None
+        assert await get_schedule_by_user(account, date) == \
+            (schedule_id, 100)
+        assert await get_status_by_user(account, date) == \
+            ("in_done", "sign_in_done")
+
+        await set_status_by_user_date(account, date, status="wait_out")
+        assert await enter_time_by_user(account, date, 50) == \
+            ("wait_out", "sign_in_done", 100, None)
+        assert await enter_time_by_user(account, date, 500) == \
+            ("wait_out", "sign_in_done", 100, "out_done")
+
+        assert await confirm_out_by_user(account, date, 900, date) == \
+            (schedule_id, 100, "out_done", "sign_out_done")
+        assert await confirm_out_by_user(account, "2019-11-14",
+                                         900, date) is None
+
+        await clean_status_by_user(account, date)
+        await clean_schedule_by_user(account, date)
+        assert await enter_time_by_user(account, date, 100) is None
+
+    db.run_until_complete(scenario())
+
+
+def test_calendar_sync(db, monkeypatch):
+    import tornado.gen
+    from attendance_management_bot import calendar_sync
+    from attendance_management_bot.model.asyncPostGreSqlPool \
+        import AsyncPostGreSql
+    from attendance_management_bot.model.asyncDBHandle import \
+        clean_status_by_user, clean_schedule_by_user, confirm_in_by_user, \
+        confirm_out_by_user
+
+    monkeypatch.setattr(calendar_sync, "CALENDAR_SYNC_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(calendar_sync, "CALENDAR_SYNC_BACKOFF", 0)
+
+    account = "test_calendar_sync@example.com"
+    date = "2019-11-13"
+    schedule_id = "test_calendar_sync_schedule"
+    calls = []
+    errors = []
+
+    @tornado.gen.coroutine
+    def sync(*args):
+        calls.append(args)
+        if errors:
+            raise errors.pop(0)
+        if len(calls) == 2:
+            # checked out while the calendar request is running
+            yield confirm_out_by_user(account, date, 900, date)
+
+    async def state():
+        async with AsyncPostGreSql() as cursor:
+            await cursor.execute("SELECT state, process, created, attempts "
+                                 "FROM bot_calendar_sync "
+                                 "WHERE account=%s", (account,))
+            return await cursor.fetchone()
+
+    worker = calendar_sync.CalendarSync(sync)
+
+    async def scenario():
+        await clean_status_by_user(account, date)
+        await clean_schedule_by_user(account, date)
+
+        await confirm_in_by_user(schedule_id, account, date, 100, 160, date)
+        assert await state() == ("pending", "sign_in_done", False, 0)
+
+        errors.append(ValueError("calendar is down"))
+        assert await worker.run_once() == 1
+        assert await state() == ("pending", "sign_in_done", False, 1)
+
+        assert await worker.run_once() == 1
+        assert calls[-1] == (account, "sign_in_done", False,
+                             schedule_id, 100, 160)
+        assert await state() == ("pending", "sign_out_done", True, 0)
+
+        assert await worker.run_once() == 1
+        assert calls[-1] == (account, "sign_out_done", True,
+                             schedule_id, 100, 900)
+        assert await state() == ("synced", "sign_out_done", True, 1)
+        assert await worker.run_once() == 0
+
+        await confirm_out_by_user(account, date, 1000, date)
+        errors.extend([ValueError(), ValueError()])
+        await worker.run_once()
+        await worker.run_once()
+        assert await state() == ("failed", "sign_out_done", True, 2)
+        assert worker.stats()["failed"] == 1
+
+        await clean_schedule_by_user(account, date)
+        assert await state() is None
+        await clean_status_by_user(account, date)
+
+    db.run_until_complete(scenario())
+
+
+def test_contact_name(db):
+    import tornado.gen
+    from attendance_management_bot.common.contacts import ContactCache
+    from attendance_management_bot.model.asyncPostGreSqlPool \
+        import AsyncPostGreSql
+
+    calls = []
+
+    @tornado.gen.coroutine
+    def fetch(account_id):
+        calls.append(account_id)
+        return {"test_contact@example.com": "Alice"}.get(account_id)
+
+    async def scenario():
+        async with AsyncPostGreSql() as cursor:
+            await cursor.execute("DELETE FROM bot_contact_name "
+                                 "WHERE account LIKE 'test_contact%%'")
+
+        assert await ContactCache(fetch).get("test_contact@example.com") \
+            == "Alice"
+        with pytest.raises(Exception):
+            await ContactCache(fetch).get("test_contact_unknown@example.com")
+        assert len(calls) == 2
+
+        # another process, or after a restart
+        cache = ContactCache(fetch)
+        assert await cache.get("test_contact@example.com") == "Alice"
+        with pytest.raises(Exception):
+            await cache.get("test_contact_unknown@example.com")
+        assert len(calls) == 2
+        assert cache.stats()["store_hits"] == 2
+
+    db.run_until_complete(scenario())
+
+
+def test_outbox(db, monkeypatch):
+    import tornado.gen
+    from attendance_management_bot import outbox
+    from attendance_management_bot.model.asyncPostGreSqlPool \
+        import AsyncPostGreSql
+    from attendance_management_bot.model.asyncDBHandle import \
+        enqueue_messages
+
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(outbox, "OUTBOX_BACKOFF", 0)
+
+    accounts = ["test_outbox_a@example.com", "test_outbox_b@example.com"]
+    sent = []
+    answers = {}
+
+    class Response:
+        def __init__(self, code, headers=None):
+            self.code = code
+            self.body = b""
+            self.headers = headers
+
+    @tornado.gen.coroutine
+    def deliver(body):
+        sent.append(body)
+        answer = answers.pop(body, [200])
+        code = answer.pop(0)
+        if answer:
+            answers[body] = answer
+        if code == 429:
+            return Response(429, {"Retry-After": "0"})
+        return Response(code)
+
+    async def rows():
+        async with AsyncPostGreSql() as cursor:
+            await cursor.execute("SELECT body, state, attempts "
+                                 "FROM bot_message_outbox "
+                                 "WHERE account=ANY(%s) ORDER BY id",
+                                 (accounts,))
+            return await cursor.fetchall()
+
+    worker = outbox.Outbox(deliver, rate=1000, burst=1000)
+
+    async def scenario():
+        async with AsyncPostGreSql() as cursor:
+            await cursor.execute("DELETE FROM bot_message_outbox "
+                                 "WHERE account=ANY(%s)", (accounts,))
+
+        await enqueue_messages(accounts[0], ["a1", "a2", "a3"])
+        await enqueue_messages(accounts[1], ["b1", "b2"])
+        answers["a1"] = [500, 200]
+        answers["b1"] = [429, 200]
+        answers["b2"] = [400]
+
+        # the runs stop at the first message to retry
+        assert await worker.run_once() == 5
+        assert sent == ["a1", "b1"]
+        assert await rows() == [("a1", "pending", 1), ("a2", "pending", 0),
+                                ("a3", "pending", 0), ("b1", "pending", 0),
+                                ("b2", "pending", 0)]
+
+        assert await worker.run_once() == 5
+        assert sorted(sent[2:]) == ["a1", "a2", "a3", "b1", "b2"]
+        assert await worker.run_once() == 0
+        assert [body for body in sent if body.startswith("a")] == \
+            ["a1", "a1", "a2", "a3"]
+        assert [body for body in sent if body.startswith("b")] == \
+            ["b1", "b1", "b2"]
+        assert await rows() == [("b2", "failed", 1)]
+
+        stats = worker.stats()
+        assert (stats["sent"], stats["retried"], stats["limited"],
+                stats["failed"]) == (4, 1, 1, 1)
+
+        await enqueue_messages(accounts[0], ["a4"])
+        answers["a4"] = [500, 503]
+        await worker.run_once()
+        await worker.run_once()
+        assert await rows() == [("b2", "failed", 1), ("a4", "failed", 2)]
+
+        async with AsyncPostGreSql() as cursor:
+            await cursor.execute("DELETE FROM bot_message_outbox "
+                                 "WHERE account=ANY(%s)", (accounts,))
+
+    db.run_until_complete(scenario())
+
+
+def test_callback_dedup(db):
+    from attendance_management_bot.callback_dedup import CallbackDedup
+    from attendance_management_bot.model.asyncDBHandle import \
+        forget_callback
+
+    keys = ["%064d" % (n,) for n in range(3)]
+    # two processes
+    first = CallbackDedup()
+    second = CallbackDedup()
+
+    async def scenario():
+        for key in keys:
+            await forget_callback(key)
+
+        assert await first.begin(keys[0]) is None
+        assert await second.begin(keys[0]) == 200
+        await first.finish(keys[0], 200)
+        assert await CallbackDedup().begin(keys[0]) == 200
+
+        assert await first.begin(keys[1]) is None
+        await first.forget(keys[1])
+        assert await second.begin(keys[1]) is None
+
+        # the process handling it died
+        assert await first.begin(keys[2]) is None
+        assert await CallbackDedup(lease=0).begin(keys[2]) is None
+
+        await CallbackDedup(ttl=0).finish(keys[2], 200)
+        cleaner = CallbackDedup(ttl=0, cleanup=0)
+        assert await cleaner.begin(keys[2]) == 200
+        # the expired callbacks are removed in the background
+        await asyncio.sleep(0.1)
+        assert await CallbackDedup().begin(keys[0]) is None
+
+        for key in keys:
+            await forget_callback(key)
+
+    db.run_until_complete(scenario())
+
+
+def test_report_worked_time(db, monkeypatch):
+    import json
+    import tornado.web
+    import tornado.testing
+    import tornado.httpserver
+    from tornado.httpclient import AsyncHTTPClient
+    from attendance_management_bot import reportsHandler
+    from attendance_management_bot.model.asyncDBHandle import \
+        confirm_in_by_user, confirm_out_by_user, clean_schedule_by_user, \
+        report_worked_time
+
+    accounts = ["test_report_%d@example.com" % (n,) for n in range(3)]
+    dates = ["2001-02-26", "2001-02-27", "2001-03-01"]
+
+    monkeypatch.setattr(reportsHandler, "REPORTS_TOKEN", "secret")
+    monkeypatch.setattr(reportsHandler, "REPORT_FETCH_SIZE", 2)
+    app = tornado.web.Application([(r"/reports",
+                                    reportsHandler.ReportsHandler)])
+    sock, port = tornado.testing.bind_unused_port()
+    http_server = tornado.httpserver.HTTPServer(app)
+    http_server.add_sockets([sock])
+
+    def get(query, token="secret"):
+        return AsyncHTTPClient().fetch(
+            "http://127.0.0.1:%d/reports?%s" % (port, query),
+            headers={"Authorization": "Bearer " + token}, raise_error=False)
+
+    async def clean():
+        for account in accounts:
+            for date in dates:
+                await clean_schedule_by_user(account, date)
+
+    async def scenario():
+        await clean()
+        for index, account in enumerate(accounts):
+            for date in dates:
+                await confirm_in_by_user(account + date, account, date,
+                                         1000, 1060, date)
+                await confirm_out_by_user(account, date,
+                                          1000 + 3600 * (index + 1), date)
+        # still checked in
+        await clean_schedule_by_user(accounts[0], dates[2])
+        await confirm_in_by_user("open", accounts[0], dates[2],
+                                 1000, 1060, dates[2])
+
+        rows = await report_worked_time("month", "2001-02-01", "2001-03-31",
+                                        "", 10, accounts[0])
+        assert [tuple(row[2:]) for row in rows] == [(2, 0, 7200), (1, 1, 0)]
+        assert str(rows[1][1]) == "2001-03-01"
+
+        rows = await report_worked_time("week", "2001-02-01", "2001-03-31",
+                                        "test_report_", 2)
+        assert [(row[0], str(row[1]), row[2]) for row in rows] == [
+            (accounts[0], "2001-02-26", 3), (accounts[1], "2001-02-26", 3)]
+
+        response = await get("period=month&from=2001-02-01&to=2001-03-31"
+                             "&limit=3&after=test_report_")
+        assert response.code == 200
+        report = json.loads(response.body.decode())
+        assert [(item["account"], item["period"])
+                for item in report["reports"]] == [
+            (account, month) for account in accounts
+            for month in ("2001-02-01", "2001-03-01")]
+        assert report["reports"][3]["worked_hours"] == 2.0
+        assert report["next"] is None
+
+        response = await get("period=month&from=2001-02-01&to=2001-03-31"
+                             "&limit=2&after=test_report_")
+        report = json.loads(response.body.decode())
+        assert len(report["reports"]) == 4 and report["next"] == accounts[1]
+        response = await get("period=month&from=2001-02-01&to=2001-03-31"
+                             "&limit=2&after=" + accounts[1])
+        report = json.loads(response.body.decode())
+        assert [item["account"] for item in report["reports"]] == \
+            [accounts[2]] * 2
+        assert report["next"] is None
+
+        calls = []
+
+        async def broken(*args):
+            calls.append(args)
+            if len(calls) > 1:
+                raise RuntimeError("lost the database")
+            return await report_worked_time(*args)
+
+        monkeypatch.setattr(reportsHandler, "report_worked_time", broken)
+        response = await get("period=month&from=2001-02-01&to=2001-03-31"
+                             "&limit=3&after=test_report_")
+        assert response.code == 599 and len(calls) == 2
+        monkeypatch.setattr(reportsHandler, "report_worked_time",
+                            report_worked_time)
+
+        response = await get("from=2001-02-01&to=2001-03-31&limit=2"
+                             "&after=test_report_&account=" + accounts[1])
+        report = json.loads(response.body.decode())
+        assert len(report["reports"]) == 2 and report["next"] is None
+
+        assert (await get("from=2001-02-01", token="other")).code == 403
+        assert (await get("from=2001-02-30")).code == 400
+        assert (await get("from=2001-03-01&to=2001-02-01")).code == 400
+        assert (await get("from=2001-01-01&to=2003-01-01")).code == 400
+        assert (await get("period=year")).code == 400
+        assert (await get("limit=0")).code == 400
+
+        await clean()
+
+    try:
+        db.run_until_complete(scenario())
+    finally:
+        http_server.stop()
+
+
+def test_export(db, monkeypatch):
+    import io
+    import tornado.web
+    import tornado.testing
+    import tornado.httpserver
+    from tornado.httpclient import AsyncHTTPClient
+    from attendance_management_bot import export, exportHandler, \
+        reportsHandler
+    from attendance_management_bot.model.asyncDBHandle import \
+        confirm_in_by_user, confirm_out_by_user, clean_schedule_by_user
+
+    accounts = ["test_export_%d@example.com" % (n,) for n in range(2)]
+    dates = ["2001-04-02", "2001-04-03"]
+    # 2001-04-02 09:00 Asia/Tokyo
+    nine = 986169600
+
+    monkeypatch.setattr(export, "TZone", "Asia/Tokyo")
+    monkeypatch.setattr(reportsHandler, "REPORTS_TOKEN", "secret")
+    app = tornado.web.Application([(r"/export",
+                                    exportHandler.ExportHandler)])
+    sock, port = tornado.testing.bind_unused_port()
+    http_server = tornado.httpserver.HTTPServer(app)
+    http_server.add_sockets([sock])
+
+    async def clean():
+        for account in accounts:
+            for date in dates:
+                await clean_schedule_by_user(account, date)
+
+    async def scenario():
+        await clean()
+        for account in accounts:
+            for day, date in enumerate(dates):
+                begin = nine + 86400 * day
+                await confirm_in_by_user(account + date, account, date,
+                                         begin, begin + 60, date)
+        await confirm_out_by_user(accounts[0], dates[0], nine + 30600,
+                                  dates[0])
+
+        lines = io.StringIO()
+        export.copy_csv(dates[0], dates[1], lines)
+        lines = [line for line in lines.getvalue().split("\n")
+                 if line.startswith("test_export_") or line.startswith("acc")]
+        assert lines == [
+            "account,date,begin_time,end_time,hours",
+            accounts[0] + ",2001-04-02,2001-04-02 09:00:00,"
+                          "2001-04-02 17:30:00,8.50",
+            accounts[0] + ",2001-04-03,2001-04-03 09:00:00,,",
+            accounts[1] + ",2001-04-02,2001-04-02 09:00:00,,",
+            accounts[1] + ",2001-04-03,2001-04-03 09:00:00,,",
+        ]
+
+        # the endpoint writes the same CSV, a few rows at a time
+        monkeypatch.setattr(export, "EXPORT_FETCH_SIZE", 1)
+        expected = io.StringIO()
+        export.copy_csv(dates[0], dates[1], expected)
+        response = await AsyncHTTPClient().fetch(
+            "http://127.0.0.1:%d/export?from=%s&to=%s"
+            % (port, dates[0], dates[1]),
+            headers={"Authorization": "Bearer secret"})
+        assert response.headers["Content-Type"] == "text/csv; charset=UTF-8"
+        assert response.body.decode() == expected.getvalue()
+
+        class BrokenCursor(export.ExportCursor):
+            fetched = 0
+
+            async def fetch(self, size=None):
+                BrokenCursor.fetched += 1
+                if BrokenCursor.fetched > 1:
+                    raise RuntimeError("lost the database")
+                return await super().fetch(size)
+
+        monkeypatch.setattr(exportHandler, "ExportCursor", BrokenCursor)
+        response = await AsyncHTTPClient().fetch(
+            "http://127.0.0.1:%d/export?from=%s&to=%s"
+            % (port, dates[0], dates[1]),
+            headers={"Authorization": "Bearer secret"}, raise_error=False)
+        assert response.code == 599 and BrokenCursor.fetched == 2
+
+        await clean()
+
+    try:
+        db.run_until_complete(scenario())
+    finally:
+        http_server.stop()
+
+
+def test_export_parquet(db, tmp_path, monkeypatch):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    from attendance_management_bot import export
+    from attendance_management_bot.model.asyncDBHandle import \
+        confirm_in_by_user, confirm_out_by_user, clean_schedule_by_user
+
+    account = "test_export_parquet@example.com"
+    dates = ["2001-05-07", "2001-05-08", "2001-05-09"]
+
+    async def clean():
+        for date in dates:
+            await clean_schedule_by_user(account, date)
+
+    async def fill():
+        await clean()
+        for day, date in enumerate(dates):
+            begin = 989193600 + 86400 * day
+            await confirm_in_by_user(account + date, account, date,
+                                     begin, begin + 60, date)
+            await confirm_out_by_user(account, date, begin + 3600 * 8, date)
+
+    db.run_until_complete(fill())
+    try:
+        path = str(tmp_path / "attendance.parquet")
+        monkeypatch.setattr(export, "EXPORT_ROW_GROUP_SIZE", 2)
+        export.write_parquet(dates[0], dates[2], path)
+        table = parquet.read_table(path)
+        rows = [row for row in table.to_pylist()
+                if row["account"] == account]
+        assert [str(row["date"]) for row in rows] == dates
+        assert [row["hours"] for row in rows] == [8.0] * 3
+        assert table.column_names == list(export.EXPORT_COLUMNS)
+    finally:
+        db.run_until_complete(clean())
+
+
+def test_reminders(db, monkeypatch):
+    import pytz
+    import datetime
+    from attendance_management_bot import reminders
+    from attendance_management_bot.model.asyncPostGreSqlPool \
+        import AsyncPostGreSql
+    from attendance_management_bot.model.asyncDBHandle import \
+        insert_replace_status_by_user_date, claim_messages, enqueue_messages
+
+    accounts = ["test_reminder_%d@example.com" % (n,) for n in range(5)]
+    # Monday
+    now = pytz.timezone("Asia/Tokyo").localize(
+        datetime.datetime(2002, 6, 3, 9, 35))
+    today = "2002-06-03"
+    monkeypatch.setattr(reminders, "REMINDER_SIGN_IN_TIMES", ["09:30"])
+    monkeypatch.setattr(reminders, "REMINDER_SIGN_OUT_TIMES", ["09:30"])
+    monkeypatch.setattr(reminders, "REMINDER_WEEKDAYS", range(7))
+
+    async def clean():
+        async with AsyncPostGreSql() as cursor:
+            await cursor.execute("DELETE FROM bot_message_outbox "
+                                 "WHERE account=ANY(%s)", (accounts,))
+            await cursor.execute("DELETE FROM bot_process_status "
+                                 "WHERE account=ANY(%s)", (accounts,))
+            await cursor.execute("DELETE FROM bot_reminder_run "
+                                 "WHERE cur_date=%s", (today,))
+
+    async def reminded():
+        async with AsyncPostGreSql() as cursor:
+            await cursor.execute("SELECT account, priority "
+                                 "FROM bot_message_outbox "
+                                 "WHERE account=ANY(%s) ORDER BY id",
+                                 (accounts,))
+            return await cursor.fetchall()
+
+    async def scenario():
+        await clean()
+        # the users of the last days
+        for account in accounts[:4]:
+            await insert_replace_status_by_user_date(
+                account, "2002-05-30", "out_done", "sign_out_done")
+        # an account not seen for long
+        await insert_replace_status_by_user_date(
+            accounts[4], "2002-04-01", "out_done", "sign_out_done")
+        await insert_replace_status_by_user_date(
+            accounts[1], today, "in_done", "sign_in_done")
+        await insert_replace_status_by_user_date(
+            accounts[2], today, "out_done", "sign_out_done")
+        await insert_replace_status_by_user_date(
+            accounts[3], today, "wait_in")
+
+        # two processes
+        first = reminders.Reminders(batch=1)
+        second = reminders.Reminders(batch=1)
+        assert await first.run_once(now) == 3
+        assert await second.run_once(now) == 0
+        assert sorted(await reminded()) == [
+            (accounts[0], 1), (accounts[1], 1), (accounts[3], 1)]
+        assert first.stats()["reminded"] == 3
+
+        # the answers to the users go first
+        await enqueue_messages(accounts[2], ["answer"])
+        rows = await claim_messages(1, 0, 1)
+        assert [(account, body) for _, account, body, _ in rows] == \
+            [(accounts[2], "answer")]
+
+        # a process stopped after one account, another one goes on
+        await clean()
+        for account in accounts[:3]:
+            await insert_replace_status_by_user_date(
+                account, today, "in_done", "sign_in_done")
+        monkeypatch.setattr(reminders, "REMINDER_SIGN_IN_TIMES", [])
+        assert await reminders.claim_reminder(
+            "sign_out 09:30", today, 300) == ""
+        await reminders.enqueue_reminders(
+            "sign_out 09:30", today, accounts[:1], ["body"])
+        assert await second.run_once(now) == 0
+        monkeypatch.setattr(reminders, "REMINDER_LEASE", 0)
+        assert await second.run_once(now) == 2
+        assert [account for account, _ in await reminded()] == accounts[:3]
+        assert await second.run_once(now) == 0
+
+        await clean()
+
+    db.run_until_complete(scenario())
+
+
+def test_close_out(db, monkeypatch):
+    import pytz
+    import datetime
+    from attendance_management_bot import close_out
+    from attendance_management_bot.model import postgreSqlPool
+    from attendance_management_bot.model.asyncPostGreSqlPool \
+        import AsyncPostGreSql
+    from attendance_management_bot.model.asyncDBHandle import \
+        confirm_in_by_user, confirm_out_by_user, clean_schedule_by_user, \
+        clean_status_by_user
+
+    accounts = ["test_close_out_%d@example.com" % (n,) for n in range(3)]
+    dates = ["2003-03-03", "2003-03-04", "2003-03-05"]
+    tokyo = pytz.timezone("Asia/Tokyo")
+    nine = int(tokyo.localize(datetime.datetime(2003, 3, 3, 9)).timestamp())
+    six = int(tokyo.localize(datetime.datetime(2003, 3, 3, 18)).timestamp())
+    today = datetime.date(2003, 3, 5)
+
+    monkeypatch.setattr(close_out, "TZone", "Asia/Tokyo")
+    monkeypatch.setattr(close_out, "CLOSE_OUT_END_TIME", "18:00")
+
+    async def clean():
+        for account in accounts:
+            for date in dates:
+                await clean_schedule_by_user(account, date)
+                await clean_status_by_user(account, date)
+
+    async def fill():
+        await clean()
+        for account in accounts:
+            await confirm_in_by_user(account + dates[0], account, dates[0],
+                                     nine, nine + 60, dates[0])
+        # clocked out
+        await confirm_out_by_user(accounts[1], dates[0], nine + 3600,
+                                  dates[0])
+        # today, still at work
+        await confirm_in_by_user(accounts[2] + dates[2], accounts[2],
+                                 dates[2], nine + 2 * 86400,
+                                 nine + 2 * 86400 + 60, dates[2])
+
+    async def state(account, date):
+        async with AsyncPostGreSql() as cursor:
+            await cursor.execute(
+                "SELECT c.end_time, c.close_out, s.process, s.version, "
+                "p.status, p.process FROM bot_calendar_record c "
+                "JOIN bot_calendar_sync s USING(account, cur_date) "
+                "JOIN bot_process_status p USING(account, cur_date) "
+                "WHERE c.account=%s AND c.cur_date=%s", (account, date))
+            return await cursor.fetchone()
+
+    db.run_until_complete(fill())
+    try:
+        assert close_out.close_out(today, "review") == 2
+        assert db.run_until_complete(state(accounts[0], dates[0])) == \
+            (nine + 60, "review", "sign_in_done", 1,
+             "in_done", "sign_in_done")
+        assert close_out.close_out(today, "review") == 0
+
+        db.run_until_complete(fill())
+        monkeypatch.setattr(close_out, "CLOSE_OUT_BATCH", 1)
+        assert close_out.close_out(today, "end_time") == 2
+        assert db.run_until_complete(state(accounts[0], dates[0])) == \
+            (six, "end_time", "sign_out_done", 2,
+             "out_done", "sign_out_done")
+        assert db.run_until_complete(state(accounts[1], dates[0]))[:3] == \
+            (nine + 3600, None, "sign_out_done")
+        assert db.run_until_complete(state(accounts[2], dates[2]))[:3] == \
+            (nine + 2 * 86400 + 60, None, "sign_in_done")
+        assert close_out.close_out(today) == 0
+
+        with pytest.raises(ValueError):
+            close_out.close_out(today, "delete")
+    finally:
+        db.run_until_complete(clean())
+        postgreSqlPool.close_pool()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+test the deduplication of the callbacks.
+"""
+
+import tornado.gen
+import tornado.ioloop
+from attendance_management_bot.callback_dedup import callback_key, \
+    CallbackDedup
+
+
+def callback(data, created_time=1573631535000):
+    body = {"type": "postback", "source": {"accountId": "user"},
+            "data": data}
+    if created_time is not None:
+        body["createdTime"] = created_time
+    return body
+
+
+def test_callback_key():
+    key = callback_key(callback("confirm_in&time=1573631535"))
+    assert len(key) == 64
+    assert key == callback_key(callback("confirm_in&time=1573631535"))
+    assert key != callback_key(callback("confirm_in&time=1573631536"))
+    assert key != callback_key(callback("confirm_in&time=1573631535",
+                                        1573631535001))
+    assert callback_key(callback("sign_in", None)) is None
+
+
+def test_dedup():
+    dedup = CallbackDedup(store=False, size=2)
+    keys = [callback_key(callback("sign_in", n)) for n in range(3)]
+
+    @tornado.gen.coroutine
+    def scenario():
+        assert (yield dedup.begin(None)) is None
+        assert (yield dedup.begin(None)) is None
+
+        assert (yield dedup.begin(keys[0])) is None
+        # retried while it is handled
+        assert (yield dedup.begin(keys[0])) == 200
+        yield dedup.finish(keys[0], 202)
+        assert (yield dedup.begin(keys[0])) == 202
+
+        assert (yield dedup.begin(keys[1])) is None
+        yield dedup.forget(keys[1])
+        assert (yield dedup.begin(keys[1])) is None
+
+        # keys[0] is the least recently used
+        assert (yield dedup.begin(keys[2])) is None
+        assert (yield dedup.begin(keys[0])) is None
+        assert dedup.stats() == {"size": 2, "duplicates": 2}
+
+    tornado.ioloop.IOLoop.current().run_sync(scenario)
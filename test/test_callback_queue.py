@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+test the queue of the callbacks.
+"""
+
+import pytest
+import tornado.gen
+import tornado.ioloop
+from tornado.web import HTTPError
+from attendance_management_bot.callback_queue import CallbackQueue
+
+
+class Checker:
+    running = 0
+    max_running = 0
+
+    def __init__(self, account_id, error=None):
+        self.account_id = account_id
+        self.error = error
+        self.done = False
+
+    @tornado.gen.coroutine
+    def run(self):
+        Checker.running += 1
+        Checker.max_running = max(Checker.max_running, Checker.running)
+        yield tornado.gen.sleep(0.01)
+        Checker.running -= 1
+        self.done = True
+        if self.error is not None:
+            raise self.error
+
+
+def test_bounded_consumers():
+    queue = CallbackQueue(maxsize=10, consumers=3)
+
+    @tornado.gen.coroutine
+    def scenario():
+        checkers = [Checker("user%d" % (i,)) for i in range(8)]
+        checkers.append(Checker("user", HTTPError(403)))
+        checkers.append(Checker("user", ValueError()))
+        for checker in checkers:
+            queue.put(checker)
+        assert queue.depth() == 10
+        assert queue.age() >= 0
+
+        with pytest.raises(HTTPError) as info:
+            queue.put(Checker("user"))
+        assert info.value.status_code == 503
+
+        queue.start()
+        yield queue.join()
+        assert all(checker.done for checker in checkers)
+
+        stats = queue.stats()
+        assert stats["depth"] == 0 and stats["age"] == 0
+        assert stats["processed"] == 9
+        assert stats["failed"] == 1
+        assert stats["rejected"] == 1
+        assert Checker.max_running == 3
+
+    tornado.ioloop.IOLoop.current().run_sync(scenario)
+
+
+
+def test_stop_listening_before_drain(monkeypatch):
+    import types
+    import asyncio
+    # the module sets the uvloop policy, the other tests keep theirs.
+    policy = asyncio.get_event_loop_policy()
+    from attendance_management_bot import attendance_management_bot as bot
+    asyncio.set_event_loop_policy(policy)
+    calls = []
+
+    class Server:
+        def stop(self):
+            calls.append("server")
+
+    class Loop:
+        def stop(self):
+            calls.append("loop")
+
+    def step(name):
+        @tornado.gen.coroutine
+        def run(*args):
+            calls.append(name)
+        return run
+
+    monkeypatch.setattr(bot, "_server", Server())
+    monkeypatch.setattr(bot, "drain_callback_queue", step("drain"))
+    monkeypatch.setattr(bot, "stop_reminders", step("reminders"))
+    monkeypatch.setattr(bot, "stop_outbox", step("outbox"))
+    monkeypatch.setattr(bot, "stop_calendar_sync", step("calendar"))
+    monkeypatch.setattr(bot, "asyncio", types.SimpleNamespace(
+        get_event_loop=Loop))
+
+    tornado.ioloop.IOLoop.current().run_sync(bot.kill_server)
+    assert calls == ["server", "drain", "reminders", "outbox", "calendar",
+                     "loop"]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+test the routing of the callbacks to the actions.
+"""
+
+import pytest
+import tornado.gen
+import tornado.ioloop
+from tornado.web import HTTPError
+from attendance_management_bot.check_and_handle_actions import \
+    CheckAndHandleActions, register_action, parse_postback, clean
+from attendance_management_bot.actions.start import start
+from attendance_management_bot.actions.direct_sign_in import direct_sign_in
+from attendance_management_bot.actions.deal_message import deal_message
+from attendance_management_bot.actions.confirm_in import confirm_in
+
+
+def handle_of(body):
+    checker = CheckAndHandleActions()
+    checker.check(body)
+    return checker._CheckAndHandleActions__handle
+
+
+def postback(data):
+    return {"type": "postback", "source": {"accountId": "user"},
+            "data": data}
+
+
+def message(text, content_postback=None):
+    content = {"type": "text", "text": text}
+    if content_postback is not None:
+        content["postback"] = content_postback
+    return {"type": "message", "source": {"accountId": "user"},
+            "content": content}
+
+
+def test_parse_postback():
+    assert parse_postback("sign_in") == ("sign_in", {})
+    assert parse_postback("confirm_in&time=1573631535") == \
+        ("confirm_in", {"time": "1573631535"})
+    assert parse_postback("a&b=1&c") == ("a", {"b": "1", "c": ""})
+
+
+def test_routes():
+    assert handle_of(postback("confirm_in&time=1573631535")) is confirm_in
+    assert handle_of(postback("direct_sign_in")) is direct_sign_in
+    assert handle_of(message("Try now", "start")) is start
+    assert handle_of(message("", "direct_sign_in")) is direct_sign_in
+    assert handle_of(message("clean")) is clean
+    assert handle_of(message("09:30")) is deal_message
+
+    for body in [postback("unknown"), message("start"),
+                 message("confirm_in&time=1"), message("x", "sign_in")]:
+        with pytest.raises(HTTPError) as info:
+            handle_of(body)
+        assert info.value.status_code == 400
+
+    with pytest.raises(HTTPError) as info:
+        handle_of({"type": "message", "source": {}})
+    assert info.value.status_code == 403
+
+    with pytest.raises(AttributeError):
+        CheckAndHandleActions().other = 1
+
+
+def test_register_action():
+    calls = []
+
+    @tornado.gen.coroutine
+    def report(account_id, current_date, create_time, callback):
+        calls.append((account_id, callback))
+
+    register_action("test_report", report, text=True)
+    checker = CheckAndHandleActions()
+    tornado.ioloop.IOLoop.current().run_sync(
+        lambda: checker.execute(postback("test_report&month=2019-11")))
+    checker = CheckAndHandleActions()
+    tornado.ioloop.IOLoop.current().run_sync(
+        lambda: checker.execute(message("test_report")))
+    assert calls == [("user", "test_report&month=2019-11"),
+                     ("user", "test_report")]
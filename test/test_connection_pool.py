@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+test the connection pool with fake connections, no database is needed.
+"""
+
+import time
+import threading
+import psycopg2
+import psycopg2.extensions as extensions
+import pytest
+from attendance_management_bot.model import postgreSqlPool
+from attendance_management_bot.model.postgreSqlPool import ConnectionPool, \
+    PoolTimeout, PostGreSql
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        return False
+
+    def execute(self, sql):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.created_at = time.time()
+        self.released_at = self.created_at
+        self.closed = 0
+        self.broken = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    opened = []
+
+    def fake_connect(connection_factory=None, **kwargs):
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    monkeypatch.setattr(postgreSqlPool.psycopg2, "connect", fake_connect)
+    return opened
+
+
+def make_pool(min_size=0, max_size=1, timeout=0.2, idle_timeout=None,
+              max_lifetime=None, pre_ping=None):
+    return ConnectionPool(min_size, max_size, timeout, idle_timeout,
+                          max_lifetime, pre_ping)
+
+
+def test_checkout_waits_then_times_out(connect):
+    pool = make_pool(timeout=1)
+    conn = pool.connection()
+    taken = []
+
+    waiter = threading.Thread(target=lambda: taken.append(pool.connection()))
+    waiter.start()
+    time.sleep(0.1)
+    assert taken == []
+    pool.release(conn)
+    waiter.join(1)
+    assert taken == [conn]
+    assert pool.stats()["waits"] == 1
+
+    pool._timeout = 0.1
+    begin = time.time()
+    with pytest.raises(PoolTimeout):
+        pool.connection()
+    assert time.time() - begin >= 0.09
+    assert pool.stats()["checked_out"] == 1
+    assert len(connect) == 1
+
+
+def test_replace_expired_connections(connect):
+    pool = make_pool(idle_timeout=10, max_lifetime=100)
+
+    conn = pool.connection()
+    pool.release(conn)
+    conn.released_at -= 20
+    idle = pool.connection()
+    assert idle is not conn and conn.closed
+
+    pool.release(idle)
+    idle.created_at -= 200
+    old = pool.connection()
+    assert old is not idle and idle.closed
+
+    stats = pool.stats()
+    assert (stats["size"], stats["created"], stats["recycled"]) == (1, 3, 2)
+
+
+def test_pre_ping_discards_broken_connection(connect):
+    pool = make_pool(pre_ping=0)
+
+    conn = pool.connection()
+    pool.release(conn)
+    assert pool.connection() is conn
+    pool.release(conn)
+
+    conn.broken = True
+    new_conn = pool.connection()
+    assert new_conn is not conn and conn.closed
+    assert pool.stats()["recycled"] == 1
+
+
+def test_new_pool_after_fork(connect, monkeypatch):
+    monkeypatch.setattr(PostGreSql, "_PostGreSql__pool", None)
+    pool = PostGreSql.get_pool()
+    assert PostGreSql.get_pool() is pool
+    assert postgreSqlPool.get_pool_stats() is not None
+
+    # the pool of the parent process
+    pool.pid = -1
+    assert postgreSqlPool.get_pool_stats() is None
+    child_pool = PostGreSql.get_pool()
+    assert child_pool is not pool
+    assert child_pool.pid != -1
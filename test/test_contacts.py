@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+test the cache of the user names.
+"""
+
+import pytest
+import tornado.gen
+import tornado.ioloop
+from tornado.web import HTTPError
+from attendance_management_bot.common.contacts import ContactCache
+
+
+class Fetch:
+    def __init__(self, names):
+        self.names = names
+        self.calls = []
+
+    @tornado.gen.coroutine
+    def __call__(self, account_id):
+        self.calls.append(account_id)
+        yield tornado.gen.sleep(0.01)
+        return self.names.get(account_id, None)
+
+
+def test_cache():
+    fetch = Fetch({"a": "Alice", "b": "Bob", "c": "Carol"})
+    cache = ContactCache(fetch, store=False, size=2, ttl=60, stale=120,
+                         negative_ttl=60)
+
+    @tornado.gen.coroutine
+    def scenario():
+        names = yield [cache.get("a") for _ in range(5)]
+        assert names == ["Alice"] * 5
+        assert fetch.calls == ["a"]
+
+        assert (yield cache.get("b")) == "Bob"
+        assert (yield cache.get("a")) == "Alice"
+        assert (yield cache.get("c")) == "Carol"
+        # b was the least recently used
+        assert (yield cache.get("a")) == "Alice"
+        assert (yield cache.get("b")) == "Bob"
+        assert fetch.calls == ["a", "b", "c", "b"]
+
+        for _ in range(2):
+            with pytest.raises(HTTPError):
+                yield cache.get("unknown")
+        assert fetch.calls[-1] == "unknown"
+        assert fetch.calls.count("unknown") == 1
+
+    tornado.ioloop.IOLoop.current().run_sync(scenario)
+
+
+def test_stale_while_revalidate():
+    fetch = Fetch({"a": "Alice"})
+    cache = ContactCache(fetch, store=False, ttl=0, stale=60)
+
+    @tornado.gen.coroutine
+    def scenario():
+        assert (yield cache.get("a")) == "Alice"
+        fetch.names["a"] = "Alice Smith"
+        # the stale name comes back at once, refreshed once behind
+        names = yield [cache.get("a") for _ in range(3)]
+        assert names == ["Alice"] * 3
+        yield tornado.gen.sleep(0.05)
+        assert fetch.calls == ["a", "a"]
+        assert (yield cache.get("a")) == "Alice Smith"
+        assert cache.stats()["stale_hits"] == 4
+
+    tornado.ioloop.IOLoop.current().run_sync(scenario)
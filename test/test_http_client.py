@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+test the authenticated HTTP methods against a local tornado server.
+"""
+
+import io
+import tornado.gen
+import tornado.web
+import tornado.httpserver
+import tornado.ioloop
+import tornado.testing
+import pytest
+from attendance_management_bot.common import utils
+from attendance_management_bot.common.token import TokenManager
+
+
+class EchoHandler(tornado.web.RequestHandler):
+    def initialize(self, seen):
+        self.seen = seen
+
+    def prepare(self):
+        self.seen.append((self.request.method,
+                          self.request.headers.get("Authorization"),
+                          self.request.headers.get("Content-Type"),
+                          self.request.body))
+        if self.request.headers.get("Authorization") != "Bearer new":
+            self.set_status(401)
+            self.finish()
+
+    def post(self):
+        self.set_header("x-works-resource-id", "resource")
+        self.write(self.request.body)
+
+    def get(self):
+        self.write("ok")
+
+    def delete(self):
+        self.write("ok")
+
+
+@pytest.fixture
+def server():
+    seen = []
+    app = tornado.web.Application([(r"/", EchoHandler, dict(seen=seen))])
+    sock, port = tornado.testing.bind_unused_port()
+    http_server = tornado.httpserver.HTTPServer(app)
+    http_server.add_sockets([sock])
+    yield "http://127.0.0.1:%d/" % (port,), seen
+    http_server.stop()
+
+
+def token_manager(*tokens):
+    tokens = list(tokens)
+
+    @tornado.gen.coroutine
+    def fetch():
+        return tokens.pop(0), 86400
+
+    return TokenManager(fetch)
+
+
+def test_refresh_token(server, monkeypatch):
+    url, seen = server
+    monkeypatch.setattr(utils, "token_manager", token_manager("old", "new"))
+    utils.configure_http_client()
+
+    response = tornado.ioloop.IOLoop.current().run_sync(
+        lambda: utils.auth_post(url, data='{"a": 1}',
+                                headers={"Content-Type": "application/json"}))
+    assert response.code == 200
+    assert response.body == b'{"a": 1}'
+    assert [item[1] for item in seen] == ["Bearer old", "Bearer new"]
+
+    response = tornado.ioloop.IOLoop.current().run_sync(
+        lambda: utils.auth_del(url, headers={}))
+    assert response.code == 200
+    assert seen[-1][:2] == ("DELETE", "Bearer new")
+
+
+def test_multipart(server, monkeypatch):
+    url, seen = server
+    monkeypatch.setattr(utils, "token_manager", token_manager("new"))
+    _file = io.BytesIO(b"\x89PNG")
+    _file.name = "/tmp/menu.png"
+
+    response = tornado.ioloop.IOLoop.current().run_sync(
+        lambda: utils.auth_post(url, files={"resourceName": _file},
+                                headers={"consumerKey": "key"}))
+    assert response.code == 200
+    assert response.headers["X-Works-Resource-Id"] == "resource"
+    content_type = seen[-1][2]
+    assert content_type.startswith("multipart/form-data; boundary=")
+    assert b'name="resourceName"; filename="menu.png"' in seen[-1][3]
+    assert b"\r\n\r\n\x89PNG\r\n" in seen[-1][3]
+
+
+def test_deliver_message_headers(monkeypatch):
+    from attendance_management_bot.externals import send_message
+    seen = []
+
+    @tornado.gen.coroutine
+    def auth_post(url, data=None, headers=None):
+        seen.append(headers)
+        return None
+
+    monkeypatch.setattr(send_message, "auth_post", auth_post)
+    monkeypatch.setattr(send_message, "replace_url_bot_no", lambda url: url)
+    shared = dict(send_message.API_BO["headers"])
+
+    for header in (None, {"Accept-Language": "ja"}):
+        tornado.ioloop.IOLoop.current().run_sync(
+            lambda: send_message.deliver_message("{}", header))
+
+    assert "Accept-Language" not in seen[0]
+    assert seen[1]["Accept-Language"] == "ja"
+    assert seen[1]["consumerKey"] == send_message.OPEN_API["consumerKey"]
+    assert send_message.API_BO["headers"] == shared
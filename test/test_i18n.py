@@ -38,3 +38,32 @@ def test_ko():
     assert ko.gettext(original).startswith(u'안녕하세요')
     assert ja.gettext(original).startswith(u'こんにちは。')
     assert en.gettext(original).startswith('Hello, ')
+
+
+def test_format_date():
+    """
+    Dates are formatted like strftime in the en_US, ja_JP and ko_KR locales.
+    """
+    from datetime import datetime
+    from attendance_management_bot.model.i18n_catalog import format_date
+
+    date = datetime(2019, 11, 3, 16, 5)
+    assert format_date(date, "%A, %B %-d at %-I:%M %P", "en") == \
+        "Sunday, November 3 at 4:05 pm"
+    assert format_date(date, "%a %b %d %I %p %H %m %y %Y %%", "en_US") == \
+        "Sun Nov 03 04 PM 16 11 19 2019 %"
+    assert format_date(date, "%B %-d日 %P %-I時 %-M分", "ja") == \
+        "11月 3日 午後 4時 5分"
+    assert format_date(date, "%b %a", "ja") == "11月 日"
+    assert format_date(date.replace(month=1, hour=0), "%b %B %-I %p", "ko") \
+        == " 1월 1월 12 오전"
+    assert format_date(date, "%m월 %d일 %A", "ko_KR") == "11월 03일 일요일"
+
+
+def test_catalogs():
+    from attendance_management_bot.model.i18n_catalog import load_catalogs, \
+        get_catalog
+
+    assert load_catalogs() >= 3
+    assert get_catalog("confirm_out", "ja").gettext("%A, %B %d") == \
+        "%B%-d日 %A"
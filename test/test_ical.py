@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+test the iCalendar text against the icalendar library.
+"""
+
+import pytz
+import pytest
+from datetime import datetime, timedelta, timezone
+from icalendar import Calendar, Event
+from attendance_management_bot.common.ical import make_vevent, \
+    format_datetime
+from attendance_management_bot.common.local_timezone import local_date_time
+from attendance_management_bot.externals.calendar_req \
+    import make_icalendar_data
+
+
+def reference(uid, summary, current, end, begin, account_id, create_flag):
+    cal = Calendar()
+    cal.add('PRODID', 'Works sample bot Calendar')
+    cal.add('VERSION', '2.0')
+
+    event = Event()
+    event.add('UID', uid)
+    if create_flag:
+        event.add('CREATED', current)
+    event.add('DESCRIPTION', account_id)
+    event.add('SUMMARY', summary)
+    event.add('DTSTART', begin)
+    event.add('DTEND', end)
+    event.add('LAST-MODIFIED', current)
+    event.add('DTSTAMP', current)
+
+    cal.add_component(event)
+    return bytes.decode(cal.to_ical())
+
+
+SUMMARIES = [
+    "user's clock-in time on Wednesday, November 13",
+    u"홍길동's working hours on 11월 13일 수요일",
+    u"山田太郎さんの11月13日 水曜日の出勤時間",
+    'comma, semicolon; backslash\\ colon: "quote"',
+    "new\nline and\r\nwindows line and \\N",
+    "x" * 74,
+    "x" * 75,
+    "x" * 300,
+    u"é" * 80,
+    u"a" + u"출" * 60,
+    u"😀 emoji " * 20,
+]
+
+UIDS = [
+    "0d7ad7b5-63c5-4ec6-a6b6-fb8e2b6a1c36user@example.com",
+    "uid," * 40,
+]
+
+TIMES = [
+    local_date_time(1573631535),
+    datetime(2019, 11, 13, 7, 52, 15, 123456, tzinfo=timezone.utc),
+    pytz.utc.localize(datetime(2019, 12, 31, 23, 59, 59)),
+    pytz.timezone("America/Argentina/ComodRivadavia").localize(
+        datetime(2020, 2, 29, 9, 0, 0)),
+    datetime(2020, 1, 1, 9, 0, 0),
+]
+
+
+@pytest.mark.parametrize("summary", SUMMARIES)
+@pytest.mark.parametrize("uid", UIDS)
+@pytest.mark.parametrize("create_flag", [True, False])
+def test_text(summary, uid, create_flag):
+    current = local_date_time(1573631535)
+    begin = current - timedelta(hours=8)
+    end = current
+    assert make_icalendar_data(uid, summary, current, end, begin,
+                               "user@example.com", create_flag) == \
+        reference(uid, summary, current, end, begin,
+                  "user@example.com", create_flag)
+
+
+# the library writes TZID=UTC with the Z suffix for the datetime.timezone.utc
+# start, which RFC 5545 doesn't allow, it is left out of the comparison.
+@pytest.mark.parametrize("current", TIMES)
+@pytest.mark.parametrize("begin", TIMES[:1] + TIMES[2:])
+def test_datetime(current, begin):
+    end = begin + timedelta(minutes=1)
+    assert make_vevent("Works sample bot Calendar", "uid", "summary",
+                       "user@example.com", begin, end, current, current) == \
+        reference("uid", "summary", current, end, begin,
+                  "user@example.com", True)
+
+
+def test_line_length():
+    text = make_vevent("Works sample bot Calendar", "uid", u"출근 " * 100,
+                       "user@example.com", TIMES[0], TIMES[0], TIMES[0])
+    lines = text.split("\r\n")
+    assert lines[-1] == ""
+    assert all(len(line.encode("utf-8")) <= 75 for line in lines)
+    assert Calendar.from_ical(text).walk("VEVENT")[0]["SUMMARY"] == \
+        u"출근 " * 100
+
+
+def test_utc():
+    assert format_datetime("DTSTART", TIMES[1]) == \
+        "DTSTART;VALUE=DATE-TIME:20191113T075215Z"
+    assert format_datetime("DTSTAMP", TIMES[0], True) == \
+        "DTSTAMP;VALUE=DATE-TIME:20191113T075215Z"
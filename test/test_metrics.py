@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+test the latency histograms and /metrics.
+"""
+
+import time
+import pytest
+import tornado.gen
+import tornado.web
+import tornado.httpserver
+import tornado.ioloop
+import tornado.testing
+from tornado.httpclient import AsyncHTTPClient
+from attendance_management_bot import metrics, metricsHandler
+from attendance_management_bot.metrics import Histogram, api_endpoint, \
+    LoopLagMonitor
+from attendance_management_bot.constant import API_BO
+
+
+def test_histogram():
+    histogram = Histogram("test_seconds", "test.", ["name"],
+                          buckets=[1, 0.1])
+    metrics.histograms.remove(histogram)
+    for value in [0.05, 0.1, 0.5, 3]:
+        histogram.observe(value, 'a"b')
+    histogram.observe(0.2, "c")
+    with histogram.time("c"):
+        pass
+    assert histogram.count('a"b') == 4
+    assert histogram.count("c") == 2
+
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP test_seconds test.",
+                         "# TYPE test_seconds histogram"]
+    assert lines[2:7] == [
+        'test_seconds_bucket{name="a\\"b",le="0.1"} 2',
+        'test_seconds_bucket{name="a\\"b",le="1"} 3',
+        'test_seconds_bucket{name="a\\"b",le="+Inf"} 4',
+        'test_seconds_sum{name="a\\"b"} 3.65',
+        'test_seconds_count{name="a\\"b"} 4',
+    ]
+    assert lines[7] == 'test_seconds_bucket{name="c",le="0.1"} 1'
+
+    with pytest.raises(ValueError):
+        histogram.observe(1)
+
+
+def test_api_endpoint():
+    assert api_endpoint(API_BO["push_url"]) == "push"
+    assert api_endpoint(API_BO["calendar"]["modify_schedule_url"]) == \
+        "calendar"
+    assert api_endpoint(API_BO["TZone"]["contacts_url"]) == "contacts"
+    assert api_endpoint(API_BO["auth_url"]) == "token"
+    assert api_endpoint("https://example.com/") == "other"
+
+
+def test_loop_lag():
+    monitor = LoopLagMonitor(interval=0.01)
+    count = metrics.LOOP_LAG_SECONDS.count()
+
+    @tornado.gen.coroutine
+    def scenario():
+        monitor.start()
+        yield tornado.gen.sleep(0.02)
+        # block the loop
+        tornado.ioloop.IOLoop.current().call_later(
+            0, lambda: time.sleep(0.05))
+        yield tornado.gen.sleep(0.1)
+
+    tornado.ioloop.IOLoop.current().run_sync(scenario)
+    assert metrics.LOOP_LAG_SECONDS.count() > count
+    assert monitor.lag() < 0.05
+
+
+def test_metrics_handler(monkeypatch):
+    app = tornado.web.Application([(r"/metrics",
+                                    metricsHandler.MetricsHandler)])
+    sock, port = tornado.testing.bind_unused_port()
+    http_server = tornado.httpserver.HTTPServer(app)
+    http_server.add_sockets([sock])
+    url = "http://127.0.0.1:%d/metrics" % (port,)
+    metrics.ACTION_SECONDS.observe(0.3, "sign_in")
+
+    def get():
+        return AsyncHTTPClient().fetch(url, raise_error=False)
+
+    try:
+        response = tornado.ioloop.IOLoop.current().run_sync(get)
+        assert response.code == 200
+        assert response.headers["Content-Type"] == \
+            "text/plain; version=0.0.4"
+        text = response.body.decode()
+        assert 'bot_action_seconds_bucket{action="sign_in",le="0.5"}' \
+            in text
+        assert "# TYPE bot_account_lanes_waiting gauge" in text
+        assert "bot_callback_duplicates_total " in text
+
+        monkeypatch.setattr(metricsHandler, "_allowed_networks", [])
+        response = tornado.ioloop.IOLoop.current().run_sync(get)
+        assert response.code == 403
+    finally:
+        http_server.stop()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+test the monthly partitions of initDB against a local Postgres,
+in a schema of their own. Check also: test/test_async_db.py
+"""
+
+import os
+import datetime
+import pytest
+
+DSN = os.environ.get("ATTENDANCE_TEST_DSN")
+pytestmark = pytest.mark.skipif(DSN is None,
+                                reason="ATTENDANCE_TEST_DSN is not set")
+
+SCHEMA = "test_partitions"
+
+
+@pytest.fixture
+def cur():
+    import psycopg2
+    from psycopg2.extensions import parse_dsn
+    from attendance_management_bot.constant import DB_CONFIG
+
+    conn = psycopg2.connect(DSN)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("DROP SCHEMA IF EXISTS %s CASCADE" % (SCHEMA,))
+    cursor.execute("CREATE SCHEMA %s" % (SCHEMA,))
+    cursor.execute("SET search_path TO %s" % (SCHEMA,))
+
+    saved = dict(DB_CONFIG)
+    DB_CONFIG.clear()
+    DB_CONFIG.update(parse_dsn(DSN))
+    DB_CONFIG["options"] = "-csearch_path=%s" % (SCHEMA,)
+    yield cursor
+    DB_CONFIG.clear()
+    DB_CONFIG.update(saved)
+    cursor.execute("DROP SCHEMA %s CASCADE" % (SCHEMA,))
+    conn.close()
+
+
+def kinds(cur):
+    cur.execute("SELECT relname, relkind FROM pg_class "
+                "WHERE relnamespace=%s::regnamespace AND relkind IN "
+                "('r', 'p')", (SCHEMA,))
+    return dict(cur.fetchall())
+
+
+def test_init_db(cur, monkeypatch):
+    from attendance_management_bot import initDB
+    from attendance_management_bot.initDB import init_db, partition_name
+    from attendance_management_bot.common.local_timezone import \
+        local_date_time
+
+    monkeypatch.setattr(initDB, "PARTITION_TABLES", True)
+    init_db()
+    # again, nothing changes
+    init_db()
+    tables = kinds(cur)
+    today = local_date_time().date()
+    for table in ("bot_calendar_record", "bot_process_status"):
+        assert tables[table] == "p"
+        assert tables[table + "_default"] == "r"
+        assert tables[partition_name(table, today)] == "r"
+    assert len([name for name in tables
+                if name.startswith("bot_process_status_")]) == 5
+
+    cur.execute("INSERT INTO bot_calendar_record(schedule_id, account, "
+                "cur_date, begin_time, end_time) VALUES "
+                "('a', 'user', %s, 1, 2), ('b', 'user', '2001-01-01', 1, 2)",
+                (today,))
+    cur.execute("INSERT INTO bot_calendar_sync(account, cur_date, process) "
+                "VALUES ('user', %s, 'sign_in_done')", (today,))
+    cur.execute("SELECT tableoid::regclass::text, schedule_id "
+                "FROM bot_calendar_record ORDER BY 2")
+    assert cur.fetchall() == [
+        (partition_name("bot_calendar_record", today), "a"),
+        ("bot_calendar_record_default", "b")]
+
+    # the upsert of the hot path
+    for status in ("wait_in", "in_done"):
+        cur.execute("INSERT INTO bot_process_status(account, cur_date, "
+                    "status) VALUES ('user', %s, %s) "
+                    "ON CONFLICT(account, cur_date) "
+                    "DO UPDATE SET status=EXCLUDED.status", (today, status))
+    cur.execute("SELECT status FROM bot_process_status")
+    assert cur.fetchall() == [("in_done",)]
+
+    cur.execute("DELETE FROM bot_calendar_record WHERE schedule_id='a'")
+    cur.execute("SELECT count(*) FROM bot_calendar_sync")
+    assert cur.fetchone() == (0,)
+
+
+def test_maintain_partitions(cur, monkeypatch):
+    from attendance_management_bot import initDB
+
+    monkeypatch.setattr(initDB, "PARTITION_TABLES", True)
+    initDB.init_db()
+    # nothing is removed by default
+    today = initDB._add_months(initDB.local_date_time().date(), 6)
+    assert initDB.maintain_partitions(today) == []
+
+    monkeypatch.setattr(initDB, "PROCESS_STATUS_RETENTION_MONTHS", 3)
+    cur.execute("INSERT INTO bot_process_status(account, cur_date) "
+                "VALUES ('user', '2001-01-01')")
+
+    # 6 months later, the older partitions are detached by default
+    removed = initDB.maintain_partitions(today)
+    first = initDB._add_months(today, -6)
+    assert removed == [initDB.partition_name("bot_process_status",
+                                             initDB._add_months(first, n))
+                       for n in range(3)]
+    tables = kinds(cur)
+    assert initDB.partition_name("bot_calendar_record", first) in tables
+    assert initDB.partition_name(
+        "bot_calendar_record", initDB._add_months(today, 3)) in tables
+    # detached, not dropped
+    assert all(name in tables for name in removed)
+    cur.execute("SELECT count(*) FROM bot_process_status")
+    assert cur.fetchone() == (0,)
+
+    monkeypatch.setattr(initDB, "PROCESS_STATUS_RETENTION", "drop")
+    removed = initDB.maintain_partitions(initDB._add_months(today, 1))
+    assert removed == [initDB.partition_name("bot_process_status",
+                                             initDB._add_months(first, 3))]
+    assert removed[0] not in kinds(cur)
+
+
+def test_partition_tables(cur, monkeypatch):
+    from attendance_management_bot import initDB
+
+    monkeypatch.setattr(initDB, "PARTITION_TABLES", False)
+    initDB.init_db()
+    assert kinds(cur)["bot_calendar_record"] == "r"
+    cur.execute("INSERT INTO bot_calendar_record(schedule_id, account, "
+                "cur_date, begin_time, end_time) VALUES "
+                "('a', 'user', '2019-11-13', 1, 2), "
+                "('b', 'user', '2020-01-31', 1, 2)")
+    cur.execute("INSERT INTO bot_calendar_sync(account, cur_date, process) "
+                "VALUES ('user', '2019-11-13', 'sign_in_done')")
+    cur.execute("INSERT INTO bot_process_status(account, cur_date, status) "
+                "VALUES ('user', '2019-11-13', 'in_done')")
+
+    monkeypatch.setattr(initDB, "PARTITION_TABLES", True)
+    assert initDB.partition_tables() == ["bot_calendar_record",
+                                         "bot_process_status"]
+    assert initDB.partition_tables() == []
+    tables = kinds(cur)
+    assert tables["bot_calendar_record"] == "p"
+    assert tables["bot_process_status"] == "p"
+    assert "bot_calendar_record_unpartitioned" not in tables
+
+    cur.execute("SELECT tableoid::regclass::text, cur_date "
+                "FROM bot_calendar_record ORDER BY 2")
+    assert cur.fetchall() == [
+        ("bot_calendar_record_201911", datetime.date(2019, 11, 13)),
+        ("bot_calendar_record_202001", datetime.date(2020, 1, 31))]
+    cur.execute("SELECT status FROM bot_process_status_201911")
+    assert cur.fetchall() == [("in_done",)]
+
+    # the foreign key is back
+    cur.execute("DELETE FROM bot_calendar_record WHERE schedule_id='a'")
+    cur.execute("SELECT count(*) FROM bot_calendar_sync")
+    assert cur.fetchone() == (0,)
+    cur.execute("SELECT indexrelid::regclass::text FROM pg_index "
+                "WHERE indrelid='bot_calendar_record'::regclass ORDER BY 1")
+    assert cur.fetchall() == [("account_time",),
+                              ("bot_calendar_record_pkey",),
+                              ("calendar_record_date",)]
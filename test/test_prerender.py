@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+test the cache of the static messages.
+"""
+
+import json
+from attendance_management_bot.common.prerender import Prerendered, \
+    static_message, prerender_messages
+from attendance_management_bot.actions.message import number_message, \
+    prompt_input, reminder_message
+from attendance_management_bot.actions.sign_in import sign_in_message
+
+
+def test_built_once():
+    calls = []
+
+    @static_message(("a",), ("b",))
+    def message(name):
+        calls.append(name)
+        return {"type": "text", "text": name}
+
+    assert prerender_messages() >= 2
+    assert calls == ["a", "b"]
+    assert message("a") is message("a")
+    assert message("a").content() == {"type": "text", "text": "a"}
+    assert calls == ["a", "b"]
+
+
+def test_messages():
+    contents = number_message()
+    assert isinstance(contents, tuple)
+    assert contents[1] is prompt_input()
+    assert reminder_message("unknown") is None
+    assert reminder_message("sign_in_done").content()["type"] == "text"
+
+    content = sign_in_message().content()
+    assert content["type"] == "button_template"
+    assert [action["postback"] for action in content["actions"]] == \
+        ["direct_sign_in", "manual_sign_in"]
+
+
+def test_request():
+    content = Prerendered({"type": "text", "text": u"出勤"})
+    request = json.loads(content.request("user@example.com").decode("utf-8"))
+    assert request == {"accountId": "user@example.com",
+                       "content": {"type": "text", "text": u"出勤"}}
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+test the retry delays and the token bucket.
+"""
+
+import time
+import tornado.gen
+import tornado.ioloop
+from attendance_management_bot.common.ratelimit import backoff_delay, \
+    TokenBucket
+
+
+def test_backoff_delay():
+    for attempts, full in [(1, 1), (2, 2), (4, 8), (10, 60)]:
+        for _ in range(20):
+            delay = backoff_delay(attempts, 1, 60)
+            assert full / 2 <= delay <= full
+
+
+def test_token_bucket():
+    bucket = TokenBucket(100, 5)
+    order = []
+
+    @tornado.gen.coroutine
+    def take(n):
+        yield bucket.acquire()
+        order.append(n)
+
+    @tornado.gen.coroutine
+    def scenario():
+        start = time.monotonic()
+        yield [take(n) for n in range(5)]
+        assert time.monotonic() - start < 0.02
+
+        start = time.monotonic()
+        yield [take(n) for n in range(5, 15)]
+        # 10 tokens at 100 per second
+        assert 0.08 <= time.monotonic() - start < 0.5
+        assert order == list(range(15))
+
+        bucket.pause(0.1)
+        assert bucket.tokens() == 0
+        start = time.monotonic()
+        yield take(15)
+        assert time.monotonic() - start >= 0.1
+
+    tornado.ioloop.IOLoop.current().run_sync(scenario)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+test the times of the reminders. Check also: test/test_async_db.py
+"""
+
+import pytz
+from datetime import datetime
+from attendance_management_bot import reminders
+
+
+def local(*args):
+    return pytz.timezone("Asia/Tokyo").localize(datetime(*args))
+
+
+def test_due_reminders(monkeypatch):
+    monkeypatch.setattr(reminders, "REMINDER_SIGN_IN_TIMES",
+                        ["09:30", "10:00"])
+    monkeypatch.setattr(reminders, "REMINDER_SIGN_OUT_TIMES", ["18:30"])
+    monkeypatch.setattr(reminders, "REMINDER_GRACE", 1800)
+
+    # Wednesday
+    assert reminders.due_reminders(local(2019, 11, 13, 9, 29, 59)) == []
+    assert reminders.due_reminders(local(2019, 11, 13, 9, 30)) == \
+        [("sign_in 09:30", None)]
+    assert reminders.due_reminders(local(2019, 11, 13, 9, 59, 59)) == \
+        [("sign_in 09:30", None)]
+    assert reminders.due_reminders(local(2019, 11, 13, 10, 5)) == \
+        [("sign_in 10:00", None)]
+    assert reminders.due_reminders(local(2019, 11, 13, 18, 45)) == \
+        [("sign_out 18:30", "sign_in_done")]
+    assert reminders.due_reminders(local(2019, 11, 13, 19, 0)) == []
+    # Saturday
+    assert reminders.due_reminders(local(2019, 11, 16, 9, 30)) == []
+
+    monkeypatch.setattr(reminders, "REMINDER_WEEKDAYS", range(7))
+    assert reminders.due_reminders(local(2019, 11, 16, 9, 30)) == \
+        [("sign_in 09:30", None)]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+test the statement registry with fake cursors, no database is needed.
+"""
+
+import re
+import inspect
+from attendance_management_bot.model import asyncDBHandle, sqlStatements
+from attendance_management_bot.model.sqlStatements import get_statement, \
+    execute_statement
+
+
+class FakeConnection:
+    pass
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+
+
+def test_registered_statements():
+    used = set(re.findall(r"_(?:execute|fetch_one|fetch_all)_statement\w*"
+                          r"\(\s*\"(\w+)\"",
+                          inspect.getsource(asyncDBHandle)))
+    assert used
+    assert used <= set(sqlStatements._statements)
+
+    for name, statement in sqlStatements._statements.items():
+        assert statement.name == name
+        assert statement.prepare_sql == "PREPARE %s AS %s" \
+            % (name, statement.sql)
+        assert statement.execute_sql.startswith("EXECUTE %s" % (name,))
+        assert statement.execute_sql.count("%s") == statement.param_count
+
+
+def test_prepare_once_per_connection():
+    statement = get_statement("get_init_status")
+
+    cursor = FakeCursor(FakeConnection())
+    execute_statement(cursor, "get_init_status", ("action",))
+    execute_statement(cursor, "get_init_status", ("action",))
+    assert cursor.executed == [statement.prepare_sql,
+                               statement.execute_sql,
+                               statement.execute_sql]
+
+    other = FakeCursor(FakeConnection())
+    execute_statement(other, "get_init_status", ("action",))
+    assert other.executed == [statement.prepare_sql, statement.execute_sql]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+test the server token cache.
+"""
+
+import tornado.gen
+import tornado.ioloop
+import jwcrypto.jwk as jwk
+from attendance_management_bot.common import token
+
+
+class Fetch:
+    def __init__(self, expires_in=86400):
+        self.calls = 0
+        self.expires_in = expires_in
+
+    @tornado.gen.coroutine
+    def __call__(self):
+        self.calls += 1
+        yield tornado.gen.sleep(0.01)
+        return "token%d" % (self.calls,), self.expires_in
+
+
+def test_single_flight():
+    fetch = Fetch()
+    manager = token.TokenManager(fetch)
+
+    @tornado.gen.coroutine
+    def scenario():
+        tokens = yield [manager.get_token() for _ in range(10)]
+        assert tokens == ["token1"] * 10
+
+        tokens = yield [manager.refresh("token1") for _ in range(10)]
+        assert tokens == ["token2"] * 10
+
+        # refused after someone else refreshed it
+        new_token = yield manager.refresh("token1")
+        assert new_token == "token2"
+        assert fetch.calls == 2
+
+    tornado.ioloop.IOLoop.current().run_sync(scenario)
+
+
+def test_refresh_before_expiry(monkeypatch):
+    monkeypatch.setattr(token, "TOKEN_REFRESH_MARGIN", 1)
+    monkeypatch.setattr(token, "TOKEN_RETRY_INTERVAL", 0.05)
+    fetch = Fetch(expires_in=1.1)
+    manager = token.TokenManager(fetch)
+
+    @tornado.gen.coroutine
+    def scenario():
+        assert (yield manager.get_token()) == "token1"
+        yield tornado.gen.sleep(0.3)
+        assert fetch.calls >= 2
+        assert (yield manager.get_token()) == "token%d" % (fetch.calls,)
+
+    tornado.ioloop.IOLoop.current().run_sync(scenario)
+
+
+def test_private_key_loaded_once(tmp_path):
+    key_path = str(tmp_path / "private_20200101.key")
+    key = jwk.JWK.generate(kty="RSA", size=2048)
+    with open(key_path, "wb") as _file:
+        _file.write(key.export_to_pem(private_key=True, password=None))
+
+    assert token.create_tmp_token(key_path, "server") is not None
+    private_key = token.load_private_key(key_path)
+    assert token.load_private_key(key_path) is private_key
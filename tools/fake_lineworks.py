@@ -0,0 +1,218 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Stand-in for the LINE WORKS APIs used by the bot, for the load tests.
+It answers the token, push, rich menu, upload, calendar, contacts and
+bot registration requests of constant.API_BO after a configurable
+latency, and can fail a part of them with 500 or 429.
+
+Start the bot with LINEWORKS_API_ROOT=http://127.0.0.1:9000 to send
+its requests here. GET /stats returns the requests counted by endpoint.
+Check also: tools/loadtest.py
+
+    python tools/fake_lineworks.py --port=9000 --latency=0.05 \
+        --jitter=0.02 --error_rate=0.01 --throttle_rate=0.01
+"""
+
+import re
+import json
+import uuid
+import random
+import logging
+import collections
+import tornado.gen
+import tornado.web
+import tornado.ioloop
+from tornado.options import define, options
+
+define("port", default=9000, help="listen port. default 9000")
+define("latency", default=0.05, type=float,
+       help="seconds before an answer. default 0.05")
+define("jitter", default=0.0, type=float,
+       help="seconds added at random to the latency, at most. default 0")
+define("error_rate", default=0.0, type=float,
+       help="part of the requests answered 500. default 0")
+define("throttle_rate", default=0.0, type=float,
+       help="part of the requests answered 429. default 0")
+define("retry_after", default=1, type=int,
+       help="Retry-After of the 429 answers, in seconds. default 1")
+
+LOGGER = logging.getLogger("fake_lineworks")
+
+# endpoint -> status code -> count
+_counts = collections.defaultdict(collections.Counter)
+
+
+class FakeHandler(tornado.web.RequestHandler):
+    """
+    Waits the latency, then fails the request or lets the method answer.
+    """
+
+    endpoint = "other"
+
+    @tornado.gen.coroutine
+    def prepare(self):
+        delay = options.latency + random.uniform(0, options.jitter)
+        if delay > 0:
+            yield tornado.gen.sleep(delay)
+
+        draw = random.random()
+        if draw < options.error_rate:
+            self.set_status(500)
+            self.finish({"code": "SERVER_ERROR"})
+        elif draw < options.error_rate + options.throttle_rate:
+            self.set_status(429)
+            self.set_header("Retry-After", str(options.retry_after))
+            self.finish({"code": "TOO_MANY_REQUESTS"})
+
+    def on_finish(self):
+        _counts[self.endpoint][self.get_status()] += 1
+
+    def check_xsrf_cookie(self):
+        pass
+
+
+class TokenHandler(FakeHandler):
+    endpoint = "token"
+
+    def post(self, api_id):
+        self.write({"access_token": uuid.uuid4().hex, "expires_in": 86400})
+
+
+class RegisterBotHandler(FakeHandler):
+    endpoint = "bot"
+
+    def post(self, api_id):
+        self.write({"botNo": 1})
+
+
+class BotDomainHandler(FakeHandler):
+    endpoint = "bot"
+
+    def post(self, api_id, bot_no, domain_id):
+        self.write({})
+
+
+class PushHandler(FakeHandler):
+    endpoint = "push"
+
+    def post(self, api_id, bot_no):
+        json.loads(self.request.body)
+        self.write({})
+
+
+class RichMenuHandler(FakeHandler):
+    endpoint = "richmenu"
+    menus = []
+
+    def get(self, api_id, bot_no):
+        self.write({"richmenus": self.menus})
+
+    def post(self, api_id, bot_no):
+        menu = json.loads(self.request.body)
+        rich_menu_id = str(len(self.menus) + 1)
+        self.menus.append({"name": menu.get("name", ""),
+                           "richMenuId": rich_menu_id})
+        self.write({"richMenuId": rich_menu_id})
+
+
+class RichMenuActionHandler(FakeHandler):
+    endpoint = "richmenu"
+
+    def post(self, *args):
+        self.write({})
+
+    def delete(self, *args):
+        self.write({})
+
+
+class UploadHandler(FakeHandler):
+    endpoint = "upload"
+
+    def post(self):
+        self.set_header("x-works-resource-id", uuid.uuid4().hex)
+        self.write({})
+
+
+class CalendarHandler(FakeHandler):
+    endpoint = "calendar"
+
+    def post(self, api_id, account_id):
+        self.write({"result": "success", "returnValue": uuid.uuid4().hex})
+
+
+class EventHandler(FakeHandler):
+    endpoint = "calendar"
+
+    def post(self, api_id, account_id, calendar_id):
+        ical = json.loads(self.request.body)["ical"]
+        uid = re.search(r"^UID:(.*)$", ical, re.M).group(1).strip()
+        self.write({"result": "success", "returnValue": {"icalUid": uid}})
+
+    def put(self, api_id, account_id, calendar_id, uid):
+        json.loads(self.request.body)
+        self.write({"result": "success"})
+
+
+class ContactHandler(FakeHandler):
+    endpoint = "contacts"
+
+    def get(self, api_id, account_id):
+        self.write({"name": account_id.split("@")[0]})
+
+
+class StatsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.write({endpoint: {str(code): count
+                               for code, count in counts.items()}
+                    for endpoint, counts in _counts.items()})
+
+    def delete(self):
+        _counts.clear()
+
+
+def make_app():
+    bot = r"/r/([^/]+)/message/v1/bot"
+    return tornado.web.Application([
+        (r"/b/([^/]+)/server/token", TokenHandler),
+        (bot, RegisterBotHandler),
+        (bot + r"/([^/]+)/domain/([^/]+)", BotDomainHandler),
+        (bot + r"/([^/]+)/message/push", PushHandler),
+        (bot + r"/([^/]+)/richmenu", RichMenuHandler),
+        (bot + r"/([^/]+)/richmenu/(.+)", RichMenuActionHandler),
+        (r"/openapi/message/upload.api", UploadHandler),
+        (r"/r/([^/]+)/calendar/v1/([^/]+)/calendarList", CalendarHandler),
+        (r"/r/([^/]+)/calendar/v1/([^/]+)/calendars/([^/]+)/events",
+         EventHandler),
+        (r"/r/([^/]+)/calendar/v1/([^/]+)/calendars/([^/]+)/events/(.+)",
+         EventHandler),
+        (r"/r/([^/]+)/contact/v2/accounts/([^/]+)", ContactHandler),
+        (r"/stats", StatsHandler),
+    ])
+
+
+def main():
+    options.parse_command_line()
+    make_app().listen(options.port)
+    LOGGER.info("fake LINE WORKS APIs on port %d", options.port)
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright 2020-present Works Mobile Corp.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""
+Load generator of the bot callbacks.
+Each virtual user sends the callbacks of a working day in order,
+checking in and out either with the current time or with a time typed
+in, then cleans its day and starts again. The report gives the latency
+percentiles of each callback and the throughput.
+Check also: tools/fake_lineworks.py
+
+    LINEWORKS_API_ROOT=http://127.0.0.1:9000 python main.py --port=8080
+    python tools/loadtest.py --url=http://127.0.0.1:8080/callback \
+        --users=50 --duration=60 --stats_url=http://127.0.0.1:9000/stats
+"""
+
+import sys
+import json
+import time
+import random
+import collections
+import tornado.gen
+import tornado.ioloop
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.options import define, options
+
+define("url", default="http://127.0.0.1:8080/callback",
+       help="callback url of the bot")
+define("users", default=20, type=int,
+       help="virtual users sending at the same time. default 20")
+define("duration", default=30, type=float,
+       help="seconds of the test. default 30")
+define("think", default=0.0, type=float,
+       help="seconds a user waits between two callbacks. default 0")
+define("manual_ratio", default=0.3, type=float,
+       help="part of the days the times are typed in. default 0.3")
+define("account_prefix", default="loadtest",
+       help="accounts are <prefix>-<n>@example.com")
+define("stats_url", default=None,
+       help="GET after the test and print, e.g. the /stats of "
+            "tools/fake_lineworks.py")
+define("json", default=False, type=bool, help="print the report as JSON")
+
+
+def postback(data):
+    return {"type": "postback", "data": data}
+
+
+def message(text, content_postback=None):
+    content = {"type": "text", "text": text}
+    if content_postback is not None:
+        content["postback"] = content_postback
+    return {"type": "message", "content": content}
+
+
+def typed_time(timestamp):
+    return time.strftime("%H%M", time.localtime(timestamp))
+
+
+def working_day(manual):
+    """
+    :return: list of (name, function returning the callback without
+        its source), in the order a user sends them.
+    """
+    check_in = {}
+
+    def confirm_in():
+        check_in["time"] = int(time.time())
+        return postback("confirm_in&time=%d" % (check_in["time"],))
+
+    def confirm_out():
+        end = max(int(time.time()), check_in.get("time", 0) + 60)
+        return postback("confirm_out&time=%d" % (end,))
+
+    steps = [("start", lambda: message("start", "start")),
+             ("sign_in", lambda: postback("sign_in"))]
+    if manual:
+        steps += [("manual_sign_in", lambda: postback("manual_sign_in")),
+                  ("time", lambda: message(typed_time(time.time())))]
+    else:
+        steps += [("direct_sign_in", lambda: postback("direct_sign_in"))]
+    steps += [("confirm_in", confirm_in),
+              ("sign_out", lambda: postback("sign_out"))]
+    if manual:
+        steps += [("manual_sign_out", lambda: postback("manual_sign_out")),
+                  ("time", lambda: message(typed_time(time.time() + 60)))]
+    else:
+        steps += [("direct_sign_out", lambda: postback("direct_sign_out"))]
+    steps += [("confirm_out", confirm_out),
+              ("clean", lambda: message("clean"))]
+    return steps
+
+
+def percentile(values, q):
+    """
+    :param values: sorted list.
+    :param q: 0 to 100.
+    :return: nearest-rank percentile, None for no value.
+    """
+    if not values:
+        return None
+    rank = max(int(-(-q * len(values) // 100)), 1)
+    return values[min(rank, len(values)) - 1]
+
+
+class LoadTest:
+    def __init__(self):
+        # callback name -> latencies in seconds
+        self.latencies = collections.defaultdict(list)
+        # callback name -> status code -> count
+        self.codes = collections.defaultdict(collections.Counter)
+        self.started = None
+        self.elapsed = None
+
+    @tornado.gen.coroutine
+    def send(self, account_id, name, body):
+        body["source"] = {"accountId": account_id}
+        body["createdTime"] = int(time.time() * 1000)
+        request = HTTPRequest(options.url, method="POST",
+                              headers={"Content-Type": "application/json"},
+                              body=json.dumps(body), request_timeout=60)
+        start = time.monotonic()
+        response = yield AsyncHTTPClient().fetch(request, raise_error=False)
+        self.latencies[name].append(time.monotonic() - start)
+        self.codes[name][response.code] += 1
+
+    @tornado.gen.coroutine
+    def user(self, number, deadline):
+        account_id = "%s-%d@example.com" % (options.account_prefix, number)
+        yield self.send(account_id, "clean", message("clean"))
+        while time.monotonic() < deadline:
+            manual = random.random() < options.manual_ratio
+            for name, make in working_day(manual):
+                if time.monotonic() >= deadline:
+                    break
+                yield self.send(account_id, name, make())
+                if options.think > 0:
+                    yield tornado.gen.sleep(options.think)
+
+    @tornado.gen.coroutine
+    def run(self):
+        self.started = time.monotonic()
+        deadline = self.started + options.duration
+        yield [self.user(number, deadline)
+               for number in range(options.users)]
+        self.elapsed = time.monotonic() - self.started
+
+    def report(self):
+        rows = []
+        names = sorted(self.latencies)
+        for name in names + ["total"]:
+            if name == "total":
+                values = sorted(value for values in self.latencies.values()
+                                for value in values)
+                codes = collections.Counter()
+                for counter in self.codes.values():
+                    codes.update(counter)
+            else:
+                values = sorted(self.latencies[name])
+                codes = self.codes[name]
+            rows.append({
+                "callback": name,
+                "count": len(values),
+                "errors": sum(count for code, count in codes.items()
+                              if code != 200),
+                "codes": {str(code): count for code, count in codes.items()},
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": values[-1] if values else None,
+            })
+        total = rows[-1]["count"]
+        return {"users": options.users, "seconds": self.elapsed,
+                "throughput": total / self.elapsed if self.elapsed else 0,
+                "callbacks": rows}
+
+
+def print_report(report):
+    def ms(value):
+        return "-" if value is None else "%.1f" % (value * 1000,)
+
+    print("%-16s %8s %7s %9s %9s %9s %9s" % (
+        "callback", "count", "errors", "p50 ms", "p95 ms", "p99 ms",
+        "max ms"))
+    for row in report["callbacks"]:
+        print("%-16s %8d %7d %9s %9s %9s %9s" % (
+            row["callback"], row["count"], row["errors"], ms(row["p50"]),
+            ms(row["p95"]), ms(row["p99"]), ms(row["max"])))
+    print("%d users, %.1f seconds, %.1f callbacks/s" % (
+        report["users"], report["seconds"], report["throughput"]))
+
+
+@tornado.gen.coroutine
+def main():
+    AsyncHTTPClient.configure(None, max_clients=options.users)
+    test = LoadTest()
+    yield test.run()
+    report = test.report()
+
+    if options.stats_url is not None:
+        response = yield AsyncHTTPClient().fetch(options.stats_url,
+                                                 raise_error=False)
+        if response.code == 200:
+            report["api"] = json.loads(response.body)
+
+    if options.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+    print_report(report)
+    if "api" in report:
+        print("API requests: %s" % (json.dumps(report["api"]),))
+
+
+if __name__ == "__main__":
+    options.parse_command_line()
+    tornado.ioloop.IOLoop.current().run_sync(main)